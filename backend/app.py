@@ -3,19 +3,25 @@
 
 # Import necessary tools and libraries that we'll need
 import os  # For working with files and folders
-import pandas as pd  # For organizing data in tables
-import numpy as np  # For doing math calculations
-from flask import Flask, request, jsonify, make_response  # For creating our web server
+from flask import Flask, request, jsonify, make_response, Response, stream_with_context, g  # For creating our web server
 from flask_cors import CORS  # For allowing different websites to talk to our server
 from config import Config  # Our custom settings
 from firebase_config import initialize_firebase  # For connecting to our database
-from scraper import ContentScraper, ClaudeAPI  # For getting information from websites
+from sqlite_store import SQLiteTrendStore  # For saving trends on this machine when the database isn't available
+from trend_repository import TrendRepository, keyset_page, sort_value  # For keeping a copy of our trends in memory
+from scraper import ContentScraper, ClaudeAPI, page_cache, transcript_cache, memo_cache, host_scheduler  # For getting information from websites
+from job_queue import JobQueue, JobFailed  # For running slow work in the background
+from feeds import FeedPoller  # For picking up new articles from RSS and Atom feeds
+from resources import LazyResource, warm_up as warm_up_resources  # For setting things up the first time they're needed
+from date_extract import extract_date_from_url_pattern  # For finding when an article was published
+import metrics  # For timing requests and counting errors across all our workers
+from profiler import profiler  # For seeing where a slow request spends its time
 import time  # For working with time and dates
-import re
+import json
+import base64
+import hashlib
+import importlib
 from datetime import datetime
-from urllib.parse import urlparse
-import requests
-from bs4 import BeautifulSoup
 
 # Create a new web application
 # Think of this like opening a new store - we're setting up our shop!
@@ -58,21 +64,100 @@ def add_security_headers(response):
     response.headers['X-XSS-Protection'] = '1; mode=block'
     return response
 
-# Get everything ready to run
-Config.init_app()  # Load our configuration settings
+# Time every request and give it a trace ID
+# The ID comes from the caller's X-Request-ID header if it sent a sensible one,
+# is printed on every log line the request causes, and is sent back in the
+# X-Request-ID response header, so a slow request can be found in the logs.
+# (For streamed responses the time is measured until the stream starts.)
+@app.before_request
+def start_request_trace():
+    g.trace_token = metrics.start_trace(metrics.valid_trace_id(request.headers.get('X-Request-ID')))
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    seconds = time.perf_counter() - g.request_started
+    # Group by the route pattern (/api/trends/<string:trend_id>), not the real path,
+    # so each trend ID doesn't become its own series
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe(metrics.REQUEST_DURATION, seconds, endpoint=endpoint, method=request.method, status=str(response.status_code))
+    metrics.log('request', method=request.method, endpoint=endpoint, path=request.path,
+                status=response.status_code, ms=round(seconds * 1000, 1))
+    response.headers['X-Request-ID'] = metrics.current_trace_id()
+    return response
 
-# Connect to our database (Firebase)
-# This is like setting up our filing cabinet to store information
-db = initialize_firebase()
+@app.teardown_request
+def end_request_trace(error=None):
+    if 'trace_token' in g:
+        metrics.end_trace(g.pop('trace_token'))
+
+# Profile a request on demand
+# A request with the right X-Profile-Token header (or one of the next requests
+# after POST /api/profiler) has its call stack sampled while it runs, and the
+# profile is saved under its trace ID (sent back in the X-Profile-ID header).
+# With no PROFILER_TOKEN set, this does nothing.
+@app.before_request
+def start_profiling():
+    if not profiler.enabled or request.path.startswith('/api/profiler'):
+        return
+    route = request.url_rule.rule if request.url_rule else None
+    if profiler.wants(request.headers.get('X-Profile-Token'), route, request.path):
+        g.profile = profiler.start(metrics.current_trace_id(), method=request.method,
+                                   path=request.path, endpoint=route or 'unmatched')
+
+@app.after_request
+def add_profile_header(response):
+    if 'profile' in g:
+        g.profile.info['status'] = response.status_code
+        response.headers['X-Profile-ID'] = g.profile.id
+    return response
 
-# Set up our AI helper (Claude)
-# This is like hiring an assistant to help analyze information
-claude_api = ClaudeAPI()
+@app.teardown_request
+def finish_profiling(error=None):
+    # Runs once the response is finished, so streamed responses are profiled to the end
+    if 'profile' in g:
+        profiler.stop(g.pop('profile'))
+
+# Get everything ready to run
+Config.init_app()  # Load our configuration settings
 
 # Give names to important things we'll use often
 # Like labeling the drawers in our filing cabinet
 TRENDS_COLLECTION = 'tech_trends'
 
+# Our database (Firebase), our AI helper (Claude) and our in-memory copy of the
+# trends are set up the first time they're needed, separately in each worker
+# process, instead of when this file is imported. That keeps startup fast and
+# means gunicorn workers never share connections made before they were forked.
+# Like only unlocking the filing cabinet once someone asks for a file.
+firestore_resource = LazyResource('firestore', initialize_firebase)
+claude_resource = LazyResource('claude', ClaudeAPI)
+trends_resource = LazyResource(
+    'trends', lambda: TrendRepository(get_db(), TRENDS_COLLECTION, Config.TRENDS_FILE, store=trend_store)
+)
+
+# When the database isn't available, trends are kept in a small database file on
+# this machine (one row per trend), or in the old backup CSV file if
+# TRENDS_LOCAL_BACKEND is 'csv'. Like a filing cabinet in the back office.
+trend_store = (
+    SQLiteTrendStore(Config.TRENDS_DB_PATH, csv_path=Config.TRENDS_FILE)
+    if Config.TRENDS_LOCAL_BACKEND == 'sqlite' else None
+)
+
+def get_db():
+    """Our Firestore client, or None when we're using the backup file instead."""
+    return firestore_resource.get()
+
+def get_claude_api():
+    """Our AI helper. Raises ValueError if the Claude API key isn't configured."""
+    return claude_resource.get()
+
+def get_trend_repository():
+    """Our in-memory copy of every trend, kept in step with the database (or the backup file)."""
+    return trends_resource.get()
+
 # Define what information we want to store about each technology trend
 # Like creating a form with specific fields to fill out
 TREND_COLUMNS = [
@@ -84,62 +169,19 @@ TREND_COLUMNS = [
     'analysis'        # Our detailed thoughts about it
 ]
 
-def load_trends_data():
+def trends_response(trends, **fields):
     """
-    Get all our stored technology trends from our database.
-    If we can't access the database, we'll use a backup file instead.
-    It's like having both a digital and paper copy of our records.
+    Send a list of trend records as JSON.
+    Each record remembers its own JSON text once it has been sent, so only new
+    or changed trends are encoded again. With extra fields (as for a page of
+    trends), the list is sent as 'items' next to them.
     """
-    if db:
-        # Get data from our online database
-        trends_ref = db.collection(TRENDS_COLLECTION)
-        trends = trends_ref.stream()
-        
-        # Convert the data into a format we can work with
-        trends_data = [trend.to_dict() for trend in trends]
-        
-        if trends_data:
-            return pd.DataFrame(trends_data)
-        else:
-            return pd.DataFrame(columns=TREND_COLUMNS)
+    items = '[' + ','.join(trend.to_json() for trend in trends) + ']'
+    if fields:
+        body = '{"items":' + items + ',' + json.dumps(fields, sort_keys=True, separators=(',', ':'))[1:]
     else:
-        # If database isn't available, use a backup file
-        if os.path.exists(Config.TRENDS_FILE):
-            return pd.read_csv(Config.TRENDS_FILE)
-        else:
-            return pd.DataFrame(columns=TREND_COLUMNS)
-
-def save_trends_data(df):
-    """
-    Save our technology trends either to the database or backup file.
-    Like making sure our records are properly filed away.
-    """
-    if db:
-        # Save to online database
-        trends_ref = db.collection(TRENDS_COLLECTION)
-        delete_collection(trends_ref, 10)  # Clear old records
-        
-        # Add each new record
-        for _, row in df.iterrows():
-            trends_ref.add(row.to_dict())
-    else:
-        # Save to backup file if database isn't available
-        df.to_csv(Config.TRENDS_FILE, index=False)
-
-def delete_collection(coll_ref, batch_size):
-    """
-    Helper function to remove old records from our database.
-    Like cleaning out old files to make room for new ones.
-    """
-    docs = coll_ref.limit(batch_size).stream()
-    deleted = 0
-    
-    for doc in docs:
-        doc.reference.delete()
-        deleted += 1
-        
-    if deleted >= batch_size:
-        return delete_collection(coll_ref, batch_size)
+        body = items
+    return Response(body, mimetype='application/json')
 
 def generate_analysis(row):
     """
@@ -189,46 +231,145 @@ Relevant Risks:
 # from users, like getting information, adding new trends, updating existing ones,
 # and analyzing web content. Each function is like a different service our store provides.
 
+def encode_cursor(entry, fingerprint):
+    """
+    Turn the last (sort value, key) entry of a page into an opaque cursor string.
+    The fingerprint ties the cursor to the query it came from.
+    """
+    payload = json.dumps({'v': entry[0], 'k': entry[1], 'f': fingerprint}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, fingerprint):
+    """
+    Turn a cursor string back into a (sort value, key) entry.
+    Raises ValueError if the cursor is malformed or belongs to a different query.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if payload['f'] != fingerprint:
+            raise ValueError('Cursor belongs to a different query')
+        return (payload['v'], payload['k'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Malformed cursor: {e}')
+
+def paginated_trends(search_query, theme_filter, sort_by, sort_order):
+    """
+    Build one page of trends for the `limit`/`cursor` query parameters.
+    
+    Ordering by date (the default) is answered straight from the repository's
+    sorted date index, so a page only touches the trends on it. Searches and
+    other orderings sort just the matching trends.
+    """
+    try:
+        limit = int(request.args['limit'])
+    except ValueError:
+        return jsonify({'error': 'limit must be a whole number'}), 400
+    if limit < 1 or limit > Config.TRENDS_MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {Config.TRENDS_MAX_PAGE_SIZE}'}), 400
+    
+    include_total = request.args.get('include_total', '').lower() in ('true', '1', 't')
+    descending = sort_order.lower() == 'desc'
+    if sort_by == 'relevance' and not search_query:
+        sort_by = 'date_discovered'
+    fingerprint = hashlib.sha1(
+        json.dumps([search_query, theme_filter.lower(), sort_by, descending]).encode('utf-8')
+    ).hexdigest()[:12]
+    
+    try:
+        cursor = request.args.get('cursor')
+        after = decode_cursor(cursor, fingerprint) if cursor else None
+        
+        if not search_query and sort_by == 'date_discovered':
+            trends, last_entry, has_more, total = get_trend_repository().page_by_date(
+                limit, theme_filter or None, descending, after
+            )
+        else:
+            trend_repository = get_trend_repository()
+            if search_query:
+                matches = trend_repository.search(search_query)
+            else:
+                matches = [(key, trend, 0.0) for key, trend in trend_repository.items()]
+            
+            if theme_filter:
+                matches = [
+                    match for match in matches
+                    if sort_value(match[1].get('theme')).lower() == theme_filter.lower()
+                ]
+            
+            if sort_by == 'relevance':
+                # Already best match first; negate the score so the entries sort ascending
+                entries = [(-score, key) for key, _, score in matches]
+                descending = False
+            else:
+                entries = sorted((sort_value(trend.get(sort_by)), key) for key, trend, _ in matches)
+            
+            trends_by_key = {key: trend for key, trend, _ in matches}
+            page, has_more = keyset_page(entries, limit, descending, after)
+            trends = [trends_by_key[key] for _, key in page]
+            last_entry = page[-1] if page else None
+            total = len(entries)
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    fields = {'next_cursor': encode_cursor(last_entry, fingerprint) if has_more else None}
+    if include_total:
+        fields['total'] = total
+    return trends_response(trends, **fields)
+
 @app.route('/api/trends', methods=['GET'])
 def get_trends():
-    """Get a list of all technology trends we've stored."""
-    df = load_trends_data()
-    return jsonify(df.to_dict(orient='records'))
+    """
+    Get a list of all technology trends we've stored.
+    
+    Pass `limit` to get one page at a time, newest first: the response is then
+    {'items': [...], 'next_cursor': ...}, and the next page is requested with
+    `cursor=<next_cursor>`. Add `include_total=true` to also get the total count.
+    Without `limit`, every trend is returned as a plain list, as before.
+    """
+    if 'limit' in request.args:
+        return paginated_trends('', '', 'date_discovered', request.args.get('sort_order', 'desc'))
+    
+    return trends_response(get_trend_repository().all())
 
 @app.route('/api/trends/filter', methods=['GET'])
 def filter_trends():
-    """Get a filtered and sorted list of technology trends."""
+    """
+    Get a filtered and sorted list of technology trends.
+    
+    Searching matches trends containing every word of the query (a partial
+    word matches the words it starts), and sort_by=relevance ranks them by
+    best match.
+    """
     # Get query parameters
     search_query = request.args.get('search', '').lower()
     theme_filter = request.args.get('theme', '')
     sort_by = request.args.get('sort_by', 'date_discovered')
     sort_order = request.args.get('sort_order', 'desc')
     
-    # Load all trends
-    df = load_trends_data()
-    
-    if df.empty:
-        return jsonify([])
+    # Paginated requests (with `limit`) work the same way as for /api/trends
+    if 'limit' in request.args:
+        return paginated_trends(search_query, theme_filter, sort_by, sort_order)
     
-    # Apply filters
     if search_query:
-        # Search in multiple columns
-        df = df[
-            df['research_task'].str.lower().str.contains(search_query, na=False) |
-            df['context'].str.lower().str.contains(search_query, na=False) |
-            df['theme'].str.lower().str.contains(search_query, na=False) |
-            df['analysis'].str.lower().str.contains(search_query, na=False)
-        ]
+        # Look the words up in our search index instead of reading every memo;
+        # the matches come back best match first
+        trends = [trend for _, trend, _ in get_trend_repository().search(search_query)]
+    else:
+        # Load all trends
+        trends = get_trend_repository().all()
     
+    # Apply filters
     if theme_filter:
-        df = df[df['theme'].str.lower() == theme_filter.lower()]
+        trends = [trend for trend in trends if sort_value(trend.theme).lower() == theme_filter.lower()]
     
-    # Apply sorting
-    if sort_by in df.columns:
-        ascending = sort_order.lower() != 'desc'
-        df = df.sort_values(by=sort_by, ascending=ascending)
+    # Apply sorting ('relevance' keeps the search index's order); a field no
+    # trend has leaves the order as it is
+    if sort_by != 'relevance' and any(trend.get(sort_by) is not None for trend in trends):
+        trends = sorted(
+            trends, key=lambda trend: sort_value(trend.get(sort_by)), reverse=sort_order.lower() == 'desc'
+        )
     
-    return jsonify(df.to_dict(orient='records'))
+    return trends_response(trends)
 
 @app.route('/api/trends', methods=['POST'])
 def add_trend():
@@ -246,44 +387,17 @@ def add_trend():
     # Generate analysis report
     new_row['analysis'] = generate_analysis(new_row)
     
-    # Save the new trend
-    df = load_trends_data()
-    
-    if db:
-        # Save to database
-        doc_ref = db.collection(TRENDS_COLLECTION).add(new_row)
-        # Check if doc_ref is a tuple and extract the first element if it is
-        if isinstance(doc_ref, tuple) and len(doc_ref) > 0:
-            new_row['id'] = doc_ref[0].id
-        else:
-            # Try to get the ID directly if it's not a tuple
-            try:
-                new_row['id'] = doc_ref.id
-            except AttributeError:
-                # If we can't get an ID, generate a random one
-                new_row['id'] = f"trend-{int(time.time())}"
-    else:
-        # Save to backup file
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        save_trends_data(df)
-    return jsonify(new_row), 201
+    # Save the new trend, to the database (under a stable ID, so a resubmitted
+    # trend isn't stored twice), our local database or the backup file
+    trend = get_trend_repository().add(new_row)
+    return jsonify(trend.to_dict()), 201
 
 @app.route('/api/trends/<string:trend_id>', methods=['PUT'])
 def update_trend(trend_id):
     """Update an existing technology trend."""
     data = request.json
     
-    if db:
-        # Update in database
-        doc_ref = db.collection(TRENDS_COLLECTION).document(trend_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return jsonify({'error': 'Trend not found'}), 404
-        
-        # Get current data
-        current_data = doc.to_dict()
-        
+    def apply_changes(current_data):
         # Update fields
         for field in TREND_COLUMNS[:-1]:
             if field in data:
@@ -291,73 +405,64 @@ def update_trend(trend_id):
         
         # Update analysis
         current_data['analysis'] = generate_analysis(current_data)
-        
-        # Save changes
-        doc_ref.update(current_data)
-        return jsonify(current_data), 200
-    else:
-        # Update in backup file
-        df = load_trends_data()
-        try:
-            trend_idx = int(trend_id)
-            
-            if trend_idx < 0 or trend_idx >= len(df):
-                return jsonify({'error': 'Trend not found'}), 404
-            
-            # Update fields
-            for field in TREND_COLUMNS[:-1]:
-                if field in data:
-                    df.at[trend_idx, field] = data[field]
-            
-            # Update analysis
-            row_data = df.iloc[trend_idx].to_dict()
-            df.at[trend_idx, 'analysis'] = generate_analysis(row_data)
-            
-            save_trends_data(df)
-            return jsonify(df.iloc[trend_idx].to_dict()), 200
-        except ValueError:
-            return jsonify({'error': 'Invalid ID format'}), 400
+        return current_data
+    
+    try:
+        trend = get_trend_repository().update(trend_id, apply_changes)
+    except ValueError:
+        # The backup file identifies trends by their row number
+        return jsonify({'error': 'Invalid ID format'}), 400
+    
+    if trend is None:
+        return jsonify({'error': 'Trend not found'}), 404
+    return jsonify(trend.to_dict()), 200
 
 @app.route('/api/trends/<string:trend_id>', methods=['DELETE'])
 def delete_trend(trend_id):
     """Remove a technology trend from our records."""
-    if db:
-        # Delete from database
-        doc_ref = db.collection(TRENDS_COLLECTION).document(trend_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return jsonify({'error': 'Trend not found'}), 404
-        
-        doc_ref.delete()
-        return jsonify({'message': 'Trend deleted successfully'}), 200
-    else:
-        # Delete from backup file
-        df = load_trends_data()
-        try:
-            trend_idx = int(trend_id)
-            
-            if trend_idx < 0 or trend_idx >= len(df):
-                return jsonify({'error': 'Trend not found'}), 404
-            
-            df = df.drop(trend_idx).reset_index(drop=True)
-            save_trends_data(df)
-            
-            return jsonify({'message': 'Trend deleted successfully'}), 200
-        except ValueError:
-            return jsonify({'error': 'Invalid ID format'}), 400
+    try:
+        deleted = get_trend_repository().delete(trend_id)
+    except ValueError:
+        # The backup file identifies trends by their row number
+        return jsonify({'error': 'Invalid ID format'}), 400
+    
+    if not deleted:
+        return jsonify({'error': 'Trend not found'}), 404
+    return jsonify({'message': 'Trend deleted successfully'}), 200
 
 # Functions for getting information from websites and analyzing it
 
 @app.route('/api/scrape/youtube', methods=['POST'])
 def scrape_youtube():
-    """Get the text from a YouTube video."""
+    """
+    Get the text from a YouTube video.
+    
+    Send "format": "segments" (and optionally "segment_seconds") to get the
+    transcript as timestamped windows instead, for working through a long
+    video a piece at a time.
+    """
     data = request.json
     
     if not data or 'url' not in data:
         return jsonify({'error': 'Missing URL parameter'}), 400
     
     url = data['url']
+    
+    if data.get('format') == 'segments':
+        try:
+            segment_seconds = float(data.get('segment_seconds') or Config.YOUTUBE_SEGMENT_SECONDS)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'segment_seconds must be a number'}), 400
+        if segment_seconds <= 0:
+            return jsonify({'error': 'segment_seconds must be positive'}), 400
+        try:
+            segments = ContentScraper.get_youtube_segments(url, segment_seconds)
+        except ValueError as e:
+            return jsonify({'error': f'Error: {str(e)}'}), 400
+        except Exception as e:
+            return jsonify({'error': f'Error retrieving transcript: {str(e)}'}), 400
+        return jsonify({'segments': segments}), 200
+    
     transcript = ContentScraper.get_youtube_transcript(url)
     
     if transcript.startswith('Error'):
@@ -381,6 +486,14 @@ def scrape_webpage():
     
     return jsonify({'content': content}), 200
 
+def use_memo_cache(data):
+    """
+    Check whether a request may reuse a cached memo.
+    Sending "cache": "bypass" (in the body or the query string) forces a fresh memo.
+    """
+    setting = request.args.get('cache') or (data or {}).get('cache') or ''
+    return str(setting).lower() != 'bypass'
+
 @app.route('/api/generate-memo', methods=['POST'])
 def generate_memo_with_claude():
     """Use our AI assistant to analyze information and create a report."""
@@ -398,7 +511,7 @@ def generate_memo_with_claude():
     theme = data.get('theme', '')
     
     try:
-        memo = claude_api.generate_memo(content, research_task, context, theme)
+        memo = get_claude_api().generate_memo(content, research_task, context, theme, cache=use_memo_cache(data))
         
         if memo.startswith('Error'):
             return jsonify({'error': memo}), 400
@@ -407,6 +520,69 @@ def generate_memo_with_claude():
     except Exception as e:
         return jsonify({'error': f'Error generating memo: {str(e)}'}), 500
 
+def describe_sources(results):
+    """Report what happened to every source, without repeating the scraped text."""
+    return [
+        {key: value for key, value in result.items() if key != 'content'}
+        for result in results
+    ]
+
+def combine_source_content(results):
+    """
+    Join the scraped text of every source that worked into one document.
+    Sources keep the order they were given in, so memos are reproducible.
+    Returns None if no source could be scraped.
+    """
+    all_content = [
+        f"Source: {result['url']}\n\n{result['content']}\n\n"
+        for result in results
+        if result['status'] == 'ok'
+    ]
+    if not all_content:
+        return None
+    return "\n---\n".join(all_content)
+
+def add_persona_to_context(context, persona):
+    """Put the persona's details in front of the context so the memo is tailored to them."""
+    if not persona:
+        return context
+    
+    persona_info = f"This memo is prepared for {persona.get('name')}, {persona.get('position')}.\n"
+    if persona.get('interests'):
+        persona_info += f"Their interests include: {persona.get('interests')}\n"
+    if persona.get('background'):
+        persona_info += f"Background: {persona.get('background')}\n"
+    
+    # If there's existing context, append to it, otherwise use persona info as context
+    if context:
+        return f"{persona_info}\n{context}"
+    return persona_info
+
+def store_generated_trend(research_task, urls, context, theme, memo, persona=None):
+    """
+    Save a freshly generated memo as a new trend.
+    Returns the trend as it was stored (with its 'id', unless it went to the backup CSV file).
+    """
+    new_trend = {
+        'research_task': research_task,
+        'news_links': urls,  # Store all URLs
+        'context': context,
+        'date_discovered': datetime.now().strftime('%Y-%m-%d'),
+        'theme': theme,
+        'analysis': memo
+    }
+    
+    # Add persona information if available
+    if persona:
+        new_trend['persona'] = {
+            'id': persona.get('id', f"persona-{int(time.time())}"),  # Provide a fallback ID if not present
+            'name': persona.get('name', ''),
+            'position': persona.get('position', '')
+        }
+    
+    # Store the new trend
+    return get_trend_repository().add(new_trend).to_dict()
+
 @app.route('/api/scrape-and-generate', methods=['POST'])
 def scrape_and_generate():
     """Get information from websites and analyze it in one step."""
@@ -425,93 +601,431 @@ def scrape_and_generate():
     source_type = data.get('source_type', 'auto').lower()
     persona = data.get('persona', None)
     
+    # With "async": true, queue the work and answer straight away with a job ID
+    if data.get('async') or request.args.get('async', '').lower() in ('true', '1'):
+        job = job_queue.submit('scrape-and-generate', {**data, 'use_cache': use_memo_cache(data)})
+        response = jsonify({**job, 'status_url': f"/api/jobs/{job['id']}"})
+        response.headers['Location'] = f"/api/jobs/{job['id']}"
+        return response, 202
+    
     try:
-        # Collect content from all URLs
-        all_content = []
+        # Collect content from all URLs at once (YouTube videos and webpages alike)
+        results = ContentScraper.scrape_many(urls, source_type)
+        sources = describe_sources(results)
         
-        for url in urls:
-            # Figure out if it's a YouTube video or regular webpage
-            current_source_type = source_type
-            if current_source_type == 'auto':
-                if 'youtube.com' in url or 'youtu.be' in url:
-                    current_source_type = 'youtube'
-                else:
-                    current_source_type = 'webpage'
-            
-            # Get the content
-            if current_source_type == 'youtube':
-                content = ContentScraper.get_youtube_transcript(url)
-            else:
-                content = ContentScraper.get_webpage_content(url)
-            
-            if content.startswith('Error'):
-                return jsonify({'error': f'Error scraping {url}: {content}'}), 400
-            
-            all_content.append(f"Source: {url}\n\n{content}\n\n")
-        
-        # Combine all content
-        combined_content = "\n---\n".join(all_content)
+        combined_content = combine_source_content(results)
+        if combined_content is None:
+            return jsonify({'error': 'Could not scrape any of the provided URLs', 'sources': sources}), 400
         
         # Enhance context with persona information if available
-        enhanced_context = context
-        if persona:
-            persona_info = f"This memo is prepared for {persona.get('name')}, {persona.get('position')}.\n"
-            if persona.get('interests'):
-                persona_info += f"Their interests include: {persona.get('interests')}\n"
-            if persona.get('background'):
-                persona_info += f"Background: {persona.get('background')}\n"
-            
-            # If there's existing context, append to it, otherwise use persona info as context
-            if context:
-                enhanced_context = f"{persona_info}\n{context}"
-            else:
-                enhanced_context = persona_info
+        enhanced_context = add_persona_to_context(context, persona)
         
         # Analyze the content
-        memo = claude_api.generate_memo(combined_content, research_task, enhanced_context, theme)
+        memo = get_claude_api().generate_memo(combined_content, research_task, enhanced_context, theme, cache=use_memo_cache(data))
         
         if memo.startswith('Error'):
             return jsonify({'error': memo}), 400
         
         # Save everything as a new trend
-        new_trend = {
-            'research_task': research_task,
-            'news_links': urls,  # Store all URLs
-            'context': enhanced_context,
-            'date_discovered': pd.Timestamp.now().strftime('%Y-%m-%d'),
-            'theme': theme,
-            'analysis': memo
-        }
+        new_trend = store_generated_trend(research_task, urls, enhanced_context, theme, memo, persona)
+        
+        # Tell the caller which sources made it into the memo
+        return jsonify({**new_trend, 'sources': sources}), 201
+    except Exception as e:
+        return jsonify({'error': f'Error processing request: {str(e)}'}), 500
+
+# Background jobs
+# /api/scrape-and-generate with "async": true hands the work to a small pool of
+# worker threads, so a slow Claude call doesn't hold an HTTP request open
+
+def run_scrape_and_generate_job(job):
+    """Do the scrape-and-generate pipeline for a queued job, timing each stage."""
+    # The job's log lines carry its job ID as their trace ID
+    trace = metrics.start_trace(job.id)
+    try:
+        return scrape_and_generate_for_job(job)
+    finally:
+        metrics.end_trace(trace)
+
+def scrape_and_generate_for_job(job):
+    data = job.payload
+    urls = data['urls']
+    research_task = data['research_task']
+    context = data.get('context', '')
+    theme = data.get('theme', '')
+    persona = data.get('persona', None)
+    
+    with job.stage('scrape'):
+        results = ContentScraper.scrape_many(urls, data.get('source_type', 'auto').lower())
+    sources = describe_sources(results)
+    
+    combined_content = combine_source_content(results)
+    if combined_content is None:
+        raise JobFailed('Could not scrape any of the provided URLs', {'sources': sources})
+    
+    enhanced_context = add_persona_to_context(context, persona)
+    with job.stage('generate'):
+        memo = get_claude_api().generate_memo(
+            combined_content, research_task, enhanced_context, theme,
+            cache=data.get('use_cache', True)
+        )
+    if memo.startswith('Error'):
+        raise JobFailed(memo, {'sources': sources})
+    
+    with job.stage('store'):
+        new_trend = store_generated_trend(research_task, urls, enhanced_context, theme, memo, persona)
+    return {**new_trend, 'sources': sources}
+
+job_queue = JobQueue(
+    Config.JOBS_DB_PATH,
+    {'scrape-and-generate': run_scrape_and_generate_job},
+    workers=Config.JOB_WORKERS,
+    poll_interval=Config.JOB_POLL_INTERVAL,
+    retention_seconds=Config.JOB_RETENTION_SECONDS,
+    heartbeat_interval=Config.JOB_HEARTBEAT_SECONDS,
+    heartbeat_timeout=Config.JOB_HEARTBEAT_TIMEOUT,
+)
+
+# Feeds: new items from the feeds in Config.FEEDS_FILE become scrape-and-generate jobs
+feed_poller = FeedPoller(
+    Config.FEEDS_DB_PATH,
+    Config.FEEDS_FILE,
+    lambda payload: job_queue.submit('scrape-and-generate', payload),
+    workers=Config.FEED_MAX_WORKERS,
+    check_interval=Config.FEED_CHECK_INTERVAL,
+)
+
+@app.before_request
+def start_job_workers():
+    # Starts this worker's job threads on its first request, so jobs queued
+    # before a restart are picked up again
+    job_queue.start()
+    if Config.FEED_POLLING_ENABLED:
+        feed_poller.start()
+
+# Startup and readiness
+# Nothing slow happens when this file is imported. warm_up sets a worker up
+# before it takes traffic (gunicorn.conf.py calls it in every new worker), and
+# /api/ready tells a load balancer whether this worker is set up yet.
+
+def readiness_report():
+    """Say which parts of this worker process are set up, and whether all of them are."""
+    firestore = firestore_resource.status()
+    firestore['connected'] = firestore['ready'] and get_db() is not None
+    
+    trends = trends_resource.status()
+    trends['ready'] = trends['ready'] and get_trend_repository().loaded
+    if trends['ready']:
+        trends['source'] = get_trend_repository().source
+    
+    subsystems = {
+        'firestore': firestore,
+        'claude': claude_resource.status(),
+        'trends': trends,
+        'job_workers': {'ready': job_queue.running},
+        'feed_poller': {
+            'ready': feed_poller.running or not Config.FEED_POLLING_ENABLED,
+            'enabled': Config.FEED_POLLING_ENABLED,
+        },
+    }
+    return {
+        'pid': os.getpid(),
+        'ready': all(subsystem['ready'] for subsystem in subsystems.values()),
+        'subsystems': subsystems,
+    }
+
+# Libraries that are slow to import but don't connect to anything or start any
+# threads when imported, so a gunicorn master can import them once for all its
+# workers. (The Firebase SDK isn't one of them: its gRPC layer isn't fork-safe.)
+PRELOAD_MODULES = ('anthropic',)
+
+def preload_modules():
+    """Import the slow libraries in PRELOAD_MODULES now, without setting anything up."""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+
+def warm_up():
+    """
+    Set up everything this worker process needs now, instead of on the first requests:
+    connect to the database, set up Claude, load the trends and start the background threads.
+    Call it after the process has been forked (never in a gunicorn --preload master).
+    Returns the same report as /api/ready.
+    """
+    warm_up_resources([firestore_resource, claude_resource, trends_resource])
+    try:
+        get_trend_repository().load()
+    except Exception as e:
+        print(f"Error loading trends: {e}")
+    start_job_workers()
+    return readiness_report()
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Check whether this worker is set up; answers 503 until it is (this worker only)."""
+    report = readiness_report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+@app.route('/api/jobs/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Check on a background job; its 'result' appears once it has finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs/<string:job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a background job. A running job stops before its next stage."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Show queue depth and per-stage latency for recent jobs (all workers)."""
+    return jsonify(job_queue.stats()), 200
+
+@app.route('/api/feeds', methods=['GET'])
+def feed_status():
+    """Show every feed we poll: when it was last read, what it answered and how many items it queued."""
+    return jsonify(feed_poller.stats()), 200
+
+@app.route('/api/feeds/poll', methods=['POST'])
+def poll_feeds():
+    """Re-read the feed list and poll every feed that is due right now."""
+    try:
+        feed_poller.sync_feeds(force=True)
+        results = feed_poller.poll_due()
+    except Exception as e:
+        return jsonify({'error': f'Error polling feeds: {str(e)}'}), 500
+    return jsonify({
+        'polled': len(results),
+        'queued': sum(result['queued'] for result in results),
+        'results': results,
+    }), 200
+
+# Streaming versions of the memo endpoints
+# These send the memo back piece by piece (as Server-Sent Events) while Claude
+# is still writing it, instead of making the user wait for the whole thing
+
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Wrap an event generator in a streaming response that proxies won't buffer."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_memo_events(content, research_task, context, theme, use_cache=True):
+    """
+    Relay the memo as 'token' events while Claude writes it.
+    A cached memo for the same inputs is sent as a single 'token' event instead.
+    Returns the whole memo when it's finished, or None after sending an 'error' event.
+    """
+    try:
+        claude_api = get_claude_api()
+    except Exception as e:
+        yield sse_event('error', {'error': f'Error generating memo: {str(e)}'})
+        return None
+    
+    if use_cache:
+        memo = claude_api.cached_memo(content, research_task, context, theme)
+        if memo is not None:
+            yield sse_event('token', {'text': memo, 'cached': True})
+            return memo
+    
+    parts = []
+    try:
+        for text in claude_api.stream_memo(content, research_task, context, theme):
+            parts.append(text)
+            yield sse_event('token', {'text': text})
+    except Exception as e:
+        yield sse_event('error', {'error': f'Error generating memo: {str(e)}'})
+        return None
+    memo = ''.join(parts)
+    claude_api.remember_memo(content, research_task, context, theme, memo)
+    return memo
+
+@app.route('/api/generate-memo/stream', methods=['POST'])
+def stream_generate_memo():
+    """
+    Like /api/generate-memo, but streams the memo as it's written.
+    
+    Events: 'token' ({text}) for each piece of the memo, then 'done'
+    ({analysis}) with the whole memo, or 'error' ({error}).
+    """
+    data = request.json
+    
+    if not data:
+        return jsonify({'error': 'Missing request data'}), 400
+    
+    if 'content' not in data or 'research_task' not in data:
+        return jsonify({'error': 'Missing required fields: content and research_task'}), 400
+    
+    content = data['content']
+    research_task = data['research_task']
+    context = data.get('context', '')
+    theme = data.get('theme', '')
+    
+    use_cache = use_memo_cache(data)
+    
+    def events():
+        memo = yield from stream_memo_events(content, research_task, context, theme, use_cache)
+        if memo is not None:
+            yield sse_event('done', {'analysis': memo})
+    
+    return sse_response(events())
+
+@app.route('/api/scrape-and-generate/stream', methods=['POST'])
+def stream_scrape_and_generate():
+    """
+    Like /api/scrape-and-generate, but reports progress as it goes.
+    
+    Events: a 'source' event as each URL finishes scraping, 'token' events
+    while the memo is written, then 'done' with the saved trend (and its
+    sources), or 'error'.
+    """
+    data = request.json
+    
+    if not data:
+        return jsonify({'error': 'Missing request data'}), 400
+    
+    if 'urls' not in data or 'research_task' not in data:
+        return jsonify({'error': 'Missing required fields: urls and research_task'}), 400
+    
+    urls = data['urls']
+    research_task = data['research_task']
+    context = data.get('context', '')
+    theme = data.get('theme', '')
+    source_type = data.get('source_type', 'auto').lower()
+    persona = data.get('persona', None)
+    use_cache = use_memo_cache(data)
+    
+    def events():
+        # Tell the user about each source as soon as it's been scraped
+        results = [None] * len(urls)
+        for position, result in ContentScraper.iter_scrape(urls, source_type):
+            results[position] = result
+            yield sse_event('source', {'position': position, **describe_sources([result])[0]})
+        sources = describe_sources(results)
         
-        # Add persona information if available
-        if persona:
-            new_trend['persona'] = {
-                'id': persona.get('id', f"persona-{int(time.time())}"),  # Provide a fallback ID if not present
-                'name': persona.get('name', ''),
-                'position': persona.get('position', '')
-            }
+        combined_content = combine_source_content(results)
+        if combined_content is None:
+            yield sse_event('error', {'error': 'Could not scrape any of the provided URLs', 'sources': sources})
+            return
         
-        # Store the new trend
-        if db:
-            doc_ref = db.collection(TRENDS_COLLECTION).add(new_trend)
-            # Check if doc_ref is a tuple and extract the first element if it is
-            if isinstance(doc_ref, tuple) and len(doc_ref) > 0:
-                new_trend['id'] = doc_ref[0].id
-            else:
-                # Try to get the ID directly if it's not a tuple
-                try:
-                    new_trend['id'] = doc_ref.id
-                except AttributeError:
-                    # If we can't get an ID, generate a random one
-                    new_trend['id'] = f"trend-{int(time.time())}"
-        else:
-            df = load_trends_data()
-            df = pd.concat([df, pd.DataFrame([new_trend])], ignore_index=True)
-            save_trends_data(df)
+        enhanced_context = add_persona_to_context(context, persona)
+        memo = yield from stream_memo_events(combined_content, research_task, enhanced_context, theme, use_cache)
+        if memo is None:
+            return
         
-        return jsonify(new_trend), 201
+        # Save the finished memo, just like the non-streaming endpoint
+        try:
+            new_trend = store_generated_trend(research_task, urls, enhanced_context, theme, memo, persona)
+        except Exception as e:
+            yield sse_event('error', {'error': f'Error saving memo: {str(e)}', 'analysis': memo})
+            return
+        yield sse_event('done', {**new_trend, 'sources': sources})
+    
+    return sse_response(events())
+
+@app.route('/api/claude/stats', methods=['GET'])
+def claude_stats():
+    """Show time-to-first-token for streamed memos and memo input token counts (this worker only)."""
+    try:
+        claude_api = get_claude_api()
     except Exception as e:
-        return jsonify({'error': f'Error processing request: {str(e)}'}), 500
+        return jsonify({'error': f'Claude is not available: {str(e)}'}), 503
+    return jsonify({
+        'pid': os.getpid(),
+        'streams': claude_api.stream_stats(),
+        'input_reduction': claude_api.reduction_stats(),
+    }), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Show how often scraped content and memos were served from the cache, and how fresh our trend copy is (this worker only)."""
+    return jsonify({
+        'pid': os.getpid(),
+        'pages': page_cache.stats(),
+        'transcripts': transcript_cache.stats(),
+        'memos': memo_cache.stats(),
+        'trends': get_trend_repository().stats(),
+    }), 200
+
+@app.route('/api/scrape/hosts', methods=['GET'])
+def scrape_host_stats():
+    """Show how fast we're sending requests to each site and how long requests waited for their turn (this worker only)."""
+    return jsonify({
+        'pid': os.getpid(),
+        'hosts': host_scheduler.stats(),
+    }), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Show request and stage timings, cache, retry and error counts for all workers, in Prometheus format."""
+    if not Config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are turned off'}), 404
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def profiler_access_error():
+    """Why a request can't use the profiler endpoints, as a response, or None if it can."""
+    if not profiler.enabled:
+        return jsonify({'error': 'Profiling is turned off (set PROFILER_TOKEN to turn it on)'}), 404
+    if not profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'A valid X-Profile-Token header is required'}), 403
+    return None
+
+@app.route('/api/profiler', methods=['GET'])
+def profiler_status():
+    """Show what this worker is set to profile, and the saved profiles from every worker."""
+    error = profiler_access_error()
+    if error:
+        return error
+    return jsonify({**profiler.state(), 'profiles': profiler.profiles()}), 200
+
+@app.route('/api/profiler', methods=['POST'])
+def arm_profiler():
+    """Profile this worker's next requests (send "requests" and, optionally, a "route")."""
+    error = profiler_access_error()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(data.get('requests', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'requests must be a number'}), 400
+    if count < 1:
+        return jsonify({'error': 'requests must be at least 1'}), 400
+    return jsonify(profiler.arm(count, data.get('route') or None)), 200
+
+@app.route('/api/profiler', methods=['DELETE'])
+def disarm_profiler():
+    """Stop profiling this worker's requests (ones carrying the token are still profiled)."""
+    error = profiler_access_error()
+    if error:
+        return error
+    return jsonify(profiler.disarm()), 200
+
+@app.route('/api/profiler/profiles/<string:profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Fetch a saved profile: ?format=top (the default), collapsed (for flame graphs) or json."""
+    error = profiler_access_error()
+    if error:
+        return error
+    try:
+        text = profiler.read(profile_id, request.args.get('format', 'top'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if text is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    content_type = 'application/json' if request.args.get('format') == 'json' else 'text/plain; charset=utf-8'
+    return Response(text, content_type=content_type)
 
 @app.route('/api/check-claude-key', methods=['GET'])
 def check_claude_key():
@@ -531,6 +1045,10 @@ def extract_date_from_url():
     2. Check for meta tags in the HTML that might contain dates
     3. Look for common date patterns in the page content
     
+    Only as much of the page is downloaded as it takes to find the date
+    (usually just the <head>), and a page we've already read isn't
+    downloaded again.
+    
     Returns:
         JSON with extracted date or error message
     """
@@ -542,30 +1060,15 @@ def extract_date_from_url():
     url = data['url']
     
     try:
-        # First, try to extract date from URL structure
+        # First, try to extract date from URL structure (no download needed)
         date_from_url = extract_date_from_url_pattern(url)
         if date_from_url:
             return jsonify({'date': date_from_url.strftime('%Y-%m-%d')})
         
-        # If that fails, try to extract from content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Try to extract date from meta tags
-        date_from_meta = extract_date_from_meta_tags(soup)
-        if date_from_meta:
-            return jsonify({'date': date_from_meta.strftime('%Y-%m-%d')})
-        
-        # Try to extract date from content
-        date_from_content = extract_date_from_content(soup)
-        if date_from_content:
-            return jsonify({'date': date_from_content.strftime('%Y-%m-%d')})
+        # If that fails, read the page's meta tags and content
+        lookup = ContentScraper.lookup_date(url)
+        if lookup['published_date']:
+            return jsonify({'date': lookup['published_date']})
         
         # If all methods fail, return today's date
         return jsonify({'date': datetime.now().strftime('%Y-%m-%d'), 'note': 'Could not extract date, using current date'})
@@ -574,117 +1077,84 @@ def extract_date_from_url():
         print(f"Error extracting date: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-def extract_date_from_url_pattern(url):
-    """Extract date from common URL patterns"""
-    # Parse the URL
-    parsed_url = urlparse(url)
-    path = parsed_url.path
-    query = parsed_url.query
-    
-    # Common date patterns in URLs
-    patterns = [
-        # Match YYYY/MM/DD in path
-        r'/(\d{4})/(\d{1,2})/(\d{1,2})/',
-        # Match YYYY-MM-DD in path
-        r'/(\d{4})-(\d{1,2})-(\d{1,2})/',
-        # Match date=YYYY-MM-DD in query
-        r'[?&]date=(\d{4})-(\d{1,2})-(\d{1,2})',
-        # Match published=YYYY-MM-DD in query
-        r'[?&]published=(\d{4})-(\d{1,2})-(\d{1,2})'
-    ]
+@app.route('/api/extract-date/batch', methods=['POST'])
+def extract_dates_batch():
+    """
+    Extract publication dates for a list of URLs in one request.
     
-    for pattern in patterns:
-        match = re.search(pattern, path + '?' + query)
-        if match:
-            year = int(match.group(1))
-            month = int(match.group(2))
-            day = int(match.group(3))
-            
-            # Validate date components
-            current_year = datetime.now().year
-            if 1990 <= year <= current_year and 1 <= month <= 12 and 1 <= day <= 31:
-                try:
-                    return datetime(year, month, day)
-                except ValueError:
-                    # Invalid date like February 30
-                    continue
+    Dates found in the URL itself come back straight away. The other pages are
+    fetched a few at a time, each with its own timeout, and every answer is
+    sent as soon as it's ready, as one JSON object per line (NDJSON):
     
-    return None
-
-def extract_date_from_meta_tags(soup):
-    """Extract date from HTML meta tags"""
-    # Common meta tags that might contain publication dates
-    meta_tags = [
-        'article:published_time',
-        'article:modified_time',
-        'og:published_time',
-        'og:modified_time',
-        'publication_date',
-        'date',
-        'pubdate'
-    ]
+        {"position": 0, "url": "...", "date": "2024-03-01", "method": "url",
+         "status": "ok", "elapsed_ms": 0}
     
-    for tag_name in meta_tags:
-        # Look for the meta tag
-        meta_tag = soup.find('meta', property=tag_name) or soup.find('meta', attrs={'name': tag_name})
-        
-        if meta_tag and meta_tag.get('content'):
-            date_str = meta_tag.get('content')
-            try:
-                # Try to parse ISO format date (YYYY-MM-DDTHH:MM:SS)
-                date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                return date_obj
-            except ValueError:
-                try:
-                    # Try other common formats
-                    for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%d-%m-%Y', '%d/%m/%Y']:
-                        try:
-                            return datetime.strptime(date_str, fmt)
-                        except ValueError:
-                            continue
-                except:
-                    continue
+    'method' says how the date was found: 'url', 'meta', 'content', or
+    'fallback' when nothing was found (or the page couldn't be read) and
+    today's date is used instead. 'status' is 'ok', 'error' or 'timeout'.
+    """
+    data = request.get_json()
     
-    return None
+    if not data or not isinstance(data.get('urls'), list):
+        return jsonify({'error': 'A list of URLs is required'}), 400
+    
+    urls = data['urls']
+    if not all(isinstance(url, str) and url.strip() for url in urls):
+        return jsonify({'error': 'Every URL must be a non-empty string'}), 400
+    if len(urls) > Config.DATE_BATCH_MAX_URLS:
+        return jsonify({'error': f'At most {Config.DATE_BATCH_MAX_URLS} URLs per request'}), 400
+    
+    urls = [url.strip() for url in urls]
+    
+    def lines():
+        for position, result in ContentScraper.iter_dates(urls):
+            # Like the single-URL endpoint, fall back to today's date
+            if not result['date']:
+                result.update({'date': datetime.now().strftime('%Y-%m-%d'), 'method': 'fallback'})
+            yield json.dumps({'position': position, **result}) + '\n'
+    
+    return Response(
+        stream_with_context(lines()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-def extract_date_from_content(soup):
-    """Extract date from page content using common patterns"""
-    # Remove script and style elements
-    for script in soup(["script", "style"]):
-        script.extract()
-    
-    # Get text
-    text = soup.get_text()
-    
-    # Common date formats in text
-    date_patterns = [
-        r'Published:?\s*(\w+\s+\d{1,2},\s+\d{4})',
-        r'Posted:?\s*(\w+\s+\d{1,2},\s+\d{4})',
-        r'Date:?\s*(\w+\s+\d{1,2},\s+\d{4})',
-        r'(\d{1,2}\s+\w+\s+\d{4})',
-        r'(\w+\s+\d{1,2}\s+\d{4})',
-        r'(\d{4}-\d{2}-\d{2})'
-    ]
+@app.route('/api/extract-document', methods=['POST'])
+def extract_document():
+    """
+    Read a webpage or YouTube video once and return everything we know about it:
+    title, description, canonical URL, publication date (and how it was found),
+    and the main text or transcript.
+    """
+    data = request.get_json()
     
-    for pattern in date_patterns:
-        match = re.search(pattern, text)
-        if match:
-            date_str = match.group(1)
-            try:
-                # Try different date formats
-                for fmt in ['%B %d, %Y', '%d %B %Y', '%B %d %Y', '%Y-%m-%d']:
-                    try:
-                        return datetime.strptime(date_str, fmt)
-                    except ValueError:
-                        continue
-            except:
-                continue
+    if not data or 'url' not in data:
+        return jsonify({'error': 'URL is required'}), 400
     
-    return None
+    try:
+        document = ContentScraper.extract_document(data['url'], data.get('source_type', 'auto').lower())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error extracting document: {str(e)}")
+        return jsonify({'error': f'Error extracting document: {str(e)}'}), 500
+    
+    if document['source_type'] == 'youtube':
+        # Video documents skip the watch page, so read the date and description from it now
+        try:
+            lookup = ContentScraper.lookup_date(document['canonical_url'])
+            document = {**document, **{key: lookup[key] for key in ('published_date', 'date_source', 'description')}}
+        except Exception as e:
+            print(f"Error reading YouTube watch page: {str(e)}")
+    
+    return jsonify(document), 200
 
 # This block is used when running the app directly (not through gunicorn)
 if __name__ == '__main__':
     # Get the port from environment variable or use 5001 as default
     port = int(os.environ.get('PORT', 5001))
+    # Warm up the process that serves requests (with debug on, that's the reloader's child)
+    if Config.WARM_UP_ON_START and (not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        warm_up()
     # Run the app with the specified host and port
     app.run(host='0.0.0.0', port=port, debug=Config.DEBUG)
@@ -0,0 +1,167 @@
+"""
+Benchmark: publication date lookups, full download vs streamed early stop
+
+Serves the saved pages in benchmarks/html_corpus from a local server that
+sends at a fixed bandwidth, along with a copy of each page with its date meta
+tags removed (so the date has to come from the text). Each page is looked up
+two ways:
+
+- full: download the whole page, parse it and search all of its text (what
+  /api/extract-date did before)
+- streamed: ContentScraper.scan_page_for_date(), which parses the response
+  as it arrives and closes the connection as soon as the date is known
+
+and the benchmark reports the bytes the server actually sent, the latency per
+lookup and whether both found the same date.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_date_lookup --bandwidth-mbps 50 --ttfb-ms 50
+"""
+
+import os
+import re
+import time
+import argparse
+import itertools
+import threading
+import statistics
+import http.server
+
+import http_client
+from config import Config
+from html_extract import parse_html
+from date_extract import find_publication_date
+from scraper import ContentScraper
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'html_corpus')
+
+DATE_META = re.compile(rb'<meta[^>]*(?:published_time|modified_time|datePublished|uploadDate)[^>]*>', re.I)
+
+CHUNK_BYTES = 16 * 1024
+
+_request_ids = itertools.count()
+
+
+def load_pages(folder):
+    pages = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(folder, name), 'rb') as f:
+                html = f.read()
+            stem = name[:-len('.html')]
+            pages[stem] = html
+            pages[f"{stem}-no-meta"] = DATE_META.sub(b'', html)
+    return pages
+
+
+def start_server(pages, bandwidth_mbps, ttfb_ms):
+    """Serve the pages at a fixed bandwidth; returns (base URL, bytes sent by request id)."""
+    sent = {}
+    seconds_per_chunk = CHUNK_BYTES * 8 / (bandwidth_mbps * 1000 * 1000)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            name, _, request_id = self.path.strip('/').partition('?id=')
+            body = pages[name]
+            time.sleep(ttfb_ms / 1000)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            count = 0
+            try:
+                for start in range(0, len(body), CHUNK_BYTES):
+                    chunk = body[start:start + CHUNK_BYTES]
+                    self.wfile.write(chunk)
+                    self.wfile.flush()
+                    count += len(chunk)
+                    time.sleep(seconds_per_chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+            sent[request_id] = count
+
+    class Server(http.server.ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            # Clients hanging up early is the point of the exercise
+            pass
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", sent
+
+
+def full_lookup(url):
+    response = http_client.get(url)
+    date, method = find_publication_date(url, parse_html(response.content), max_chars=len(response.content))
+    return date.strftime('%Y-%m-%d') if date else None, method
+
+
+def streamed_lookup(url):
+    lookup = ContentScraper.scan_page_for_date(url)
+    return lookup['published_date'], lookup['date_source']
+
+
+def measure(lookup, base_url, sent, name, repeat):
+    latencies = []
+    bytes_sent = []
+    result = None
+    for _ in range(repeat):
+        request_id = str(next(_request_ids))
+        started = time.perf_counter()
+        result = lookup(f"{base_url}/{name}?id={request_id}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        # The server records a request once its handler finishes
+        deadline = time.monotonic() + 5
+        while request_id not in sent and time.monotonic() < deadline:
+            time.sleep(0.001)
+        bytes_sent.append(sent.get(request_id, 0))
+    return result, statistics.median(latencies), statistics.mean(bytes_sent)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='folder of saved .html pages')
+    parser.add_argument('--repeat', type=int, default=5, help='lookups per page and strategy')
+    parser.add_argument('--bandwidth-mbps', type=float, default=50, help='simulated server bandwidth in Mbit/s')
+    parser.add_argument('--ttfb-ms', type=float, default=50, help='simulated time to first byte')
+    args = parser.parse_args()
+
+    # Every page comes from the one local server; measure the downloads, not
+    # the per-host pacing the scraper would apply to a real site
+    Config.HOST_RATE_PER_SECOND = Config.HOST_MAX_RATE_PER_SECOND = float('inf')
+    Config.ROBOTS_TXT_ENABLED = False
+    # The scraper's stage logs would end up between the table rows
+    Config.TRACE_LOGS = Config.METRICS_ENABLED = False
+
+    pages = load_pages(args.corpus)
+    base_url, sent = start_server(pages, args.bandwidth_mbps, args.ttfb_ms)
+    print(f"{len(pages)} pages at {args.bandwidth_mbps:g} Mbit/s, {args.ttfb_ms:g} ms to first byte, "
+          f"{Config.DATE_SCAN_BODY_BYTES // 1024} KB read past the <head> at most\n")
+
+    print(f"{'page':>30} {'size KB':>8} {'full KB':>8} {'full ms':>8} {'stream KB':>10} {'stream ms':>10} {'method':>8} {'same':>5}")
+    totals = {'full_bytes': 0, 'full_ms': 0, 'stream_bytes': 0, 'stream_ms': 0}
+    agreed = 0
+    for name, html in pages.items():
+        (full_date, _), full_ms, full_bytes = measure(full_lookup, base_url, sent, name, args.repeat)
+        (stream_date, method), stream_ms, stream_bytes = measure(streamed_lookup, base_url, sent, name, args.repeat)
+        same = full_date == stream_date
+        agreed += same
+        totals['full_bytes'] += full_bytes
+        totals['full_ms'] += full_ms
+        totals['stream_bytes'] += stream_bytes
+        totals['stream_ms'] += stream_ms
+        print(f"{name:>30} {len(html) / 1024:>8.0f} {full_bytes / 1024:>8.0f} {full_ms:>8.1f} "
+              f"{stream_bytes / 1024:>10.0f} {stream_ms:>10.1f} {method or '-':>8} {'yes' if same else 'NO':>5}")
+
+    print(f"\nsame date on {agreed}/{len(pages)} pages")
+    print(f"bytes sent: {totals['stream_bytes'] / totals['full_bytes']:.0%} of a full download; "
+          f"median latency: {totals['full_ms'] / totals['stream_ms']:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: polling many RSS/Atom feeds with FeedPoller
+
+Serves a few hundred generated feeds (RSS and Atom, alternately) from a local
+fixture server that answers conditional GETs with 304, and runs FeedPoller
+over them in rounds:
+
+1. first poll: every feed is new (only the newest few items of each are queued)
+2. nothing changed: every feed should answer 304
+3. a tenth of the feeds publish two items: only those items should be queued
+4. the same again, polled by two pollers at once (two worker processes
+   sharing one database): no feed fetched twice, no item queued twice
+
+Each round reports the feeds fetched, how many answered 304, the feed bytes
+the server sent, items queued and duplicates, and the wall time.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_feed_ingest --feeds 300 --items 20
+"""
+
+import os
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+import http.server
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from feeds import FeedPoller
+
+RSS_ITEM = """<item><title>Story {n} from feed {feed}</title><link>/feed{feed}/story{n}</link>
+<guid isPermaLink="false">feed{feed}-story{n}</guid><pubDate>Mon, 06 May 2024 10:{minute:02d}:00 GMT</pubDate>
+<description>{padding}</description></item>"""
+
+ATOM_ENTRY = """<entry><title>Story {n} from feed {feed}</title><link rel="alternate" href="/feed{feed}/story{n}"/>
+<id>urn:feed{feed}:story{n}</id><updated>2024-05-06T10:{minute:02d}:00Z</updated>
+<summary>{padding}</summary></entry>"""
+
+
+def render(feed, newest, count):
+    """A feed's XML, listing its ``count`` newest items, newest first."""
+    padding = 'Lorem ipsum dolor sit amet. ' * 20
+    numbers = range(newest, max(newest - count, 0), -1)
+    if feed % 2:
+        entries = ''.join(ATOM_ENTRY.format(n=n, feed=feed, minute=n % 60, padding=padding) for n in numbers)
+        return (f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f'<title>Feed {feed}</title>{entries}</feed>').encode('utf-8')
+    entries = ''.join(RSS_ITEM.format(n=n, feed=feed, minute=n % 60, padding=padding) for n in numbers)
+    return (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+            f'<title>Feed {feed}</title>{entries}</channel></rss>').encode('utf-8')
+
+
+def start_server(feeds, items):
+    """Serve the feeds; returns (base URL, newest item per feed, counters)."""
+    newest = {feed: items for feed in range(feeds)}
+    counters = Counter()
+    lock = threading.Lock()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if not self.path.startswith('/feed'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            feed = int(self.path[len('/feed'):].split('.')[0])
+            body = render(feed, newest[feed], items)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            with lock:
+                counters['requests'] += 1
+                counters[f"feed{feed}"] += 1
+            if self.headers.get('If-None-Match') == etag:
+                with lock:
+                    counters['not_modified'] += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            with lock:
+                counters['bytes'] += len(body)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/rss+xml' if feed % 2 == 0 else 'application/atom+xml')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", newest, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feeds', type=int, default=300, help='number of feeds')
+    parser.add_argument('--items', type=int, default=20, help='items listed in each feed')
+    parser.add_argument('--workers', type=int, default=Config.FEED_MAX_WORKERS, help='feeds polled at once')
+    args = parser.parse_args()
+
+    # Every feed comes from the one local server; measure the polling, not
+    # the per-host pacing the scraper would apply to real sites
+    Config.HOST_RATE_PER_SECOND = Config.HOST_MAX_RATE_PER_SECOND = float('inf')
+    Config.SCRAPE_PER_HOST_LIMIT = args.workers * 2
+    Config.ROBOTS_TXT_ENABLED = False
+    # Trace logs and metrics aren't measured either (they'd go to the real data folder)
+    Config.TRACE_LOGS = Config.METRICS_ENABLED = False
+
+    base_url, newest, counters = start_server(args.feeds, args.items)
+    folder = tempfile.mkdtemp(prefix='feed-bench-')
+    feeds_file = os.path.join(folder, 'feeds.json')
+    with open(feeds_file, 'w') as f:
+        f.write('[' + ','.join(f'{{"url": "{base_url}/feed{feed}.xml", "theme": "Bench"}}'
+                               for feed in range(args.feeds)) + ']')
+
+    queued = []
+    queued_lock = threading.Lock()
+
+    def submit(payload):
+        with queued_lock:
+            queued.append((payload['feed']['url'], payload['feed']['item_id']))
+            return {'id': str(len(queued))}
+
+    db_path = os.path.join(folder, 'feeds.sqlite3')
+    pollers = [FeedPoller(db_path, feeds_file, submit, workers=args.workers) for _ in range(2)]
+    pollers[0].sync_feeds()
+
+    print(f"{args.feeds} feeds of {args.items} items, {args.workers} polling threads per poller\n")
+    print(f"{'round':>28} {'fetched':>8} {'304s':>6} {'KB sent':>8} {'queued':>7} {'dupes':>6} {'seconds':>8}")
+
+    rounds = [('first poll', 1), ('nothing changed', 1), ('10% publish 2 items', 1), ('same, two pollers at once', 2)]
+    for name, poller_count in rounds:
+        if name.startswith(('10%', 'same')):
+            for feed in range(0, args.feeds, 10):
+                newest[feed] += 2
+        # Make every feed due now
+        pollers[0]._execute('UPDATE feeds SET next_poll_at = 0')
+
+        before_requests, before_304, before_bytes, before_queued = (
+            counters['requests'], counters['not_modified'], counters['bytes'], len(queued))
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=poller_count) as executor:
+            list(executor.map(lambda poller: poller.poll_due(), pollers[:poller_count]))
+        seconds = time.perf_counter() - started
+
+        duplicates = sum(count - 1 for count in Counter(queued).values() if count > 1)
+        print(f"{name:>28} {counters['requests'] - before_requests:>8} {counters['not_modified'] - before_304:>6} "
+              f"{(counters['bytes'] - before_bytes) / 1024:>8.0f} {len(queued) - before_queued:>7} "
+              f"{duplicates:>6} {seconds:>8.2f}")
+
+    stats = pollers[0].stats()
+    print(f"\n{stats['items_seen']} items remembered, {stats['items_queued']} queued, {stats['failing']} feeds failing")
+
+
+if __name__ == '__main__':
+    main()
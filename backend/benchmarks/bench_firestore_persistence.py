@@ -0,0 +1,207 @@
+"""
+Benchmark: Firestore persistence, delete-and-rewrite vs batched upserts
+
+Runs both persistence strategies against the in-memory Firestore stand-in and
+reports the RPC count, document writes and wall time for:
+1. Saving a full collection of N trends over an existing collection of N
+2. Changing a single trend in that collection
+
+The app only ever saves one trend at a time now (upsert_trend); the batched
+full-collection sync it used to run is kept here, for the comparison.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_firestore_persistence --docs 10000 --rpc-latency-ms 1
+"""
+
+import sys
+import time
+import argparse
+
+from benchmarks.fake_firestore import FakeFirestore
+from firestore_store import trend_document_id, upsert_trend
+
+COLLECTION = 'tech_trends'
+
+# Firestore rejects write batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+
+def make_trends(count):
+    return [
+        {
+            'id': f"trend-{i:06d}",
+            'research_task': f"Research task {i}",
+            'news_links': [f"https://example.com/articles/{i}"],
+            'context': 'Benchmark context',
+            'date_discovered': '2025-01-01',
+            'theme': f"theme-{i % 20}",
+            'analysis': 'x' * 2000,
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_delete_collection(coll_ref, batch_size):
+    """The previous recursive deleter: one delete RPC per document."""
+    docs = coll_ref.limit(batch_size).stream()
+    deleted = 0
+    for doc in docs:
+        doc.reference.delete()
+        deleted += 1
+    if deleted >= batch_size:
+        return legacy_delete_collection(coll_ref, batch_size)
+
+
+def legacy_save(db, trends):
+    """The previous save_trends_data: clear the collection, then add every row."""
+    trends_ref = db.collection(COLLECTION)
+    legacy_delete_collection(trends_ref, 10)
+    for trend in trends:
+        trends_ref.add(trend)
+
+
+def document_data(trend):
+    """The trend without its 'id', which lives in the document name instead."""
+    return {key: value for key, value in trend.items() if key != 'id'}
+
+
+def bulk_upsert(db, collection, trends):
+    """
+    Create or replace many trend documents using write batches.
+
+    Args:
+        db (firestore.Client): The Firestore client
+        collection (str): The collection name
+        trends (iterable): The trend dicts to write
+
+    Returns:
+        list: The document IDs, in the same order as the trends
+    """
+    coll_ref = db.collection(collection)
+    doc_ids = []
+    batch = db.batch()
+    pending = 0
+
+    for trend in trends:
+        doc_id = trend_document_id(trend)
+        batch.set(coll_ref.document(doc_id), document_data(trend))
+        doc_ids.append(doc_id)
+        pending += 1
+        if pending == MAX_BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    return doc_ids
+
+
+def bulk_delete(db, collection, doc_ids):
+    """
+    Delete many documents by ID using write batches.
+
+    Args:
+        db (firestore.Client): The Firestore client
+        collection (str): The collection name
+        doc_ids (iterable): The document IDs to delete
+
+    Returns:
+        int: How many deletes were issued
+    """
+    coll_ref = db.collection(collection)
+    batch = db.batch()
+    pending = 0
+    deleted = 0
+
+    for doc_id in doc_ids:
+        batch.delete(coll_ref.document(doc_id))
+        pending += 1
+        deleted += 1
+        if pending == MAX_BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    return deleted
+
+
+def list_document_ids(coll_ref):
+    """
+    List the IDs of every document in a collection without reading their fields.
+
+    Args:
+        coll_ref (firestore.CollectionReference): The collection
+
+    Returns:
+        list: The document IDs
+    """
+    return [doc.id for doc in coll_ref.select([]).stream()]
+
+
+def sync_collection(db, collection, trends):
+    """
+    Make a collection contain exactly the given trends.
+
+    Trends are upserted in place, and only documents that are no longer
+    present are deleted, so readers never see the collection empty.
+
+    Args:
+        db (firestore.Client): The Firestore client
+        collection (str): The collection name
+        trends (list): Every trend that should be in the collection
+
+    Returns:
+        dict: Counts of 'written' and 'deleted' documents
+    """
+    existing_ids = set(list_document_ids(db.collection(collection)))
+    written_ids = bulk_upsert(db, collection, trends)
+    deleted = bulk_delete(db, collection, existing_ids.difference(written_ids))
+    return {'written': len(written_ids), 'deleted': deleted}
+
+
+def run(label, db, action):
+    db.reset_stats()
+    started = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<42} {db.stats['rpcs']:>8} {db.stats['writes']:>8} {elapsed:>9.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--docs', type=int, default=10000, help='number of trends in the collection')
+    parser.add_argument('--rpc-latency-ms', type=float, default=1.0, help='simulated latency per RPC')
+    args = parser.parse_args()
+
+    # The legacy deleter recurses once per 10 documents
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), args.docs // 10 + 1000))
+
+    trends = make_trends(args.docs)
+    changed = dict(trends[0], context='Updated context')
+    latency = args.rpc_latency_ms / 1000
+
+    print(f"{args.docs} documents, {args.rpc_latency_ms:g} ms per RPC\n")
+    print(f"{'scenario':<42} {'RPCs':>8} {'writes':>8} {'wall':>10}")
+
+    db = FakeFirestore(rpc_latency=latency)
+    bulk_upsert(db, COLLECTION, trends)
+    run('full save: delete-and-rewrite (before)', db, lambda: legacy_save(db, trends))
+
+    db = FakeFirestore(rpc_latency=latency)
+    bulk_upsert(db, COLLECTION, trends)
+    run('full save: batched sync (after)', db, lambda: sync_collection(db, COLLECTION, trends))
+
+    db = FakeFirestore(rpc_latency=latency)
+    bulk_upsert(db, COLLECTION, trends)
+    run('one change: delete-and-rewrite (before)', db, lambda: legacy_save(db, [changed] + trends[1:]))
+
+    db = FakeFirestore(rpc_latency=latency)
+    bulk_upsert(db, COLLECTION, trends)
+    run('one change: single upsert (after)', db, lambda: upsert_trend(db, COLLECTION, changed))
+
+
+if __name__ == '__main__':
+    main()
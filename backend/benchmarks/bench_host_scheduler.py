@@ -0,0 +1,160 @@
+"""
+Benchmark: scraping rate-limited sites, unpaced vs the host scheduler
+
+Starts several local "sites", each of which answers 429 with a Retry-After
+once a client goes over its request rate, and fetches a batch of pages spread
+across them from a thread pool two ways:
+
+- unpaced: every thread sends as soon as it can, with urllib3 sleeping
+  through Retry-After and retrying (how the scraper behaved before)
+- scheduled: every request goes through host_scheduler.HostScheduler, which
+  paces each site, adapts to its 429s and pauses it for everyone on Retry-After
+
+and reports pages fetched per second, how many 429s the sites sent, how many
+pages failed and how long scheduled requests waited for their turn.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_host_scheduler --sites 4 --pages 200 --site-rate 5
+"""
+
+import time
+import argparse
+import threading
+import statistics
+import http.server
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import http_client
+from config import Config
+from host_scheduler import HostScheduler
+
+PAGE = b'<html><head><title>Page</title></head><body><article>Text</article></body></html>'
+
+
+def start_site(rate, latency_ms):
+    """Serve pages, answering 429 to anyone going over ``rate`` requests per second."""
+    counts = {'ok': 0, 'throttled': 0}
+    lock = threading.Lock()
+    bucket = {'tokens': rate, 'updated': time.monotonic()}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/robots.txt':
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            with lock:
+                now = time.monotonic()
+                bucket['tokens'] = min(rate, bucket['tokens'] + (now - bucket['updated']) * rate)
+                bucket['updated'] = now
+                allowed = bucket['tokens'] >= 1
+                if allowed:
+                    bucket['tokens'] -= 1
+                counts['ok' if allowed else 'throttled'] += 1
+
+            time.sleep(latency_ms / 1000)
+            if allowed:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html')
+                body = PAGE
+            else:
+                self.send_response(429)
+                self.send_header('Retry-After', '1')
+                body = b'Too many requests'
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", counts
+
+
+def unpaced_session():
+    """A session retrying the way http_client did before the scheduler."""
+    session = requests.Session()
+    retry = Retry(
+        total=Config.HTTP_RETRIES,
+        backoff_factor=Config.HTTP_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=64, max_retries=retry)
+    session.mount('http://', adapter)
+    return session
+
+
+def run(urls, workers, fetch):
+    ok = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status in executor.map(fetch, urls):
+            ok += status == 200
+    return ok, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, default=4, help='number of rate-limited sites')
+    parser.add_argument('--pages', type=int, default=200, help='pages to fetch, spread across the sites')
+    parser.add_argument('--site-rate', type=float, default=5, help='requests per second each site allows')
+    parser.add_argument('--latency-ms', type=float, default=50, help='time each site takes to answer')
+    parser.add_argument('--workers', type=int, default=16, help='fetching threads')
+    args = parser.parse_args()
+
+    # Retry counters would otherwise go to the real data/metrics.sqlite3
+    Config.TRACE_LOGS = Config.METRICS_ENABLED = False
+
+    print(f"{args.pages} pages from {args.sites} sites allowing {args.site_rate:g} requests/s each, "
+          f"{args.workers} threads\n")
+    print(f"{'strategy':>10} {'pages ok':>9} {'failed':>7} {'429s':>6} {'seconds':>8} {'pages/s':>8} "
+          f"{'wait p50 ms':>12} {'wait p95 ms':>12}")
+
+    for strategy in ('unpaced', 'scheduled'):
+        sites = [start_site(args.site_rate, args.latency_ms) for _ in range(args.sites)]
+        urls = [f"{sites[page % args.sites][0]}/page/{page}" for page in range(args.pages)]
+
+        if strategy == 'unpaced':
+            session = unpaced_session()
+
+            def fetch(url):
+                try:
+                    return session.get(url, timeout=30).status_code
+                except requests.RequestException:
+                    return None
+        else:
+            scheduler = HostScheduler()
+
+            def fetch(url):
+                try:
+                    return scheduler.fetch(url, lambda: http_client.get(url)).status_code
+                except Exception:
+                    return None
+
+        ok, seconds = run(urls, args.workers, fetch)
+        throttled = sum(counts['throttled'] for _, counts in sites)
+        p50 = p95 = '-'
+        if strategy == 'scheduled':
+            # The median site's p50 and the worst site's p95
+            waits = [host['queue_wait_ms'] for host in scheduler.stats().values()]
+            p50 = f"{statistics.median(wait['p50'] for wait in waits):.0f}"
+            p95 = f"{max(wait['p95'] for wait in waits):.0f}"
+        print(f"{strategy:>10} {ok:>9} {args.pages - ok:>7} {throttled:>6} {seconds:>8.1f} {ok / seconds:>8.1f} "
+              f"{p50:>12} {p95:>12}")
+
+
+if __name__ == '__main__':
+    main()
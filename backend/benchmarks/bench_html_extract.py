@@ -0,0 +1,164 @@
+"""
+Benchmark: webpage text extraction, BeautifulSoup vs the lxml engine
+
+Runs both extractors over the saved pages in benchmarks/html_corpus (or any
+folder of .html files) and reports pages per second, MB per second and how
+far extracting every page once raised the process's peak resident memory.
+Memory is measured in a fresh interpreter per extractor, so lxml's C
+allocations are counted too (Unix only).
+It also checks that both produce the same "Title:/Content:" output for every
+page and prints the first difference when they don't.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_html_extract --repeat 20
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import resource
+import subprocess
+from bs4 import BeautifulSoup
+
+from html_extract import extract_main_text
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'html_corpus')
+
+
+def beautifulsoup_extract(html):
+    """The BeautifulSoup extraction the scraper used before html_extract."""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    for script in soup(["script", "style", "nav", "footer", "header"]):
+        script.extract()
+
+    title = soup.find('title').text if soup.find('title') else "No title found"
+
+    main_content = None
+    if soup.find('article'):
+        main_content = soup.find('article')
+    elif soup.find('main'):
+        main_content = soup.find('main')
+    elif soup.find('div', {'id': re.compile('content|article|main', re.I)}):
+        main_content = soup.find('div', {'id': re.compile('content|article|main', re.I)})
+    elif soup.find('div', {'class': re.compile('content|article|main', re.I)}):
+        main_content = soup.find('div', {'class': re.compile('content|article|main', re.I)})
+
+    if main_content:
+        text = main_content.get_text(separator='\n', strip=True)
+    else:
+        text = soup.body.get_text(separator='\n', strip=True)
+
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = '\n'.join(chunk for chunk in chunks if chunk)
+
+    return f"Title: {title}\n\nContent:\n{text}"
+
+
+def load_corpus(folder):
+    pages = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(folder, name), 'r', encoding='utf-8') as f:
+                pages[name] = f.read()
+    return pages
+
+
+def first_difference(expected, actual):
+    for number, (left, right) in enumerate(zip(expected.splitlines(), actual.splitlines()), 1):
+        if left != right:
+            return f"line {number}: {left[:60]!r} != {right[:60]!r}"
+    return f"length {len(expected)} != {len(actual)}"
+
+
+EXTRACTORS = {'beautifulsoup': beautifulsoup_extract, 'lxml': extract_main_text}
+
+
+def peak_rss_mb():
+    # On Linux, ru_maxrss is carried over from the parent process, so prefer
+    # the high-water mark of this process's own address space
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS reports bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+
+
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except OSError:
+        # No /proc (macOS): the peak so far is the closest we can get
+        return peak_rss_mb()
+
+
+def report_peak_growth(label, corpus):
+    """Run in a child process: extract every page once and print the peak RSS growth."""
+    pages = load_corpus(corpus)
+    baseline = current_rss_mb()
+    for html in pages.values():
+        EXTRACTORS[label](html)
+    print(f"{peak_rss_mb() - baseline:.2f}")
+
+
+def measure_peak_growth(label, corpus):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_html_extract', '--corpus', corpus, '--peak-memory-of', label],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_seconds(extract, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            extract(html)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=CORPUS_DIR, help='folder of saved .html pages')
+    parser.add_argument('--repeat', type=int, default=10, help='passes over the corpus')
+    parser.add_argument('--peak-memory-of', choices=sorted(EXTRACTORS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.peak_memory_of:
+        report_peak_growth(args.peak_memory_of, args.corpus)
+        return
+
+    pages = load_corpus(args.corpus)
+    total_mb = sum(len(html.encode('utf-8')) for html in pages.values()) / (1024 * 1024)
+    print(f"{len(pages)} pages, {total_mb:.2f} MB")
+
+    mismatches = 0
+    for name, html in pages.items():
+        expected = beautifulsoup_extract(html)
+        actual = extract_main_text(html)
+        if expected != actual:
+            mismatches += 1
+            print(f"  output differs for {name}: {first_difference(expected, actual)}")
+    print(f"identical output on {len(pages) - mismatches}/{len(pages)} pages\n")
+
+    print(f"{'extractor':>14} {'pages/s':>9} {'MB/s':>8} {'peak RSS +MB':>13}")
+    results = {}
+    for label, extract in EXTRACTORS.items():
+        elapsed = measure_seconds(extract, pages, args.repeat)
+        results[label] = elapsed
+        pages_per_second = len(pages) * args.repeat / elapsed
+        growth = measure_peak_growth(label, args.corpus)
+        print(f"{label:>14} {pages_per_second:>9.1f} {total_mb * args.repeat / elapsed:>8.2f} {growth:>13.2f}")
+    print(f"\nspeedup: {results['beautifulsoup'] / results['lxml']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,452 @@
+"""
+Benchmark: the whole app under load, against local stand-ins
+
+Starts the app in its own process (Flask's threaded server, warmed up the
+way gunicorn.conf.py warms up a worker) with everything it talks to replaced
+by something local:
+
+- Firestore: the in-memory FakeFirestore (or, with --store sqlite/csv, the
+  local trend store)
+- Claude: fake_claude.FakeClaudeServer, with --claude-ttft-ms to the first
+  token and --claude-tokens-per-second after that
+- websites and YouTube: fake_origin.FakeOriginServer, serving the saved
+  pages in html_corpus/ and generated transcripts
+
+then sends it traffic from --concurrency client threads:
+
+1. isolated: --requests requests to each endpoint on its own, so each one's
+   latency, throughput and the server's memory (RSS) can be told apart
+2. mixed: --mixed-requests requests spread over the endpoints by --mix
+
+Scrape, memo and date requests repeat an earlier request --repeat-ratio of
+the time (answerable from the caches); the rest use URLs and research tasks
+nobody has asked for yet. Requests are planned from --seed, so two runs send
+the same traffic.
+
+For each endpoint it reports p50/p95/p99 latency, requests per second, non-2xx
+answers, the server's RSS after the phase and the calls that reached the
+stand-ins. The results (with the commit and settings they came from) are
+written as JSON to --output, so runs on different commits can be compared:
+
+    python -m benchmarks.bench_load --output before.json
+    git checkout <other commit>
+    python -m benchmarks.bench_load --output after.json
+    python -m benchmarks.bench_load --compare before.json after.json
+
+Pages all come from one local host, so the per-host pacing and robots.txt
+checks a real site would get are turned off unless --paced is given.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_load --concurrency 8 --requests 50 --mixed-requests 400
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from common import percentile
+from benchmarks.bench_startup import write_trends
+from benchmarks.fake_claude import FakeClaudeServer
+from benchmarks.fake_origin import FakeOriginServer, VIDEOS
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    'trends': 'GET /api/trends',
+    'trends_page': 'GET /api/trends?limit=20',
+    'trends_filter': 'GET /api/trends/filter?theme=...',
+    'trends_add': 'POST /api/trends',
+    'scrape_webpage': 'POST /api/scrape/webpage',
+    'scrape_youtube': 'POST /api/scrape/youtube',
+    'scrape_and_generate': 'POST /api/scrape-and-generate',
+    'generate_memo': 'POST /api/generate-memo',
+    'extract_date': 'POST /api/extract-date',
+}
+
+DEFAULT_MIX = ('trends=30,trends_page=20,trends_filter=10,trends_add=5,scrape_webpage=8,'
+               'scrape_youtube=5,scrape_and_generate=4,generate_memo=6,extract_date=12')
+
+# How many different requests the repeated ones are drawn from
+REPEAT_POOL = 5
+
+# Runs in the server process: points the app at the stand-ins, warms it up and serves
+SERVER = r"""
+import sys, json
+settings = json.loads(sys.argv[1])
+
+import scraper
+from benchmarks.fake_origin import FixtureTranscripts
+scraper.ClaudeAPI.MESSAGES_URL = settings['claude_url'] + '/v1/messages'
+scraper.YOUTUBE_OEMBED_URL = settings['origin_url'] + '/youtube/oembed'
+scraper.YouTubeTranscriptApi = FixtureTranscripts(settings['origin_url'])
+
+import app
+if settings['store'] == 'firestore':
+    from resources import LazyResource
+    from csv_store import read_csv_trends
+    from benchmarks.fake_firestore import FakeFirestore
+    db = FakeFirestore(rpc_latency=settings['firestore_latency_ms'] / 1000)
+    for trend in read_csv_trends(settings['trends_file']):
+        db.collection(app.TRENDS_COLLECTION).add(trend)
+    app.firestore_resource = LazyResource('firestore', lambda: db)
+
+report = app.warm_up()
+from werkzeug.serving import make_server
+server = make_server('127.0.0.1', 0, app.app, threaded=True)
+print('LISTENING ' + json.dumps({'port': server.server_address[1], 'ready': report['ready']}), flush=True)
+server.serve_forever()
+"""
+
+
+def read_rss(pid):
+    """The process's current and peak resident memory in MB, from /proc (None elsewhere)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return {'rss_mb': None, 'rss_peak_mb': None}
+    return {
+        'rss_mb': round(int(fields['VmRSS'].split()[0]) / 1024, 1),
+        'rss_peak_mb': round(int(fields['VmHWM'].split()[0]) / 1024, 1),
+    }
+
+
+def current_commit():
+    """The checked-out commit, with '-dirty' if there are uncommitted changes."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BACKEND,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class TrafficPlan:
+    """Builds the requests for each endpoint, the same ones every run for the same seed."""
+
+    def __init__(self, origin, seed, repeat_ratio):
+        self.origin = origin
+        self.rng = random.Random(seed)
+        self.repeat_ratio = repeat_ratio
+        self.pages = sorted(origin.pages)
+        self.videos = sorted(VIDEOS)
+        self.number = 0
+
+    def _pick(self):
+        """(repeat?, number): a number from a small pool for repeats, a new one otherwise."""
+        self.number += 1
+        if self.rng.random() < self.repeat_ratio:
+            return True, self.rng.randrange(REPEAT_POOL)
+        return False, 1000 + self.number
+
+    def _page(self, number):
+        return self.origin.page_url(self.pages[number % len(self.pages)], copy=number)
+
+    def _video(self, number):
+        # Any ID of a fixture video, a dash and a number gets that video's transcript
+        return f"https://www.youtube.com/watch?v={self.videos[number % len(self.videos)]}-{number}"
+
+    def request(self, endpoint):
+        """(method, path, JSON body) for the next request to ``endpoint``."""
+        self.number += 1
+        number = self.number
+        if endpoint == 'trends':
+            return 'GET', '/api/trends', None
+        if endpoint == 'trends_page':
+            return 'GET', '/api/trends?limit=20', None
+        if endpoint == 'trends_filter':
+            return 'GET', f"/api/trends/filter?theme={quote(f'Theme {number % 7}')}", None
+        if endpoint == 'trends_add':
+            return 'POST', '/api/trends', {
+                'research_task': f'Load test trend {number}', 'news_links': [self._page(number)],
+                'context': 'Added by the load benchmark', 'date_discovered': '2024-06-01', 'theme': 'Bench',
+            }
+        repeat, pick = self._pick()
+        if endpoint == 'scrape_webpage':
+            return 'POST', '/api/scrape/webpage', {'url': self._page(pick)}
+        if endpoint == 'scrape_youtube':
+            return 'POST', '/api/scrape/youtube', {'url': self._video(pick)}
+        if endpoint == 'scrape_and_generate':
+            return 'POST', '/api/scrape-and-generate', {
+                'urls': [self._page(pick), self._video(pick)],
+                'research_task': f'Load test research task {pick}', 'theme': 'Bench',
+            }
+        if endpoint == 'generate_memo':
+            content = ' '.join(f'Fact {pick}.{line}: something happened in the market.' for line in range(300))
+            return 'POST', '/api/generate-memo', {'content': content, 'research_task': f'Load test memo {pick}'}
+        if endpoint == 'extract_date':
+            if not repeat and number % 4 == 0:
+                # A date in the URL itself, found without downloading anything
+                return 'POST', '/api/extract-date', {'url': f"{self.origin.url}/2024/05/{number % 28 + 1:02d}/story-{number}"}
+            return 'POST', '/api/extract-date', {'url': self._page(pick)}
+        raise ValueError(endpoint)
+
+
+def send_all(base_url, planned, concurrency):
+    """Send (endpoint, method, path, body) requests from ``concurrency`` threads; returns (results, seconds)."""
+    sessions = threading.local()
+
+    def send(item):
+        endpoint, method, path, body = item
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = sessions.session.request(method, base_url + path, json=body, timeout=300)
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+        return endpoint, (time.perf_counter() - started) * 1000, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, planned))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, seconds):
+    """Latency percentiles, throughput and failures for one endpoint's results."""
+    latencies = sorted(latency for _, latency, _ in results)
+    statuses = {}
+    for _, _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, _, status in results if status is None or status >= 300),
+        'statuses': statuses,
+        'throughput_rps': round(len(results) / seconds, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.5), 1),
+            'p95': round(percentile(latencies, 0.95), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(latencies[-1], 1),
+        },
+    }
+
+
+def upstream_stats(claude, origin):
+    stats = {'claude': dict(claude.stats), 'origin': dict(origin.stats)}
+    stats['claude']['busy_seconds'] = round(stats['claude']['busy_seconds'], 2)
+    claude.reset_stats()
+    origin.reset_stats()
+    return stats
+
+
+def start_app(args, claude, origin, data_folder):
+    """Start the app's server process; returns (process, base URL)."""
+    trends_file = os.path.join(data_folder, 'tech_trends.csv')
+    write_trends(trends_file, args.trends)
+    env = {
+        **os.environ,
+        'DATA_FOLDER': data_folder,
+        'DEBUG': 'false',
+        'TRENDS_LOCAL_BACKEND': 'sqlite' if args.store == 'firestore' else args.store,
+        'FIREBASE_CREDENTIALS_JSON': '',
+        'FIREBASE_PROJECT_ID': '',
+        'FEED_POLLING_ENABLED': 'false',
+        'CLAUDE_API_KEY': 'bench-placeholder-key',
+        # For the SDK's completions call (the direct calls use ClaudeAPI.MESSAGES_URL)
+        'ANTHROPIC_BASE_URL': claude.url,
+    }
+    if not args.paced:
+        env.update({
+            'HOST_RATE_PER_SECOND': '1000000', 'HOST_MAX_RATE_PER_SECOND': '1000000',
+            'SCRAPE_PER_HOST_LIMIT': '1000', 'ROBOTS_TXT_ENABLED': 'false',
+        })
+    settings = {
+        'store': args.store, 'claude_url': claude.url, 'origin_url': origin.url,
+        'trends_file': trends_file, 'firestore_latency_ms': args.firestore_latency_ms,
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER, json.dumps(settings)],
+        cwd=BACKEND, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    for line in process.stdout:
+        if line.startswith('LISTENING '):
+            started = json.loads(line[len('LISTENING '):])
+            break
+    else:
+        raise SystemExit("The app's server process exited before it started listening")
+    # Keep reading its output so it never blocks on a full pipe
+    threading.Thread(target=lambda: [None for _ in process.stdout], daemon=True).start()
+    if not started['ready']:
+        print("Warning: the app reported it wasn't fully ready after warming up")
+    return process, f"http://127.0.0.1:{started['port']}"
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    claude = FakeClaudeServer(args.claude_ttft_ms, args.claude_tokens_per_second, args.claude_output_tokens).start()
+    origin = FakeOriginServer(args.origin_ttfb_ms).start()
+    data_folder = tempfile.mkdtemp(prefix='load-bench-')
+    process, base_url = start_app(args, claude, origin, data_folder)
+    plan = TrafficPlan(origin, args.seed, args.repeat_ratio)
+    results = {
+        'meta': {
+            'commit': current_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'startup': read_rss(process.pid),
+        'isolated': {},
+    }
+    upstream_stats(claude, origin)
+    try:
+        for endpoint in ENDPOINTS:
+            planned = [(endpoint, *plan.request(endpoint)) for _ in range(args.requests)]
+            before = read_rss(process.pid)
+            sent, seconds = send_all(base_url, planned, args.concurrency)
+            after = read_rss(process.pid)
+            results['isolated'][endpoint] = {
+                **summarize(sent, seconds),
+                **after,
+                'rss_growth_mb': round(after['rss_mb'] - before['rss_mb'], 1) if after['rss_mb'] else None,
+                'upstream': upstream_stats(claude, origin),
+            }
+            print_row(endpoint, results['isolated'][endpoint])
+
+        rng = random.Random(args.seed)
+        endpoints = rng.choices(list(mix), weights=list(mix.values()), k=args.mixed_requests)
+        planned = [(endpoint, *plan.request(endpoint)) for endpoint in endpoints]
+        sent, seconds = send_all(base_url, planned, args.concurrency)
+        results['mixed'] = {
+            'overall': summarize(sent, seconds),
+            'endpoints': {
+                endpoint: summarize([result for result in sent if result[0] == endpoint], seconds)
+                for endpoint in mix if any(result[0] == endpoint for result in sent)
+            },
+            **read_rss(process.pid),
+            'upstream': upstream_stats(claude, origin),
+        }
+    finally:
+        process.terminate()
+        process.wait()
+        claude.stop()
+        origin.stop()
+        # The app's SQLite files, caches and CSV are only needed for this run
+        shutil.rmtree(data_folder, ignore_errors=True)
+    return results
+
+
+def print_row(name, result):
+    latency = result['latency_ms']
+    rss = f"{result['rss_mb']:.0f}" if result.get('rss_mb') is not None else '-'
+    print(f"{name:>20} {result['requests']:>6} {result['errors']:>6} {latency['p50']:>8.1f} {latency['p95']:>8.1f} "
+          f"{latency['p99']:>8.1f} {result['throughput_rps']:>8.1f} {rss:>7}")
+
+
+def print_header(title):
+    print(f"\n{title}")
+    print(f"{'endpoint':>20} {'reqs':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'RSS MB':>7}")
+
+
+def compare(before_path, after_path):
+    """Print how each endpoint's latency, throughput and memory changed between two result files."""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before['meta']['commit']} ({before['meta']['timestamp']})")
+    print(f"after:  {after['meta']['commit']} ({after['meta']['timestamp']})")
+    changed = [key for key in set(before['meta']['settings']) | set(after['meta']['settings'])
+               if before['meta']['settings'].get(key) != after['meta']['settings'].get(key)]
+    if changed:
+        print(f"Warning: the runs used different settings ({', '.join(sorted(changed))})")
+
+    def change(old, new):
+        if old is None or new is None:
+            return '-'
+        if not old:
+            return f"{new:g}"
+        return f"{old:g} -> {new:g} ({(new - old) / old:+.0%})"
+
+    for phase in ('isolated', 'mixed'):
+        old_phase = before.get(phase, {})
+        new_phase = after.get(phase, {})
+        if phase == 'mixed':
+            old_phase = {**old_phase.get('endpoints', {}), 'overall': old_phase.get('overall', {})}
+            new_phase = {**new_phase.get('endpoints', {}), 'overall': new_phase.get('overall', {})}
+        print(f"\n{phase}")
+        print(f"{'endpoint':>20} {'p50 ms':>26} {'p99 ms':>26} {'req/s':>24} {'RSS MB':>20}")
+        for endpoint in old_phase:
+            if endpoint not in new_phase:
+                continue
+            old, new = old_phase[endpoint], new_phase[endpoint]
+            print(f"{endpoint:>20} {change(old['latency_ms']['p50'], new['latency_ms']['p50']):>26} "
+                  f"{change(old['latency_ms']['p99'], new['latency_ms']['p99']):>26} "
+                  f"{change(old['throughput_rps'], new['throughput_rps']):>24} "
+                  f"{change(old.get('rss_mb'), new.get('rss_mb')):>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=('firestore', 'sqlite', 'csv'), default='firestore',
+                        help='where the app keeps its trends (firestore is the in-memory stand-in)')
+    parser.add_argument('--trends', type=int, default=500, help='trends stored before the run')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads sending requests')
+    parser.add_argument('--requests', type=int, default=50, help='requests to each endpoint in the isolated phase')
+    parser.add_argument('--mixed-requests', type=int, default=400, help='requests in the mixed phase')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='endpoint=weight pairs for the mixed phase')
+    parser.add_argument('--repeat-ratio', type=float, default=0.5,
+                        help='share of scrape, memo and date requests that repeat an earlier one')
+    parser.add_argument('--seed', type=int, default=1, help='seed for planning the requests')
+    parser.add_argument('--claude-ttft-ms', type=float, default=300, help='fake Claude: time to first token')
+    parser.add_argument('--claude-tokens-per-second', type=float, default=150, help='fake Claude: output speed')
+    parser.add_argument('--claude-output-tokens', type=int, default=400, help='fake Claude: answer length')
+    parser.add_argument('--origin-ttfb-ms', type=float, default=50, help='fake sites: time to first byte')
+    parser.add_argument('--firestore-latency-ms', type=float, default=5, help='fake Firestore: latency per RPC')
+    parser.add_argument('--paced', action='store_true', help='keep per-host pacing and robots.txt checks')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    print(f"{args.store} store with {args.trends} trends, {args.concurrency} clients, "
+          f"{args.repeat_ratio:.0%} repeated requests")
+    print_header(f"isolated ({args.requests} requests per endpoint)")
+    results = run(args)
+    print_header(f"mixed ({args.mixed_requests} requests)")
+    for endpoint, result in results['mixed']['endpoints'].items():
+        print_row(endpoint, result)
+    print_row('overall', {**results['mixed']['overall'], 'rss_mb': results['mixed']['rss_mb']})
+    print(f"\nRSS: {results['startup']['rss_mb']} MB after warm-up, peak {results['mixed']['rss_peak_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: concurrent trend writes without Firestore, CSV file vs SQLite store
+
+Starts several worker processes running the app (as gunicorn would), each
+adding trends through POST /api/trends at the same time, against a backup of
+--trends existing trends, once with TRENDS_LOCAL_BACKEND=csv (every write
+re-reads and rewrites the whole CSV file) and once with sqlite (one row per
+write, in its own transaction).
+
+For each backend it reports writes per second, p50/p95 write latency, how
+many writes failed, and how many trends (new or already stored) are missing
+afterwards because another worker rewrote the file over them.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_local_store --workers 4 --writes 50 --trends 1000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.bench_startup import write_trends
+from common import percentile
+
+# Runs in each worker process; prints its write latencies as the last line of output
+WORKER = r"""
+import sys, json, time
+start_at, worker, writes = float(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3])
+import app
+client = app.app.test_client()
+client.get('/api/trends')  # load the existing trends before the clock starts
+time.sleep(max(0.0, start_at - time.time()))
+latencies, failed = [], 0
+first_started = time.time()
+for number in range(writes):
+    started = time.perf_counter()
+    response = client.post('/api/trends', json={
+        'research_task': f'Worker {worker} trend {number}', 'news_links': 'https://example.com',
+        'context': 'Benchmark', 'date_discovered': '2024-06-01', 'theme': 'Bench',
+    })
+    latencies.append((time.perf_counter() - started) * 1000)
+    failed += response.status_code != 201
+print('RESULT ' + json.dumps({
+    'latencies': latencies, 'failed': failed, 'started': first_started, 'finished': time.time(),
+}))
+"""
+
+
+def count_trends(backend, data_folder):
+    """How many trends the backend holds once every worker has finished."""
+    if backend == 'sqlite':
+        from sqlite_store import SQLiteTrendStore
+        return SQLiteTrendStore(os.path.join(data_folder, 'trends.sqlite3')).stats()['trends']
+    from csv_store import read_csv_trends
+    return len(read_csv_trends(os.path.join(data_folder, 'tech_trends.csv')))
+
+
+def run(backend, args):
+    data_folder = tempfile.mkdtemp(prefix=f'store-bench-{backend}-')
+    write_trends(os.path.join(data_folder, 'tech_trends.csv'), args.trends)
+    env = {
+        **os.environ,
+        'DATA_FOLDER': data_folder,
+        'TRENDS_LOCAL_BACKEND': backend,
+        'FEED_POLLING_ENABLED': 'false',
+        'JOB_WORKERS': '0',
+        'FIREBASE_CREDENTIALS_JSON': '',
+        'FIREBASE_PROJECT_ID': '',
+    }
+    backend_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Give every worker time to import the app, then start writing together
+    start_at = time.time() + 5
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-c', WORKER, str(start_at), str(worker), str(args.writes)],
+            cwd=backend_folder, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        for worker in range(args.workers)
+    ]
+    latencies, failed, crashed, started, finished = [], 0, 0, [], []
+    for process in workers:
+        output, _ = process.communicate()
+        lines = [line for line in output.splitlines() if line.startswith('RESULT ')]
+        if not lines:
+            crashed += 1
+            continue
+        result = json.loads(lines[-1][len('RESULT '):])
+        latencies.extend(result['latencies'])
+        failed += result['failed']
+        started.append(result['started'])
+        finished.append(result['finished'])
+    seconds = max(finished) - min(started) if started else float('nan')
+
+    succeeded = len(latencies) - failed
+    missing = args.trends + succeeded - count_trends(backend, data_folder)
+    latencies.sort()
+    return {
+        'backend': backend,
+        'writes_per_second': round(len(latencies) / seconds, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 1) if latencies else None,
+        'failed': failed + crashed * args.writes,
+        'lost': missing,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='worker processes writing at once')
+    parser.add_argument('--writes', type=int, default=50, help='trends each worker adds')
+    parser.add_argument('--trends', type=int, default=1000, help='trends already stored')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers adding {args.writes} trends each to {args.trends} existing trends\n")
+    print(f"{'backend':>8} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'failed':>7} {'lost':>6}")
+    for backend in ('csv', 'sqlite'):
+        result = run(backend, args)
+        print(f"{result['backend']:>8} {result['writes_per_second']:>9} {result['p50_ms']:>8} "
+              f"{result['p95_ms']:>8} {result['failed']:>7} {result['lost']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: memo input, 50,000-character truncation vs ContentReducer
+
+Builds synthetic multi-source input (scraped pages that share navigation and
+footer lines, plus a paragraph syndicated across sites) and compares:
+
+- truncate: the previous content[:50000], which drops whatever comes after
+- full: sending every source untouched
+- reduced: ContentReducer (deduplication, then parallel chunk summaries for
+  sources over their share of the budget)
+
+For each it reports the tokens sent to the memo call, the tokens spent on
+chunk summaries, how many sources made it into the prompt, and an estimated
+wall time from a simple latency model of the Messages API (a fixed overhead,
+plus time per input token and per output token). The summary calls are fake
+and return text of the requested length, so no API key is needed.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_memo_input --sources 2,5,8 --chars 40000
+"""
+
+import heapq
+import random
+import argparse
+
+from config import Config
+from scraper import ContentReducer, estimate_tokens
+
+# Latency model, roughly in line with a large model on the Messages API
+REQUEST_OVERHEAD_S = 0.6
+INPUT_TOKENS_PER_S = 8000.0
+OUTPUT_TOKENS_PER_S = 60.0
+MEMO_OUTPUT_TOKENS = 1500
+
+
+def call_seconds(input_tokens, output_tokens):
+    return REQUEST_OVERHEAD_S + input_tokens / INPUT_TOKENS_PER_S + output_tokens / OUTPUT_TOKENS_PER_S
+
+
+def make_content(source_count, chars_per_source, seed=11):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(3000)]
+    navigation = ['Home', 'News', 'Technology', 'Subscribe to our newsletter', 'Sign in', 'Privacy policy']
+    footer = [
+        'We use cookies to improve your experience on our site. By continuing you agree to our use of cookies.',
+        'Copyright 2025 Example Media Group. All rights reserved. Reproduction without permission is prohibited.',
+    ]
+    syndicated = ' '.join(rng.choices(vocabulary, k=120))
+
+    blocks = []
+    for number in range(source_count):
+        lines = [f"Title: Article {number}", "Content:"] + navigation
+        size = 0
+        while size < chars_per_source:
+            line = ' '.join(rng.choices(vocabulary, k=rng.randint(20, 60)))
+            lines.append(line)
+            size += len(line) + 1
+        lines.insert(len(lines) // 2, syndicated)
+        lines.extend(footer)
+        blocks.append(f"Source: https://site{number}.example.com/article\n\n" + '\n'.join(lines) + "\n\n")
+    return "\n---\n".join(blocks)
+
+
+def represented(content, source_count):
+    return sum(1 for number in range(source_count) if f"site{number}.example.com" in content)
+
+
+def map_wall_seconds(call_durations, workers):
+    """Wall time for calls run on a fixed pool of workers, in submission order."""
+    if not call_durations:
+        return 0.0
+    finish_times = [0.0] * min(workers, len(call_durations))
+    for duration in call_durations:
+        start = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, start + duration)
+    return max(finish_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sources', default='2,5,8', help='comma-separated source counts')
+    parser.add_argument('--chars', type=int, default=40000, help='characters of article text per source')
+    args = parser.parse_args()
+
+    print(f"{'sources':>7} {'strategy':>9} {'memo in':>9} {'map in':>8} {'map out':>8} {'calls':>6} {'kept':>6} {'est. s':>7}")
+    for source_count in (int(value) for value in args.sources.split(',')):
+        content = make_content(source_count, args.chars)
+
+        truncated = content[:50000]
+        tokens = estimate_tokens(truncated)
+        print(f"{source_count:>7} {'truncate':>9} {tokens:>9} {0:>8} {0:>8} {1:>6} "
+              f"{represented(truncated, source_count):>3}/{source_count:<2} {call_seconds(tokens, MEMO_OUTPUT_TOKENS):>7.1f}")
+
+        tokens = estimate_tokens(content)
+        print(f"{source_count:>7} {'full':>9} {tokens:>9} {0:>8} {0:>8} {1:>6} "
+              f"{source_count:>3}/{source_count:<2} {call_seconds(tokens, MEMO_OUTPUT_TOKENS):>7.1f}")
+
+        call_durations = []
+
+        def fake_summarize(text, label, max_tokens):
+            call_durations.append(call_seconds(estimate_tokens(text), max_tokens))
+            return (text[:max_tokens * 4] + '\n') if text else ''
+
+        reducer = ContentReducer(
+            fake_summarize,
+            token_budget=Config.MEMO_INPUT_TOKEN_BUDGET,
+            chunk_tokens=Config.MEMO_CHUNK_TOKENS,
+            summary_tokens=Config.MEMO_SUMMARY_TOKENS,
+            max_workers=Config.MEMO_MAP_WORKERS,
+        )
+        reduced, report = reducer.reduce(content)
+        estimate = map_wall_seconds(call_durations, Config.MEMO_MAP_WORKERS) + call_seconds(report['output_tokens'], MEMO_OUTPUT_TOKENS)
+        print(f"{source_count:>7} {'reduced':>9} {report['output_tokens']:>9} {report['map_input_tokens']:>8} "
+              f"{report['map_output_tokens']:>8} {report['map_calls'] + 1:>6} "
+              f"{represented(reduced, source_count):>3}/{source_count:<2} {estimate:>7.1f}")
+        print(f"{'':>7} {'':>9} ({report['duplicate_lines']} duplicate lines removed, "
+              f"{report['input_tokens'] - report['dedup_tokens']} tokens saved before summarizing)")
+
+
+if __name__ == '__main__':
+    main()
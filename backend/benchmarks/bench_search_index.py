@@ -0,0 +1,99 @@
+"""
+Benchmark: /api/trends/filter search, pandas scan vs inverted index
+
+Generates synthetic memos and compares the previous search (lower-case and
+str.contains over four columns of a DataFrame) with SearchIndex: time to
+build the index, time to apply a single update, and average query latency.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_search_index --sizes 1000,10000,100000
+"""
+
+import time
+import random
+import argparse
+import pandas as pd
+
+from search_index import SearchIndex
+
+WORDS = [
+    'ai', 'agent', 'model', 'quantum', 'chip', 'cloud', 'edge', 'robotics', 'battery', 'fusion',
+    'security', 'privacy', 'regulation', 'startup', 'funding', 'enterprise', 'platform', 'data',
+    'inference', 'training', 'semiconductor', 'network', 'satellite', 'biotech', 'genomics',
+    'payments', 'blockchain', 'automation', 'vision', 'language', 'open', 'source', 'latency',
+    'energy', 'storage', 'supply', 'chain', 'retail', 'health', 'insurance', 'banking',
+]
+QUERIES = ['quantum', 'ai agent', 'semi', 'cloud security platform', 'fusion energy', 'bank']
+
+
+def make_trends(count, seed=7):
+    rng = random.Random(seed)
+    # A long-tailed vocabulary of filler words, with the topic words spread
+    # through it, so a topic search matches a small share of memos like it
+    # does in real data
+    vocabulary = [f"term{i}" for i in range(5000)]
+    for position, word in enumerate(WORDS):
+        vocabulary.insert(100 + 40 * position, word)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+
+    def sentence(length):
+        return ' '.join(rng.choices(vocabulary, weights, k=length))
+
+    return [
+        {
+            'id': f"trend-{i:06d}",
+            'research_task': sentence(8),
+            'context': sentence(20),
+            'theme': rng.choice(WORDS),
+            'analysis': sentence(150),
+            'date_discovered': '2025-01-01',
+        }
+        for i in range(count)
+    ]
+
+
+def scan_search(df, query):
+    """The previous implementation of the search filter."""
+    return df[
+        df['research_task'].str.lower().str.contains(query, na=False) |
+        df['context'].str.lower().str.contains(query, na=False) |
+        df['theme'].str.lower().str.contains(query, na=False) |
+        df['analysis'].str.lower().str.contains(query, na=False)
+    ]
+
+
+def average_ms(action, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        action()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated memo counts')
+    parser.add_argument('--repeat', type=int, default=5, help='times to run each query')
+    args = parser.parse_args()
+
+    print(f"{'memos':>8} {'build':>9} {'update':>9} {'scan/query':>12} {'index/query':>12} {'speedup':>9}")
+    for size in (int(value) for value in args.sizes.split(',')):
+        trends = make_trends(size)
+        df = pd.DataFrame(trends)
+
+        index = SearchIndex()
+        started = time.perf_counter()
+        for trend in trends:
+            index.add(trend['id'], trend)
+        build_s = time.perf_counter() - started
+
+        changed = dict(trends[0], analysis=trends[1]['analysis'])
+        update_ms = average_ms(lambda: index.add(changed['id'], changed), args.repeat)
+
+        scan_ms = sum(average_ms(lambda: scan_search(df, query), args.repeat) for query in QUERIES) / len(QUERIES)
+        index_ms = sum(average_ms(lambda: index.search(query), args.repeat) for query in QUERIES) / len(QUERIES)
+
+        print(f"{size:>8} {build_s:>8.2f}s {update_ms:>7.3f}ms {scan_ms:>10.2f}ms {index_ms:>10.2f}ms {scan_ms / index_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark: worker startup time
+
+Starts fresh Python processes (so nothing is already imported) against a CSV
+of generated trends and times, in each of them:
+
+- import: importing app.py
+- warm-up: app.warm_up(), where the worker is warmed up before taking traffic
+- first request: GET /api/trends through Flask's test client
+
+for three kinds of worker:
+
+1. cold: imports the app and answers its first request straight away
+2. warmed: imports the app and warms up first, the way gunicorn.conf.py does
+3. preloaded: the app (and app.PRELOAD_MODULES) are imported before a fork,
+   as in a gunicorn --preload master, and the forked child warms up and
+   answers, so only the per-worker cost is counted
+
+Each row is the median over --runs processes. "total" adds up the steps the
+worker takes before its first response, not counting the interpreter's own
+startup. Older trees without warm_up are timed without that step.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_startup --runs 5 --trends 500
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the fresh process; prints the timings as the last line of output
+CHILD = r"""
+import os, sys, json, time
+
+def timed(step):
+    started = time.perf_counter()
+    step()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def first_request():
+    response = app.app.test_client().get('/api/trends')
+    assert response.status_code == 200, response.status_code
+
+def warm_up():
+    if hasattr(app, 'warm_up'):
+        app.warm_up()
+
+def run(mode, timings):
+    if mode != 'cold':
+        timings['warm_up_ms'] = timed(warm_up)
+    timings['first_request_ms'] = timed(first_request)
+
+mode = sys.argv[1]
+timings = {}
+timings['import_ms'] = timed(lambda: globals().update(app=__import__('app')))
+if mode == 'preloaded':
+    if hasattr(app, 'preload_modules'):
+        app.preload_modules()
+    # Only the forked child's steps count, like a gunicorn --preload worker
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        child_timings = {}
+        run(mode, child_timings)
+        os.write(write_end, json.dumps(child_timings).encode('utf-8'))
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        child_timings = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+    timings = {'import_ms': 0.0, **child_timings}
+else:
+    run(mode, timings)
+print('TIMINGS ' + json.dumps(timings))
+"""
+
+
+def write_trends(path, count):
+    """Write a backup CSV of ``count`` generated trends."""
+    import csv
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['research_task', 'news_links', 'context', 'date_discovered', 'theme', 'analysis'])
+        for number in range(count):
+            writer.writerow([
+                f'Research task {number}', f'https://example.com/story/{number}', 'Context ' * 20,
+                f'2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}', f'Theme {number % 7}',
+                'What happened: ' + 'analysis text ' * 150,
+            ])
+
+
+def run_child(mode, data_folder):
+    env = {
+        **os.environ,
+        'DATA_FOLDER': data_folder,
+        'FEED_POLLING_ENABLED': 'false',
+        # A placeholder key, so Claude is set up the way it would be in production
+        'CLAUDE_API_KEY': os.environ.get('CLAUDE_API_KEY') or 'bench-placeholder-key',
+        'FIREBASE_CREDENTIALS_JSON': '',
+        'FIREBASE_PROJECT_ID': '',
+    }
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, mode],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    line = [line for line in output.splitlines() if line.startswith('TIMINGS ')][-1]
+    return json.loads(line[len('TIMINGS '):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='processes started per kind of worker')
+    parser.add_argument('--trends', type=int, default=500, help='trends in the backup CSV')
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='startup-bench-')
+    write_trends(os.path.join(data_folder, 'tech_trends.csv'), args.trends)
+
+    print(f"{args.trends} trends in the backup CSV, median of {args.runs} processes\n")
+    print(f"{'worker':>10} {'import ms':>10} {'warm-up ms':>11} {'first request ms':>17} {'total ms':>9}")
+    for mode in ('cold', 'warmed', 'preloaded'):
+        runs = [run_child(mode, data_folder) for _ in range(args.runs)]
+        medians = {
+            step: statistics.median(run.get(step, 0.0) for run in runs)
+            for step in ('import_ms', 'warm_up_ms', 'first_request_ms')
+        }
+        total = statistics.median(sum(run.values()) for run in runs)
+        warm_up = f"{medians['warm_up_ms']:.0f}" if mode != 'cold' else '-'
+        print(f"{mode:>10} {medians['import_ms']:>10.0f} {warm_up:>11} "
+              f"{medians['first_request_ms']:>17.0f} {total:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
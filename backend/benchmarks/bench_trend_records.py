@@ -0,0 +1,160 @@
+"""
+Benchmark: trend endpoints through pandas DataFrames vs TrendRecords
+
+Fills a local trend store with generated trends, then compares the way the
+trend endpoints used to work (every request turned the in-memory trends into
+a DataFrame, filtered and sorted it, and turned it back into dicts) with the
+current routes, which work on the repository's TrendRecords directly and send
+each record's JSON text, encoded once:
+
+- memory: bytes held per 1,000 trends in memory as dicts vs as TrendRecords
+  (before and after their JSON has been sent once), and the peak memory
+  allocated while answering one GET /api/trends
+- speed: requests per second through the Flask test client for
+  GET /api/trends, GET /api/trends/filter?theme=... and
+  GET /api/trends/filter?sort_by=research_task
+
+The app runs with DEBUG off, as in production (in debug mode jsonify
+indents its output, which is much slower).
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_trend_records --trends 1000 --requests 200
+"""
+
+import os
+import gc
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+PREVIOUS_PREFIX = '/bench/dataframe'
+
+
+def generate_trends(count):
+    """Trends shaped like the ones scrape-and-generate stores."""
+    return [
+        {
+            'research_task': f'Research task {number}',
+            'news_links': [f'https://example.com/story/{number}', f'https://example.org/post/{number}'],
+            'context': 'Context for the memo. ' * 5,
+            'date_discovered': f'2024-{number % 12 + 1:02d}-{number % 28 + 1:02d}',
+            'theme': f'Theme {number % 7}',
+            'analysis': ' '.join(f'word{(number + position) % 997}' for position in range(250)),
+        }
+        for number in range(count)
+    ]
+
+
+def held_bytes(build):
+    """Bytes still allocated after ``build()`` returns (the result is kept alive)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def peak_bytes(call):
+    """Peak bytes allocated while ``call()`` runs."""
+    gc.collect()
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def add_previous_routes(app, trend_dicts):
+    """The DataFrame versions of the endpoints, reading the same trends as plain dicts."""
+    import pandas as pd
+    from flask import request, jsonify
+
+    @app.route(f'{PREVIOUS_PREFIX}/trends')
+    def previous_get_trends():
+        df = pd.DataFrame(trend_dicts)
+        return jsonify(df.to_dict(orient='records'))
+
+    @app.route(f'{PREVIOUS_PREFIX}/trends/filter')
+    def previous_filter_trends():
+        theme_filter = request.args.get('theme', '')
+        sort_by = request.args.get('sort_by', 'date_discovered')
+        sort_order = request.args.get('sort_order', 'desc')
+        df = pd.DataFrame(trend_dicts)
+        if df.empty:
+            return jsonify([])
+        if theme_filter:
+            df = df[df['theme'].str.lower() == theme_filter.lower()]
+        if sort_by != 'relevance' and sort_by in df.columns:
+            df = df.sort_values(by=sort_by, ascending=sort_order.lower() != 'desc')
+        return jsonify(df.to_dict(orient='records'))
+
+
+def requests_per_second(client, url, count):
+    client.get(url)
+    started = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trends', type=int, default=1000, help='trends in the store')
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    args = parser.parse_args()
+
+    # A fresh local store, set up before the app reads its settings
+    data_folder = tempfile.mkdtemp(prefix='records-bench-')
+    os.environ.update({
+        'DATA_FOLDER': data_folder, 'DEBUG': 'false', 'TRENDS_LOCAL_BACKEND': 'sqlite', 'FEED_POLLING_ENABLED': 'false',
+        'JOB_WORKERS': '0', 'FIREBASE_CREDENTIALS_JSON': '', 'FIREBASE_PROJECT_ID': '',
+        # Keep request logs out of the table (and metrics out of the results)
+        'TRACE_LOGS': 'false', 'METRICS_ENABLED': 'false',
+    })
+    import app
+    from trend_record import TrendRecord
+
+    trends = generate_trends(args.trends)
+    app.trend_store.import_trends(trends)
+    repository = app.get_trend_repository()
+    trend_dicts = [trend.to_dict() for trend in repository.all()]
+    add_previous_routes(app.app, trend_dicts)
+    client = app.app.test_client()
+
+    # Memory held for the trends themselves (fresh copies, so neither shares strings)
+    scale = 1000 / args.trends
+    dict_bytes = held_bytes(lambda: [dict(trend) for trend in generate_trends(args.trends)])
+    record_bytes = held_bytes(lambda: [TrendRecord.from_dict(trend) for trend in generate_trends(args.trends)])
+
+    def sent_records():
+        records = [TrendRecord.from_dict(trend) for trend in generate_trends(args.trends)]
+        for record in records:
+            record.to_json()
+        return records
+
+    sent_record_bytes = held_bytes(sent_records)
+    print(f"{args.trends} trends\n")
+    print(f"{'in memory as':>14} {'KB per 1k trends':>17}")
+    print(f"{'dicts':>14} {dict_bytes * scale / 1024:>17.0f}")
+    print(f"{'TrendRecords':>14} {record_bytes * scale / 1024:>17.0f}")
+    print(f"{'  once sent':>14} {sent_record_bytes * scale / 1024:>17.0f}\n")
+
+    client.get('/api/trends')  # the first request encodes each record's JSON
+    previous_peak = peak_bytes(lambda: client.get(f'{PREVIOUS_PREFIX}/trends'))
+    current_peak = peak_bytes(lambda: client.get('/api/trends'))
+    print(f"peak allocation for one GET /api/trends: DataFrame {previous_peak / 1024:.0f} KB, "
+          f"records {current_peak / 1024:.0f} KB\n")
+
+    print(f"{'endpoint':>44} {'DataFrame req/s':>16} {'records req/s':>14} {'speedup':>8}")
+    for path in ('/trends', '/trends/filter?theme=theme%203', '/trends/filter?sort_by=research_task'):
+        previous = requests_per_second(client, f'{PREVIOUS_PREFIX}{path}', args.requests)
+        current = requests_per_second(client, f'/api{path}', args.requests)
+        print(f"{'GET /api' + path:>44} {previous:>16.1f} {current:>14.1f} {current / previous:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Local Messages API Stand-In
+
+A small HTTP server that answers like the Anthropic API, for benchmarks that
+shouldn't need a real key or spend real tokens:
+
+- POST /v1/messages answers with a memo-shaped text after a configurable
+  time to first token plus the time it takes to "write" the answer at a
+  configurable number of output tokens per second. With "stream": true it
+  sends the answer as Server-Sent Events, paced the same way.
+- POST /v1/complete answers 400, as the real API does for Claude 3 models,
+  so the SDK's completions call fails over to the Messages API exactly as it
+  does in production.
+
+Token counts are estimated at four characters per token. The server counts
+calls, tokens and the time it spent answering.
+"""
+
+import json
+import time
+import threading
+import http.server
+
+MEMO_SECTIONS = (
+    'What happened', 'Why is this interesting', 'Why we should be skeptical',
+    'Enterprise Innovation POV', 'Next Steps', 'Relevant Risks',
+)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def fake_text(tokens):
+    """Markdown text of about ``tokens`` tokens, laid out like a memo."""
+    words = []
+    section = 0
+    while len(words) * 1.3 < tokens:
+        if len(words) % 60 == 0:
+            words.append(f"\n\n## {MEMO_SECTIONS[section % len(MEMO_SECTIONS)]}\n\n")
+            section += 1
+        words.append(f"finding{len(words) % 113}")
+    return ' '.join(words).strip()
+
+
+class FakeClaudeServer:
+    """A local stand-in for api.anthropic.com, running in a background thread."""
+
+    def __init__(self, ttft_ms=400, tokens_per_second=80, output_tokens=700):
+        """
+        Args:
+            ttft_ms (float, optional): Milliseconds before the first token
+            tokens_per_second (float, optional): Output tokens written per second
+            output_tokens (int, optional): Length of each answer (capped at the
+                request's max_tokens)
+        """
+        self.ttft_ms = ttft_ms
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the call and token counters."""
+        self.stats = {'messages': 0, 'streams': 0, 'completions_refused': 0,
+                      'input_tokens': 0, 'output_tokens': 0, 'busy_seconds': 0.0}
+
+    def _count(self, **counts):
+        with self._lock:
+            for counter, value in counts.items():
+                self.stats[counter] += value
+
+    @property
+    def url(self):
+        """The base URL, to use in place of https://api.anthropic.com."""
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        """Start answering on a free local port; returns self."""
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                if self.path.startswith('/v1/complete'):
+                    fake._count(completions_refused=1)
+                    self._send_json(400, {'type': 'error', 'error': {
+                        'type': 'invalid_request_error',
+                        'message': f"{body.get('model')} is not supported on this API. Please use the Messages API instead.",
+                    }})
+                    return
+                if not self.path.startswith('/v1/messages'):
+                    self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': 'Not found'}})
+                    return
+
+                started = time.monotonic()
+                prompt = (body.get('system') or '') + ''.join(
+                    message.get('content', '') for message in body.get('messages', [])
+                    if isinstance(message.get('content'), str)
+                )
+                input_tokens = estimate_tokens(prompt)
+                output_tokens = min(fake.output_tokens, int(body.get('max_tokens') or fake.output_tokens))
+                text = fake_text(output_tokens)
+                time.sleep(fake.ttft_ms / 1000)
+                if body.get('stream'):
+                    self._stream(body, text, input_tokens, output_tokens)
+                else:
+                    time.sleep(output_tokens / fake.tokens_per_second)
+                    self._send_json(200, {
+                        'id': 'msg_bench', 'type': 'message', 'role': 'assistant', 'model': body.get('model'),
+                        'content': [{'type': 'text', 'text': text}],
+                        'stop_reason': 'end_turn',
+                        'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+                    })
+                fake._count(messages=1, streams=int(bool(body.get('stream'))), input_tokens=input_tokens,
+                            output_tokens=output_tokens, busy_seconds=time.monotonic() - started)
+
+            def _stream(self, body, text, input_tokens, output_tokens):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                def event(name, data):
+                    self.wfile.write(f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+                event('message_start', {'message': {'id': 'msg_bench', 'model': body.get('model'),
+                                                    'usage': {'input_tokens': input_tokens, 'output_tokens': 0}}})
+                event('content_block_start', {'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+                # About 20 tokens per event
+                pieces = [text[start:start + 80] for start in range(0, len(text), 80)]
+                for piece in pieces:
+                    event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': piece}})
+                    time.sleep(output_tokens / fake.tokens_per_second / len(pieces))
+                event('content_block_stop', {'index': 0})
+                event('message_delta', {'delta': {'stop_reason': 'end_turn'}, 'usage': {'output_tokens': output_tokens}})
+                event('message_stop', {})
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
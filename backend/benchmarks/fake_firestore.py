@@ -0,0 +1,215 @@
+"""
+In-Memory Firestore Stand-In
+
+A small imitation of the parts of the google-cloud-firestore client that the
+backend uses, for benchmarks that shouldn't need a real project. It counts
+RPCs, document reads and document writes, and can add a fixed latency to each
+RPC to approximate a network round trip. Snapshot listeners are supported and
+are notified synchronously after each write.
+"""
+
+import time
+import uuid
+import threading
+from types import SimpleNamespace
+
+
+class FakeFirestore:
+    """An in-memory database that records what a real client would have cost."""
+
+    def __init__(self, rpc_latency=0.0):
+        """
+        Args:
+            rpc_latency (float, optional): Seconds to sleep for every RPC
+        """
+        self.rpc_latency = rpc_latency
+        self._collections = {}
+        self._listeners = {}
+        self._lock = threading.RLock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the RPC, read and write counters."""
+        self.stats = {'rpcs': 0, 'reads': 0, 'writes': 0}
+
+    def _rpc(self, reads=0, writes=0):
+        with self._lock:
+            self.stats['rpcs'] += 1
+            self.stats['reads'] += reads
+            self.stats['writes'] += writes
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    def _documents(self, collection):
+        with self._lock:
+            return self._collections.setdefault(collection, {})
+
+    def _notify(self, collection, changes):
+        """Tell the collection's listeners about (change type, document ID) pairs."""
+        listeners = list(self._listeners.get(collection, ()))
+        if not listeners or not changes:
+            return
+        documents = self._documents(collection)
+        change_objects = []
+        for change_type, doc_id in changes:
+            reference = FakeDocumentReference(self, collection, doc_id)
+            data = documents.get(doc_id, {})
+            change_objects.append(SimpleNamespace(
+                type=SimpleNamespace(name=change_type),
+                document=FakeDocumentSnapshot(reference, data),
+            ))
+        snapshots = [
+            FakeDocumentSnapshot(FakeDocumentReference(self, collection, doc_id), data)
+            for doc_id, data in list(documents.items())
+        ]
+        for callback in listeners:
+            self._rpc(reads=len(change_objects))
+            callback(snapshots, change_objects, time.time())
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self._db._rpc(reads=1)
+        return FakeDocumentSnapshot(self, self._db._documents(self._collection).get(self.id))
+
+    def set(self, data):
+        self._db._rpc(writes=1)
+        self._db._notify(self._collection, [self._set(data)])
+
+    def update(self, data):
+        self._db._rpc(writes=1)
+        documents = self._db._documents(self._collection)
+        if self.id not in documents:
+            raise KeyError(f"No document to update: {self.id}")
+        documents[self.id] = {**documents[self.id], **data}
+        self._db._notify(self._collection, [('MODIFIED', self.id)])
+
+    def delete(self):
+        self._db._rpc(writes=1)
+        self._db._notify(self._collection, [self._delete()])
+
+    def _set(self, data):
+        documents = self._db._documents(self._collection)
+        change_type = 'MODIFIED' if self.id in documents else 'ADDED'
+        documents[self.id] = dict(data)
+        return change_type, self.id
+
+    def _delete(self):
+        self._db._documents(self._collection).pop(self.id, None)
+        return 'REMOVED', self.id
+
+
+class FakeQuery:
+    def __init__(self, db, collection, limit=None, fields=None):
+        self._db = db
+        self._collection = collection
+        self._limit = limit
+        self._fields = fields
+
+    def limit(self, count):
+        return FakeQuery(self._db, self._collection, count, self._fields)
+
+    def select(self, fields):
+        return FakeQuery(self._db, self._collection, self._limit, list(fields))
+
+    def stream(self):
+        with self._db._lock:
+            items = list(self._db._documents(self._collection).items())
+        if self._limit is not None:
+            items = items[:self._limit]
+        # Firestore bills at least one read for a query, even an empty one
+        self._db._rpc(reads=max(len(items), 1))
+        for doc_id, data in items:
+            if self._fields is not None:
+                data = {field: data[field] for field in self._fields if field in data}
+            reference = FakeDocumentReference(self._db, self._collection, doc_id)
+            yield FakeDocumentSnapshot(reference, data)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+
+    def document(self, doc_id=None):
+        return FakeDocumentReference(self._db, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return None, reference
+
+    def on_snapshot(self, callback):
+        """Register a listener; like Firestore, it first receives the whole collection."""
+        listeners = self._db._listeners.setdefault(self._collection, [])
+        with self._db._lock:
+            documents = list(self._db._documents(self._collection).items())
+        snapshots = [
+            FakeDocumentSnapshot(FakeDocumentReference(self._db, self._collection, doc_id), data)
+            for doc_id, data in documents
+        ]
+        self._db._rpc(reads=max(len(snapshots), 1))
+        listeners.append(callback)
+        callback(snapshots, [], time.time())
+        return FakeWatch(listeners, callback)
+
+
+class FakeWatch:
+    def __init__(self, listeners, callback):
+        self._listeners = listeners
+        self._callback = callback
+
+    def is_active(self):
+        return self._callback in self._listeners
+
+    def unsubscribe(self):
+        if self._callback in self._listeners:
+            self._listeners.remove(self._callback)
+
+
+class FakeBatch:
+    """Collects writes and applies them in a single RPC, like a Firestore WriteBatch."""
+
+    def __init__(self, db):
+        self._db = db
+        self._operations = []
+
+    def set(self, reference, data):
+        self._operations.append((reference._collection, reference._set, data))
+
+    def delete(self, reference):
+        self._operations.append((reference._collection, reference._delete, None))
+
+    def commit(self):
+        if len(self._operations) > 500:
+            raise ValueError("A write batch can hold at most 500 operations")
+        self._db._rpc(writes=len(self._operations))
+        changes = {}
+        with self._db._lock:
+            for collection, operation, data in self._operations:
+                change = operation() if data is None else operation(data)
+                changes.setdefault(collection, []).append(change)
+        self._operations = []
+        for collection, collection_changes in changes.items():
+            self._db._notify(collection, collection_changes)
@@ -0,0 +1,181 @@
+"""
+Local Origin Sites Stand-In
+
+A small HTTP server standing in for the websites and YouTube, for benchmarks
+that shouldn't depend on the internet:
+
+- /pages/<name> serves the saved pages in benchmarks/html_corpus (the query
+  string is ignored, so ?copy=N gives the same page under a new URL)
+- /robots.txt allows everything
+- /youtube/oembed answers like YouTube's oEmbed endpoint for the videos in
+  VIDEOS
+- /youtube/transcript/<video ID> serves a video's transcript segments as
+  JSON, in the shape youtube_transcript_api returns them
+
+A video ID made of one in VIDEOS, a dash and a number (benchTalk02-17) gets
+that video, so a benchmark can ask for videos no cache has seen.
+
+Every answer waits a configurable time to first byte. The transcripts are
+generated from VIDEOS (same text every run), since youtube_transcript_api
+talks to YouTube's own endpoints; use FixtureTranscripts in place of
+YouTubeTranscriptApi to read them from here. The server counts requests and
+bytes sent by kind.
+"""
+
+import os
+import json
+import time
+import threading
+import http.server
+from urllib.parse import urlsplit, parse_qs
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), 'html_corpus')
+
+# Video ID -> (title, channel, length in minutes)
+VIDEOS = {
+    'benchShort1': ('Edge AI chips explained', 'Bench Tech Channel', 6),
+    'benchTalk02': ('Conference keynote: the state of AI agents', 'Bench Conference', 35),
+    'benchPanel3': ('Panel: quantum computing in the enterprise', 'Bench Conference', 60),
+}
+
+SENTENCES = (
+    "so the interesting part here is how the model runs on the device itself",
+    "latency drops because nothing has to go back to a data center",
+    "the vendors are all racing to ship their own accelerators this year",
+    "what enterprises actually ask us about is cost per inference",
+    "there are real questions about how well this holds up at scale",
+    "and the tooling is still catching up with the hardware",
+)
+
+
+def transcript_segments(minutes):
+    """A transcript of ``minutes`` minutes, one segment every four seconds."""
+    return [
+        {'text': SENTENCES[number % len(SENTENCES)], 'start': number * 4.0, 'duration': 4.0}
+        for number in range(int(minutes * 60 / 4))
+    ]
+
+
+def fixture_video(video_id):
+    """The VIDEOS ID a requested video ID stands for, or None."""
+    base = video_id.split('-', 1)[0]
+    return base if base in VIDEOS else None
+
+
+def load_pages(folder=CORPUS_DIR):
+    pages = {}
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.html'):
+            with open(os.path.join(folder, name), 'rb') as f:
+                pages[name[:-len('.html')]] = f.read()
+    return pages
+
+
+class FakeOriginServer:
+    """Saved pages and YouTube fixtures on a local port, in a background thread."""
+
+    def __init__(self, ttfb_ms=50, corpus_dir=CORPUS_DIR):
+        """
+        Args:
+            ttfb_ms (float, optional): Milliseconds to wait before each answer
+            corpus_dir (str, optional): Folder of saved .html pages
+        """
+        self.ttfb_ms = ttfb_ms
+        self.pages = load_pages(corpus_dir)
+        self.transcripts = {
+            video_id: json.dumps(transcript_segments(minutes)).encode('utf-8')
+            for video_id, (_, _, minutes) in VIDEOS.items()
+        }
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Zero the request and byte counters."""
+        self.stats = {'pages': 0, 'robots': 0, 'oembed': 0, 'transcripts': 0, 'not_found': 0, 'bytes': 0}
+
+    def _count(self, kind, size):
+        with self._lock:
+            self.stats[kind] += 1
+            self.stats['bytes'] += size
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def page_url(self, name, copy=None):
+        """The URL of a saved page; a different ``copy`` number makes a URL no cache has seen."""
+        return f"{self.url}/pages/{name}" + (f"?copy={copy}" if copy is not None else '')
+
+    def start(self):
+        """Start serving on a free local port; returns self."""
+        origin = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, kind, status, content_type, body):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Date lookups hang up once they've read enough
+                    self.close_connection = True
+                origin._count(kind, len(body))
+
+            def do_GET(self):
+                time.sleep(origin.ttfb_ms / 1000)
+                parts = urlsplit(self.path)
+                if parts.path == '/robots.txt':
+                    self._send('robots', 200, 'text/plain', b'User-agent: *\nAllow: /\n')
+                elif parts.path.startswith('/pages/') and parts.path[len('/pages/'):] in origin.pages:
+                    self._send('pages', 200, 'text/html; charset=utf-8', origin.pages[parts.path[len('/pages/'):]])
+                elif parts.path == '/youtube/oembed':
+                    video_url = parse_qs(parts.query).get('url', [''])[0]
+                    video_id = fixture_video(parse_qs(urlsplit(video_url).query).get('v', [''])[0])
+                    if video_id:
+                        title, channel, _ = VIDEOS[video_id]
+                        body = json.dumps({'title': title, 'author_name': channel, 'type': 'video'}).encode('utf-8')
+                        self._send('oembed', 200, 'application/json', body)
+                    else:
+                        self._send('not_found', 404, 'text/plain', b'Not Found')
+                elif parts.path.startswith('/youtube/transcript/') and fixture_video(parts.path.rsplit('/', 1)[1]):
+                    video_id = fixture_video(parts.path.rsplit('/', 1)[1])
+                    self._send('transcripts', 200, 'application/json', origin.transcripts[video_id])
+                else:
+                    self._send('not_found', 404, 'text/plain', b'Not Found')
+
+        class Server(http.server.ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                pass
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class FixtureTranscripts:
+    """Stands in for YouTubeTranscriptApi, reading transcripts from a FakeOriginServer."""
+
+    def __init__(self, origin_url):
+        self.origin_url = origin_url
+
+    def get_transcript(self, video_id):
+        import http_client
+        response = http_client.get(f"{self.origin_url}/youtube/transcript/{video_id}")
+        if response.status_code != 200:
+            raise RuntimeError(f"No transcript for {video_id}")
+        return response.json()
@@ -0,0 +1,344 @@
+"""
+Tiered Cache Module
+
+This module provides a small two-level cache used by the scraper:
+1. An in-process LRU for the hottest entries
+2. A shared on-disk tier (one JSON file per entry) that every gunicorn
+   worker on the machine can read and write
+
+Entries carry an expiry time and optional HTTP validators (ETag and
+Last-Modified), so stale entries can be revalidated with a conditional
+request instead of being downloaded again. Concurrent lookups for the same
+key inside a process share a single in-flight fetch. Hits, misses and the
+rest are also counted in the shared metrics (see metrics.py).
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import metrics
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref_src')
+
+
+def normalize_url(url):
+    """
+    Normalize a URL so that trivially different spellings share a cache entry.
+
+    Lower-cases the scheme and host, drops default ports, fragments and
+    tracking parameters, and sorts the remaining query parameters.
+
+    Args:
+        url (str): The URL to normalize
+
+    Returns:
+        str: The normalized URL
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not (scheme, parts.port) in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+class TieredCache:
+    """An in-process LRU in front of a shared on-disk cache."""
+
+    # Returned by a fetch function when the origin answered 304 Not Modified
+    NOT_MODIFIED = object()
+
+    def __init__(self, name, cache_dir, ttl, max_memory_entries=256, max_disk_bytes=256 * 1024 * 1024):
+        """
+        Set up a cache.
+
+        Args:
+            name (str): Name of the cache, also used as its subdirectory
+            cache_dir (str): Root folder for the on-disk tier, or None for memory only
+            ttl (float): Default time to live for entries, in seconds
+            max_memory_entries (int, optional): Size of the in-process LRU
+            max_disk_bytes (int, optional): Size limit for the on-disk tier
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = os.path.join(cache_dir, name) if cache_dir else None
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._writes_since_sweep = 0
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'bytes_saved': 0,
+        }
+
+    # Counters
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+        if counter == 'bytes_saved':
+            metrics.inc(metrics.CACHE_BYTES_SAVED, amount, cache=self.name)
+        else:
+            metrics.inc(metrics.CACHE_EVENTS, amount, cache=self.name, event=counter)
+
+    def stats(self):
+        """
+        Get the hit/miss counters for this process.
+
+        Returns:
+            dict: Counter values plus the current number of entries in memory
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+        stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+        return stats
+
+    # Storage tiers
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _remember(self, key, entry):
+        """Put an entry in the in-process LRU, evicting the oldest if needed."""
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Bump the modification time so disk eviction is least-recently-used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        # Guard against hash collisions
+        return entry if entry.get('key') == key else None
+
+    def _write_disk(self, key, entry):
+        if not self.directory:
+            return
+        # Write to a temporary file first so other workers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Error writing {self.name} cache entry: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._writes_since_sweep += 1
+            sweep = self._writes_since_sweep >= 50
+            if sweep:
+                self._writes_since_sweep = 0
+        if sweep:
+            self.evict_disk()
+
+    def evict_disk(self):
+        """Delete least-recently-used files until the disk tier fits its size limit."""
+        if not self.directory:
+            return
+        files = []
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for item in entries:
+                if not item.name.endswith('.json'):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, item.path))
+                total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self._count('evictions')
+            except OSError:
+                pass
+
+    # Public API
+
+    def get(self, key):
+        """
+        Look up an entry in memory, then on disk. Expired entries are still returned.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            tuple: (entry, tier) where tier is 'memory' or 'disk', or (None, None)
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry, 'memory'
+
+        entry = self._read_disk(key)
+        if entry is not None:
+            self._remember(key, entry)
+            return entry, 'disk'
+        return None, None
+
+    def get_value(self, key):
+        """
+        Get a value only if it is cached and still fresh, counting the hit or miss.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            The cached value, or None
+        """
+        entry, tier = self.get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            self._count(f'{tier}_hits')
+            self._count('bytes_saved', entry.get('download_bytes', 0))
+            return entry['value']
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl=None, validators=None, download_bytes=0):
+        """
+        Store a value in both tiers.
+
+        Args:
+            key (str): The cache key
+            value: Any JSON-serializable value
+            ttl (float, optional): Time to live in seconds. Defaults to the cache TTL.
+            validators (dict, optional): 'etag' and/or 'last_modified' from the origin
+            download_bytes (int, optional): How many bytes fetching the value cost
+
+        Returns:
+            dict: The stored entry
+        """
+        now = time.time()
+        entry = {
+            'key': key,
+            'value': value,
+            'stored_at': now,
+            'expires_at': now + (self.ttl if ttl is None else ttl),
+            'validators': validators or {},
+            'download_bytes': download_bytes,
+        }
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+        return entry
+
+    def refresh(self, key, entry, ttl=None):
+        """Extend an entry's lifetime after the origin confirmed it is unchanged."""
+        return self.set(
+            key,
+            entry['value'],
+            ttl=ttl,
+            validators=entry.get('validators'),
+            download_bytes=entry.get('download_bytes', 0),
+        )
+
+    def get_or_fetch(self, key, fetch, ttl=None):
+        """
+        Return a cached value, fetching or revalidating it when needed.
+
+        ``fetch`` is called with the stale entry (or None) and must return
+        either ``TieredCache.NOT_MODIFIED`` or a dict with ``value`` and,
+        optionally, ``validators``, ``download_bytes`` and ``cache`` (False to
+        skip storing, e.g. for errors). Only one fetch per key runs at a time in
+        this process; concurrent callers wait for it and share its result.
+
+        Args:
+            key (str): The cache key
+            fetch (callable): Function that loads the value from the origin
+            ttl (float, optional): Time to live for a newly stored value
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        entry, tier = self.get(key)
+        if entry is not None and entry['expires_at'] > time.time():
+            self._count(f'{tier}_hits')
+            self._count('bytes_saved', entry.get('download_bytes', 0))
+            return entry['value']
+
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                waiter = {'event': threading.Event(), 'value': None, 'error': None}
+                self._inflight[key] = waiter
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            self._count('coalesced')
+            waiter['event'].wait()
+            if waiter['error'] is not None:
+                raise waiter['error']
+            return waiter['value']
+
+        try:
+            result = fetch(entry)
+            if result is TieredCache.NOT_MODIFIED:
+                self._count('revalidated')
+                self._count('bytes_saved', entry.get('download_bytes', 0))
+                self.refresh(key, entry, ttl)
+                value = entry['value']
+            else:
+                self._count('misses')
+                value = result['value']
+                if result.get('cache', True):
+                    self.set(
+                        key,
+                        value,
+                        ttl=ttl,
+                        validators=result.get('validators'),
+                        download_bytes=result.get('download_bytes', 0),
+                    )
+            waiter['value'] = value
+            return value
+        except Exception as e:
+            waiter['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter['event'].set()
@@ -0,0 +1,43 @@
+"""
+Common Helpers
+
+Small functions several modules need, kept here so none of them has to
+import another's internals:
+1. percentile() for the latency figures in the stats endpoints and benchmarks
+2. process_alive() for telling whether another worker process still exists
+"""
+
+import os
+import math
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = max(1, math.ceil(fraction * len(values)))
+    return values[rank - 1]
+
+
+def process_alive(pid):
+    """
+    Whether a process with this ID is running on this machine.
+
+    PIDs are reused, so a True answer can mean a different process that got
+    the same ID; use it only where that errs on the safe side.
+
+    Args:
+        pid (int): The process ID
+
+    Returns:
+        bool: Whether there is such a process
+    """
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -13,10 +13,132 @@ class Config:
     # Data storage settings
     DATA_FOLDER = os.getenv('DATA_FOLDER', 'data')
     TRENDS_FILE = os.path.join(DATA_FOLDER, 'tech_trends.csv')
+    # Where trends are kept when Firestore isn't available: 'sqlite' (one row per
+    # trend, safe with several workers) or 'csv' (the whole file rewritten on each change).
+    # An existing TRENDS_FILE is imported into the SQLite database the first time it's created.
+    TRENDS_LOCAL_BACKEND = os.getenv('TRENDS_LOCAL_BACKEND', 'sqlite').lower()
+    TRENDS_DB_PATH = os.getenv('TRENDS_DB_PATH', os.path.join(DATA_FOLDER, 'trends.sqlite3'))
     
     # API Keys
     CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY', '')
     
+    # Outbound HTTP settings (shared by the scraper, date extraction and Claude client)
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '20'))
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+    HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.5'))
+    HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '32'))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+    HTTP_MAX_RESPONSE_BYTES = int(os.getenv('HTTP_MAX_RESPONSE_BYTES', str(10 * 1024 * 1024)))
+    CLAUDE_READ_TIMEOUT = float(os.getenv('CLAUDE_READ_TIMEOUT', '60'))
+    
+    # Scraping settings
+    SCRAPE_MAX_WORKERS = int(os.getenv('SCRAPE_MAX_WORKERS', '8'))
+    SCRAPE_PER_HOST_LIMIT = int(os.getenv('SCRAPE_PER_HOST_LIMIT', '2'))
+    SCRAPE_DEADLINE_SECONDS = float(os.getenv('SCRAPE_DEADLINE_SECONDS', '30'))
+    # Pages bigger than this, or not one of these types, are refused instead of parsed
+    SCRAPE_MAX_PAGE_BYTES = int(os.getenv('SCRAPE_MAX_PAGE_BYTES', str(5 * 1024 * 1024)))
+    SCRAPE_ALLOWED_CONTENT_TYPES = tuple(
+        media_type.strip().lower()
+        for media_type in os.getenv('SCRAPE_ALLOWED_CONTENT_TYPES', 'text/html,application/xhtml+xml').split(',')
+        if media_type.strip()
+    )
+    
+    # Per-host politeness for scraping (see host_scheduler.py). Each host starts
+    # at HOST_RATE_PER_SECOND, gains HOST_RATE_INCREASE per normal answer and is
+    # multiplied by HOST_RATE_BACKOFF on a 429, 5xx or connection error.
+    HOST_RATE_PER_SECOND = float(os.getenv('HOST_RATE_PER_SECOND', '2'))
+    HOST_MIN_RATE_PER_SECOND = float(os.getenv('HOST_MIN_RATE_PER_SECOND', '0.2'))
+    HOST_MAX_RATE_PER_SECOND = float(os.getenv('HOST_MAX_RATE_PER_SECOND', '10'))
+    HOST_RATE_INCREASE = float(os.getenv('HOST_RATE_INCREASE', '0.1'))
+    HOST_RATE_BACKOFF = float(os.getenv('HOST_RATE_BACKOFF', '0.5'))
+    HOST_MAX_QUEUE_WAIT = float(os.getenv('HOST_MAX_QUEUE_WAIT', '30'))
+    HOST_MAX_TRACKED = int(os.getenv('HOST_MAX_TRACKED', '1024'))
+    ROBOTS_TXT_ENABLED = os.getenv('ROBOTS_TXT_ENABLED', 'True').lower() in ('true', '1', 't')
+    ROBOTS_TXT_TTL_SECONDS = float(os.getenv('ROBOTS_TXT_TTL_SECONDS', '86400'))
+    ROBOTS_USER_AGENT = os.getenv('ROBOTS_USER_AGENT', 'TechTrendsBot')
+    
+    # Batch date lookup settings (/api/extract-date/batch)
+    DATE_BATCH_MAX_URLS = int(os.getenv('DATE_BATCH_MAX_URLS', '500'))
+    DATE_BATCH_MAX_WORKERS = int(os.getenv('DATE_BATCH_MAX_WORKERS', '8'))
+    DATE_LOOKUP_TIMEOUT = float(os.getenv('DATE_LOOKUP_TIMEOUT', '10'))
+    # Date lookups stop downloading once a date is found, or after this much of
+    # the page following the <head> (dates are almost always near the top)
+    DATE_SCAN_BODY_BYTES = int(os.getenv('DATE_SCAN_BODY_BYTES', str(32 * 1024)))
+    
+    # In-memory trend repository settings
+    TRENDS_MAX_STALENESS_SECONDS = float(os.getenv('TRENDS_MAX_STALENESS_SECONDS', '30'))
+    TRENDS_LISTENER_TIMEOUT = float(os.getenv('TRENDS_LISTENER_TIMEOUT', '10'))
+    TRENDS_MAX_PAGE_SIZE = int(os.getenv('TRENDS_MAX_PAGE_SIZE', '100'))
+    
+    # Scrape cache settings (the disk tier is shared by all workers on a machine)
+    CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(DATA_FOLDER, 'cache'))
+    SCRAPE_CACHE_TTL_SECONDS = float(os.getenv('SCRAPE_CACHE_TTL_SECONDS', '3600'))
+    TRANSCRIPT_CACHE_TTL_SECONDS = float(os.getenv('TRANSCRIPT_CACHE_TTL_SECONDS', '604800'))
+    # Transcripts of videos at least this long are sent for memos as timestamped
+    # paragraphs of YOUTUBE_SEGMENT_SECONDS each
+    YOUTUBE_TIMESTAMP_MIN_SECONDS = float(os.getenv('YOUTUBE_TIMESTAMP_MIN_SECONDS', '1200'))
+    YOUTUBE_SEGMENT_SECONDS = float(os.getenv('YOUTUBE_SEGMENT_SECONDS', '60'))
+    SCRAPE_CACHE_MEMORY_ENTRIES = int(os.getenv('SCRAPE_CACHE_MEMORY_ENTRIES', '256'))
+    SCRAPE_CACHE_MAX_BYTES = int(os.getenv('SCRAPE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    
+    # Memo cache settings (identical memo requests reuse the first answer)
+    MEMO_CACHE_TTL_SECONDS = float(os.getenv('MEMO_CACHE_TTL_SECONDS', '86400'))
+    MEMO_CACHE_MEMORY_ENTRIES = int(os.getenv('MEMO_CACHE_MEMORY_ENTRIES', '128'))
+    MEMO_CACHE_PERSIST = os.getenv('MEMO_CACHE_PERSIST', 'True').lower() in ('true', '1', 't')
+    
+    # Memo input settings (long input is condensed to fit instead of being cut off)
+    MEMO_INPUT_TOKEN_BUDGET = int(os.getenv('MEMO_INPUT_TOKEN_BUDGET', '30000'))
+    MEMO_CHUNK_TOKENS = int(os.getenv('MEMO_CHUNK_TOKENS', '6000'))
+    MEMO_SUMMARY_TOKENS = int(os.getenv('MEMO_SUMMARY_TOKENS', '400'))
+    MEMO_MAP_WORKERS = int(os.getenv('MEMO_MAP_WORKERS', '8'))
+    
+    # Background job settings (scrape-and-generate jobs run outside the request)
+    JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(DATA_FOLDER, 'jobs.sqlite3'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+    JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+    # Running jobs send a heartbeat every JOB_HEARTBEAT_SECONDS; one that misses them
+    # for JOB_HEARTBEAT_TIMEOUT seconds (its worker died) is put back in the queue
+    JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '10'))
+    JOB_HEARTBEAT_TIMEOUT = float(os.getenv('JOB_HEARTBEAT_TIMEOUT', '60'))
+    
+    # Feed ingestion settings (new RSS/Atom items are queued as background jobs)
+    FEEDS_FILE = os.getenv('FEEDS_FILE', os.path.join(DATA_FOLDER, 'feeds.json'))
+    FEEDS_DB_PATH = os.getenv('FEEDS_DB_PATH', os.path.join(DATA_FOLDER, 'feeds.sqlite3'))
+    FEED_POLLING_ENABLED = os.getenv('FEED_POLLING_ENABLED', 'True').lower() in ('true', '1', 't')
+    FEED_POLL_INTERVAL = float(os.getenv('FEED_POLL_INTERVAL', '900'))
+    FEED_CHECK_INTERVAL = float(os.getenv('FEED_CHECK_INTERVAL', '30'))
+    FEED_MAX_WORKERS = int(os.getenv('FEED_MAX_WORKERS', '8'))
+    FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', '100'))
+    FEED_MAX_BYTES = int(os.getenv('FEED_MAX_BYTES', str(5 * 1024 * 1024)))
+    FEED_MAX_BACKOFF_SECONDS = float(os.getenv('FEED_MAX_BACKOFF_SECONDS', str(6 * 3600)))
+    # A feed's first poll queues only its newest few items; later polls up to FEED_MAX_ITEMS_PER_POLL
+    FEED_BACKFILL_ITEMS = int(os.getenv('FEED_BACKFILL_ITEMS', '3'))
+    FEED_MAX_ITEMS_PER_POLL = int(os.getenv('FEED_MAX_ITEMS_PER_POLL', '20'))
+    FEED_ITEM_RETENTION_SECONDS = float(os.getenv('FEED_ITEM_RETENTION_SECONDS', str(90 * 24 * 3600)))
+    
+    # Startup settings: each worker connects to Firestore, sets up Claude, loads the
+    # trends and starts its background threads before taking requests (see gunicorn.conf.py)
+    WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'True').lower() in ('true', '1', 't')
+    
+    # Metrics settings (see metrics.py): every worker's request and stage timings and
+    # counters are added up in METRICS_DB_PATH and served at /api/metrics
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('true', '1', 't')
+    METRICS_DB_PATH = os.getenv('METRICS_DB_PATH', os.path.join(DATA_FOLDER, 'metrics.sqlite3'))
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+    # Print a JSON log line for every request and every timed stage, tagged with the request's trace ID
+    TRACE_LOGS = os.getenv('TRACE_LOGS', 'True').lower() in ('true', '1', 't')
+    
+    # Profiler settings (see profiler.py): requests carrying PROFILER_TOKEN in an
+    # X-Profile-Token header are sampled; with no token set, profiling is off
+    PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+    PROFILES_FOLDER = os.getenv('PROFILES_FOLDER', os.path.join(DATA_FOLDER, 'profiles'))
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    # Longest a single request is sampled for, and how many profiles are kept on disk
+    PROFILER_MAX_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', '120'))
+    PROFILER_KEEP = int(os.getenv('PROFILER_KEEP', '100'))
+    
     # Ensure data directory exists
     @classmethod
     def init_app(cls):
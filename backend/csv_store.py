@@ -0,0 +1,93 @@
+"""
+CSV Trend File Module
+
+Reads and writes the backup CSV file of trends (used when Firestore isn't
+available and TRENDS_LOCAL_BACKEND is 'csv', and imported by sqlite_store.py)
+without pandas:
+1. Lists and dicts, written to the file as their Python repr, are parsed back
+   when the file is read, so news_links and persona keep their types
+2. The file is written to a temporary file first and then moved into place,
+   so a reader never sees a half-written file
+"""
+
+import os
+import ast
+import csv
+import tempfile
+
+# Columns every file starts with; any other fields follow in the order they're first seen
+COLUMNS = ('research_task', 'news_links', 'context', 'date_discovered', 'theme', 'analysis')
+
+
+def _csv_value(value):
+    """
+    Turn a CSV cell back into the value that was written.
+
+    Lists and dicts were written to the CSV file as their Python repr, so
+    those are parsed back; everything else stays text.
+    """
+    if value is None:
+        return ''
+    stripped = value.strip()
+    if stripped[:1] in ('[', '{') and stripped[-1:] in (']', '}'):
+        try:
+            return ast.literal_eval(stripped)
+        except (ValueError, SyntaxError):
+            pass
+    return value
+
+
+def _cell(value):
+    """A field value as it's written to the file ('' for missing values)."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+def read_csv_trends(csv_path):
+    """
+    Read every trend from a CSV file.
+
+    Args:
+        csv_path (str): The CSV file
+
+    Returns:
+        list: The trend dicts, in file order
+    """
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [
+            {field: _csv_value(value) for field, value in row.items() if field}
+            for row in csv.DictReader(f)
+        ]
+
+
+def write_csv_trends(csv_path, trends):
+    """
+    Replace a CSV file with the given trends.
+
+    Args:
+        csv_path (str): The CSV file
+        trends (list): The trend dicts, in the order they should be written
+    """
+    columns = list(COLUMNS)
+    for trend in trends:
+        for field in trend:
+            if field not in columns and field != 'id':
+                columns.append(field)
+
+    directory = os.path.dirname(csv_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.trends-', suffix='.csv')
+    try:
+        with os.fdopen(descriptor, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for trend in trends:
+                writer.writerow([_cell(trend.get(field)) for field in columns])
+        os.replace(temporary_path, csv_path)
+    except BaseException:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,313 @@
+"""
+Publication Date Extraction Module
+
+Finds when an article was published. The methods are tried from cheapest to
+most expensive:
+1. Date patterns in the URL itself (no download needed)
+2. Meta tags in the page's HTML
+3. Common date patterns in the page's text
+
+scan_for_date() does the same for a page that is still downloading: it parses
+the bytes as they arrive and stops as soon as the answer is known, so most
+lookups only read the <head>.
+"""
+
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+import lxml.etree
+import lxml.html
+
+# Meta tags that might contain publication dates, checked in this order
+DATE_META_TAGS = [
+    'article:published_time',
+    'article:modified_time',
+    'og:published_time',
+    'og:modified_time',
+    'publication_date',
+    'date',
+    'pubdate'
+]
+
+# schema.org microdata (used by YouTube watch pages, among others)
+DATE_ITEMPROPS = ['datePublished', 'uploadDate']
+
+# Date patterns in page text, best first. Each has one group holding the date.
+CONTENT_DATE_PATTERNS = [
+    r'Published:?\s*(\w+\s+\d{1,2},\s+\d{4})',
+    r'Posted:?\s*(\w+\s+\d{1,2},\s+\d{4})',
+    r'Date:?\s*(\w+\s+\d{1,2},\s+\d{4})',
+    r'(\d{1,2}\s+\w+\s+\d{4})',
+    r'(\w+\s+\d{1,2}\s+\d{4})',
+    r'(\d{4}-\d{2}-\d{2})'
+]
+
+# Compiled once; each is searched separately, since re tries an alternation's
+# branches one by one at every position and loses each pattern's literal
+# prefix search, which makes a combined pattern slower, not faster
+_content_date_patterns = [re.compile(pattern) for pattern in CONTENT_DATE_PATTERNS]
+
+CONTENT_DATE_FORMATS = ['%B %d, %Y', '%d %B %Y', '%B %d %Y', '%Y-%m-%d']
+
+# Page text beyond this many characters isn't searched for a date
+DEFAULT_TEXT_BUDGET = 16 * 1024
+
+
+def extract_date_from_url_pattern(url):
+    """Extract date from common URL patterns"""
+    # Parse the URL
+    parsed_url = urlparse(url)
+    path = parsed_url.path
+    query = parsed_url.query
+
+    # Common date patterns in URLs
+    patterns = [
+        # Match YYYY/MM/DD in path
+        r'/(\d{4})/(\d{1,2})/(\d{1,2})/',
+        # Match YYYY-MM-DD in path
+        r'/(\d{4})-(\d{1,2})-(\d{1,2})/',
+        # Match date=YYYY-MM-DD in query
+        r'[?&]date=(\d{4})-(\d{1,2})-(\d{1,2})',
+        # Match published=YYYY-MM-DD in query
+        r'[?&]published=(\d{4})-(\d{1,2})-(\d{1,2})'
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, path + '?' + query)
+        if match:
+            year = int(match.group(1))
+            month = int(match.group(2))
+            day = int(match.group(3))
+
+            # Validate date components
+            current_year = datetime.now().year
+            if 1990 <= year <= current_year and 1 <= month <= 12 and 1 <= day <= 31:
+                try:
+                    return datetime(year, month, day)
+                except ValueError:
+                    # Invalid date like February 30
+                    continue
+
+    return None
+
+
+def parse_meta_date(date_str):
+    """Parse the date formats commonly found in meta tags"""
+    try:
+        # Try to parse ISO format date (YYYY-MM-DDTHH:MM:SS)
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    except ValueError:
+        # Try other common formats
+        for fmt in ['%Y-%m-%d', '%Y/%m/%d', '%d-%m-%Y', '%d/%m/%Y']:
+            try:
+                return datetime.strptime(date_str, fmt)
+            except ValueError:
+                continue
+    return None
+
+
+def best_meta_date(metas):
+    """
+    Pick the publication date from a page's meta tags.
+    
+    Args:
+        metas (iterable): The page's <meta> elements, in document order
+        
+    Returns:
+        tuple: (datetime, the tag name or itemprop it came from), or (None, None)
+    """
+    # One pass over the meta tags, remembering the first of each kind
+    by_property = {}
+    by_name = {}
+    by_itemprop = {}
+    for meta in metas:
+        for attribute, found in (('property', by_property), ('name', by_name), ('itemprop', by_itemprop)):
+            value = meta.get(attribute)
+            if value is not None and value not in found:
+                found[value] = meta
+
+    candidates = [(tag_name, by_property.get(tag_name, by_name.get(tag_name))) for tag_name in DATE_META_TAGS]
+    candidates += [(prop, by_itemprop.get(prop)) for prop in DATE_ITEMPROPS]
+
+    for tag_name, meta_tag in candidates:
+        if meta_tag is not None and meta_tag.get('content'):
+            date_obj = parse_meta_date(meta_tag.get('content'))
+            if date_obj:
+                return date_obj, tag_name
+
+    return None, None
+
+
+def extract_date_from_meta_tags(root):
+    """Extract date from HTML meta tags (root is an lxml tree)"""
+    return best_meta_date(root.iter('meta'))[0]
+
+
+def extract_date_from_text(text):
+    """
+    Find a date in plain text: the first pattern whose first match parses wins.
+    
+    Args:
+        text (str): The text to search
+        
+    Returns:
+        datetime: The date, or None if nothing in the text parses as one
+    """
+    for pattern in _content_date_patterns:
+        match = pattern.search(text)
+        if match:
+            date_str = match.group(1)
+            # Try different date formats
+            for fmt in CONTENT_DATE_FORMATS:
+                try:
+                    return datetime.strptime(date_str, fmt)
+                except ValueError:
+                    continue
+    return None
+
+
+def extract_date_from_content(root, max_chars=DEFAULT_TEXT_BUDGET):
+    """
+    Extract date from page content using common patterns (root is an lxml tree)
+    
+    Only the first max_chars characters of text are searched; publication
+    dates sit near the top of a page.
+    """
+    # Empty script and style elements; the text after them stays
+    for script in list(root.iter('script', 'style')):
+        script.clear(keep_tail=True)
+
+    # Get text, stopping once we have enough
+    pieces = []
+    length = 0
+    for piece in root.itertext():
+        pieces.append(piece)
+        length += len(piece)
+        if length >= max_chars:
+            break
+
+    return extract_date_from_text(''.join(pieces)[:max_chars])
+
+
+def find_publication_date(url, root=None, max_chars=DEFAULT_TEXT_BUDGET):
+    """
+    Find a publication date, trying the URL, then meta tags, then the text.
+
+    Args:
+        url (str): The page URL
+        root (lxml.html.HtmlElement, optional): The parsed page. Without it only
+            the URL is checked. Script and style elements are emptied if the
+            text has to be searched.
+        max_chars (int, optional): How much of the page's text to search
+
+    Returns:
+        tuple: (datetime, method) where method is 'url', 'meta' or 'content',
+            or (None, None) if no date was found
+    """
+    date = extract_date_from_url_pattern(url)
+    if date:
+        return date, 'url'
+    if root is None:
+        return None, None
+
+    date = extract_date_from_meta_tags(root)
+    if date:
+        return date, 'meta'
+
+    date = extract_date_from_content(root, max_chars)
+    if date:
+        return date, 'content'
+    return None, None
+
+
+def scan_for_date(chunks, max_bytes, max_body_bytes=None, encoding=None, max_chars=DEFAULT_TEXT_BUDGET):
+    """
+    Find a publication date in a page while it downloads, reading no more than needed.
+    
+    The chunks are parsed as they arrive. Reading stops as soon as:
+    - an article:published_time meta tag is found (nothing outranks it), or
+    - the <head> has closed and one of its meta tags gave a date, or
+    - a date meta tag turns up later in the body (YouTube puts them there), or
+    - max_body_bytes have been read after the <head>, or max_bytes in all.
+    If no meta tag gave a date, the text read so far is searched instead.
+    Meta tags are ranked as in extract_date_from_meta_tags(), except that
+    one in the body can't beat a date already found in the <head>.
+    
+    Args:
+        chunks (iterable): The page body as byte strings, e.g. response.iter_content()
+        max_bytes (int): Never read more than this
+        max_body_bytes (int, optional): How much of the page after the <head>
+            to read looking for a date. No limit but max_bytes if not given.
+        encoding (str, optional): The page encoding (a Python codec name), if
+            the server declared one. Otherwise lxml reads it from the page.
+        max_chars (int, optional): How much of the text to search for a date
+        
+    Returns:
+        dict: 'date' (datetime or None), 'method' ('meta', 'content' or None),
+            'root' (the page as parsed so far, for reading the title and other
+            metadata), 'bytes_read' and 'complete' (whether the whole page was read)
+    """
+    try:
+        # libxml2 spells encodings with dashes where Python uses underscores
+        parser = lxml.etree.HTMLPullParser(
+            events=('end',), tag=('meta', 'head'), encoding=encoding.replace('_', '-') if encoding else None)
+    except LookupError:
+        # An encoding libxml2 doesn't know; dates and tag names are ASCII anyway
+        parser = lxml.etree.HTMLPullParser(events=('end',), tag=('meta', 'head'))
+    parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+
+    metas = []
+    head_end = None
+    date = None
+    bytes_read = 0
+    complete = True
+
+    def read_events():
+        """Collect new meta tags; True if anything changed the answer."""
+        nonlocal head_end
+        changed = False
+        for _, element in parser.read_events():
+            if element.tag == 'head':
+                head_end = bytes_read
+            else:
+                metas.append(element)
+            changed = True
+        return changed
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        bytes_read += len(chunk)
+
+        if read_events() and metas:
+            date, tag_name = best_meta_date(metas)
+            if date and (head_end is not None or tag_name == DATE_META_TAGS[0]):
+                complete = False
+                break
+
+        body_bytes = bytes_read - head_end if head_end is not None else 0
+        if bytes_read >= max_bytes or (max_body_bytes is not None and body_bytes >= max_body_bytes):
+            complete = False
+            break
+
+    try:
+        root = parser.close()
+    except lxml.etree.XMLSyntaxError:
+        root = None
+    if root is None:
+        # Nothing parseable arrived (an empty body, say)
+        root = lxml.html.document_fromstring('<html><body></body></html>')
+    if complete or not date:
+        # The parser may have held back the last few tags until close()
+        read_events()
+        date = best_meta_date(metas)[0]
+    if date:
+        return {'date': date, 'method': 'meta', 'root': root, 'bytes_read': bytes_read, 'complete': complete}
+
+    date = extract_date_from_content(root, max_chars)
+    return {
+        'date': date,
+        'method': 'content' if date else None,
+        'root': root,
+        'bytes_read': bytes_read,
+        'complete': complete,
+    }
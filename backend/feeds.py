@@ -0,0 +1,574 @@
+"""
+Feed Ingestion Module
+
+Polls a list of RSS and Atom feeds and queues a scrape-and-generate job for
+every new item, so trends arrive without anyone pasting links:
+1. The feeds come from a JSON file (Config.FEEDS_FILE), one entry per feed
+   with its URL, the theme its memos get and, optionally, a research task,
+   context and poll interval
+2. Each feed's ETag and Last-Modified are kept, so an unchanged feed costs a
+   304 and no parsing
+3. Every item we have seen is remembered per feed, so an item is only ever
+   queued once, however often the feed is polled or reordered
+4. Due feeds are claimed in the database before they are polled, so several
+   worker processes can poll at once without fetching a feed twice, and
+   each process polls on a bounded thread pool, pacing each site through
+   the scraper's host scheduler
+5. A feed that fails is polled less and less often until it recovers
+
+The first time a feed is seen, only its newest Config.FEED_BACKFILL_ITEMS
+items are queued; the rest are just remembered.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+import lxml.etree
+import http_client
+from config import Config
+from date_extract import parse_meta_date
+from host_scheduler import parse_retry_after
+from scraper import host_scheduler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feeds (
+    url TEXT PRIMARY KEY,
+    theme TEXT NOT NULL DEFAULT '',
+    research_task TEXT,
+    context TEXT NOT NULL DEFAULT '',
+    interval_seconds REAL NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    etag TEXT,
+    last_modified TEXT,
+    next_poll_at REAL NOT NULL,
+    last_polled_at REAL,
+    last_status INTEGER,
+    last_error TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    polls INTEGER NOT NULL DEFAULT 0,
+    not_modified INTEGER NOT NULL DEFAULT 0,
+    items_queued INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS feeds_due ON feeds (enabled, next_poll_at);
+CREATE TABLE IF NOT EXISTS feed_items (
+    feed_url TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    link TEXT,
+    title TEXT,
+    job_id TEXT,
+    seen_at REAL NOT NULL,
+    last_listed_at REAL,
+    PRIMARY KEY (feed_url, item_id)
+);
+"""
+
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = {'feed_items': {'last_listed_at': 'REAL'}}
+
+
+class FeedError(Exception):
+    """Raised when a feed can't be read as RSS or Atom."""
+
+
+def _localname(element):
+    return lxml.etree.QName(element).localname if isinstance(element.tag, str) else None
+
+
+def _child(element, *names):
+    """The first child with one of these local names (any namespace)."""
+    for child in element:
+        if _localname(child) in names:
+            return child
+    return None
+
+
+def _child_text(element, *names):
+    child = _child(element, *names)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip() or None
+
+
+def _feed_date(value):
+    """Read an RSS (RFC 822) or Atom (ISO 8601) date as 'YYYY-MM-DD'."""
+    if not value:
+        return None
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        date = parse_meta_date(value)
+    if date is None:
+        return None
+    if date.tzinfo is not None:
+        date = date.astimezone(timezone.utc)
+    return date.strftime('%Y-%m-%d')
+
+
+def _atom_link(entry):
+    # Atom entries can have several links; the page itself is rel="alternate" (the default)
+    for link in entry:
+        if _localname(link) == 'link' and link.get('rel', 'alternate') == 'alternate' and link.get('href'):
+            return link.get('href')
+    return None
+
+
+def parse_feed(body, feed_url):
+    """
+    Read the items of an RSS 2.0, RSS 1.0 (RDF) or Atom feed.
+
+    Args:
+        body (bytes): The feed as downloaded
+        feed_url (str): The feed URL, for resolving relative links
+
+    Returns:
+        list: Items in feed order, as dicts with 'id', 'link', 'title' and
+            'published' ('YYYY-MM-DD' or None). Items without a link are left out.
+
+    Raises:
+        FeedError: If the body isn't an RSS or Atom document
+    """
+    # No DTDs, entities or network access: feeds are untrusted input
+    parser = lxml.etree.XMLParser(resolve_entities=False, no_network=True, load_dtd=False, recover=True)
+    try:
+        root = lxml.etree.fromstring(body, parser=parser)
+    except lxml.etree.XMLSyntaxError as e:
+        raise FeedError(f"Not an XML feed: {e}")
+    if root is None:
+        raise FeedError("Empty feed")
+
+    kind = _localname(root)
+    if kind == 'feed':
+        entries = [element for element in root if _localname(element) == 'entry']
+    elif kind in ('rss', 'RDF'):
+        entries = [element for element in root.iter() if _localname(element) == 'item']
+    else:
+        raise FeedError(f"Not an RSS or Atom feed (root element <{kind}>)")
+
+    items = []
+    for entry in entries:
+        if kind == 'feed':
+            link = _atom_link(entry)
+            item_id = _child_text(entry, 'id')
+            published = _child_text(entry, 'published', 'updated')
+        else:
+            link = _child_text(entry, 'link') or entry.get('{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about')
+            item_id = _child_text(entry, 'guid')
+            published = _child_text(entry, 'pubDate', 'date')
+        if not link:
+            continue
+        link = urljoin(feed_url, link)
+        title = ' '.join((_child_text(entry, 'title') or '').split()) or None
+        items.append({
+            'id': item_id or link,
+            'link': link,
+            'title': title,
+            'published': _feed_date(published),
+        })
+    return items
+
+
+def load_feed_list(path):
+    """
+    Read the feed list file.
+
+    The file holds a JSON list of feeds, e.g.
+    [{"url": "https://example.com/feed.xml", "theme": "AI", "interval_seconds": 600}]
+    where "research_task" and "context" are also optional.
+
+    Args:
+        path (str): The file
+
+    Returns:
+        list: The feeds, or an empty list if the file doesn't exist
+
+    Raises:
+        ValueError: If a feed has no URL
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        feeds = json.load(f)
+    for feed in feeds:
+        if not isinstance(feed, dict) or not feed.get('url'):
+            raise ValueError(f"Every feed in {path} needs a url")
+    return feeds
+
+
+class FeedPoller:
+    """Polls RSS/Atom feeds on a schedule and hands each new item to a callback."""
+
+    def __init__(self, db_path, feeds_file, submit, workers=8, check_interval=30.0):
+        """
+        Args:
+            db_path (str): The SQLite database file for feed state
+            feeds_file (str): The JSON feed list (see load_feed_list())
+            submit (callable): Called with a scrape-and-generate payload for
+                each new item; returns the queued job (a dict with an 'id')
+            workers (int, optional): Feeds polled at once in each process
+            check_interval (float, optional): Seconds between looks for due feeds
+        """
+        self.db_path = db_path
+        self.feeds_file = feeds_file
+        self.submit = submit
+        self.workers = workers
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._schema_ready = False
+        self._feeds_file_mtime = None
+
+    # Database
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            for table, added in ADDED_COLUMNS.items():
+                columns = {row['name'] for row in connection.execute(f'PRAGMA table_info({table})')}
+                for column, column_type in added.items():
+                    if column not in columns:
+                        connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        self._schema_ready = True
+
+    def _execute(self, sql, parameters=()):
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(sql, parameters)
+            return cursor.fetchall(), cursor.rowcount
+
+    # Feed list
+
+    def sync_feeds(self, force=False):
+        """
+        Bring the feeds table in line with the feed list file, if it changed.
+
+        New feeds get a random first poll time within their interval, so a
+        long list doesn't all come due at once. Feeds removed from the file
+        are disabled (their seen items are kept).
+
+        Args:
+            force (bool, optional): Re-read the file even if it hasn't changed
+
+        Returns:
+            int: How many feeds are enabled, or None if the file wasn't re-read
+        """
+        try:
+            mtime = os.path.getmtime(self.feeds_file)
+        except OSError:
+            mtime = None
+        if not force and mtime == self._feeds_file_mtime:
+            return None
+
+        try:
+            feeds = load_feed_list(self.feeds_file)
+        except (OSError, ValueError) as e:
+            print(f"Error reading feed list {self.feeds_file}: {e}")
+            return None
+        self._feeds_file_mtime = mtime
+
+        now = time.time()
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('UPDATE feeds SET enabled = 0')
+                for feed in feeds:
+                    interval = float(feed.get('interval_seconds') or Config.FEED_POLL_INTERVAL)
+                    connection.execute(
+                        'INSERT INTO feeds (url, theme, research_task, context, interval_seconds, next_poll_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT (url) DO UPDATE SET theme = excluded.theme, '
+                        'research_task = excluded.research_task, context = excluded.context, '
+                        'interval_seconds = excluded.interval_seconds, enabled = 1',
+                        (feed['url'], feed.get('theme', ''), feed.get('research_task'), feed.get('context', ''),
+                         interval, now + random.uniform(0, min(interval, Config.FEED_POLL_INTERVAL)))
+                    )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return len(feeds)
+
+    # Polling
+
+    @property
+    def running(self):
+        """Whether this process's polling thread has been started."""
+        return self._pid == os.getpid()
+
+    def start(self):
+        """Start this process's polling thread, if it isn't running yet."""
+        with self._lock:
+            # Threads don't survive a fork, so each gunicorn worker starts its own
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._loop, name='feed-poller', daemon=True).start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.sync_feeds()
+                self.poll_due()
+            except Exception as e:
+                print(f"Error polling feeds: {e}")
+            time.sleep(self.check_interval)
+
+    def _claim_due(self, limit):
+        """Atomically take due feeds, pushing their next poll back so no other process takes them too."""
+        self._ensure_schema()
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = connection.execute(
+                    'SELECT * FROM feeds WHERE enabled = 1 AND next_poll_at <= ? ORDER BY next_poll_at LIMIT ?',
+                    (now, limit)
+                ).fetchall()
+                for row in rows:
+                    connection.execute(
+                        'UPDATE feeds SET next_poll_at = ? WHERE url = ?',
+                        (now + row['interval_seconds'], row['url'])
+                    )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return [dict(row) for row in rows]
+
+    def poll_due(self, limit=None):
+        """
+        Poll every feed that is due, a bounded number at a time.
+
+        Args:
+            limit (int, optional): Most feeds to take. Defaults to Config.FEED_BATCH_SIZE.
+
+        Returns:
+            list: One result per feed polled, as returned by poll_feed()
+        """
+        results = []
+        while True:
+            feeds = self._claim_due(limit or Config.FEED_BATCH_SIZE)
+            if not feeds:
+                return results
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(feeds)), thread_name_prefix='feed') as executor:
+                results.extend(executor.map(self.poll_feed, feeds))
+            if limit:
+                return results
+
+    def poll_feed(self, feed):
+        """
+        Fetch one feed and queue its new items.
+
+        Args:
+            feed (dict): The feed's row from the feeds table
+
+        Returns:
+            dict: url, status ('ok', 'not_modified' or 'error'), new_items,
+                queued and (for errors) error
+        """
+        url = feed['url']
+        headers = {}
+        if feed['etag']:
+            headers['If-None-Match'] = feed['etag']
+        if feed['last_modified']:
+            headers['If-Modified-Since'] = feed['last_modified']
+
+        response = None
+        try:
+            response = host_scheduler.fetch(url, lambda: http_client.get(
+                url, headers=headers, max_bytes=Config.FEED_MAX_BYTES))
+            if response.status_code == 304:
+                self._execute(
+                    'UPDATE feeds SET last_polled_at = ?, last_status = 304, last_error = NULL, failures = 0, '
+                    'polls = polls + 1, not_modified = not_modified + 1 WHERE url = ?',
+                    (time.time(), url)
+                )
+                return {'url': url, 'status': 'not_modified', 'new_items': 0, 'queued': 0}
+            response.raise_for_status()
+            items = parse_feed(response.content, url)
+        except Exception as e:
+            return self._record_failure(feed, e, response.headers if response is not None else {})
+
+        new_items, queued, unqueued = self._queue_new_items(feed, items)
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if unqueued:
+            # Keep the old validators, or the next poll gets a 304 and the
+            # items that failed to queue wait until the feed changes again
+            etag, last_modified = feed['etag'], feed['last_modified']
+        self._execute(
+            'UPDATE feeds SET etag = ?, last_modified = ?, last_polled_at = ?, last_status = ?, last_error = NULL, '
+            'failures = 0, polls = polls + 1, items_queued = items_queued + ? WHERE url = ?',
+            (etag, last_modified, time.time(), response.status_code, queued, url)
+        )
+        return {'url': url, 'status': 'ok', 'new_items': new_items, 'queued': queued}
+
+    def _record_failure(self, feed, error, headers):
+        # Back off exponentially, or as long as the site asked
+        failures = feed['failures'] + 1
+        delay = min(feed['interval_seconds'] * 2 ** failures, Config.FEED_MAX_BACKOFF_SECONDS)
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after:
+            delay = max(delay, retry_after)
+        print(f"Error polling feed {feed['url']}: {error}")
+        self._execute(
+            'UPDATE feeds SET next_poll_at = ?, last_polled_at = ?, last_status = NULL, last_error = ?, '
+            'failures = ?, polls = polls + 1 WHERE url = ?',
+            (time.time() + delay, time.time(), str(error), failures, feed['url'])
+        )
+        return {'url': feed['url'], 'status': 'error', 'error': str(error), 'new_items': 0, 'queued': 0}
+
+    def _queue_new_items(self, feed, items):
+        """
+        Remember the feed's unseen items and queue the newest of them.
+
+        At most Config.FEED_MAX_ITEMS_PER_POLL items are queued per poll (or
+        Config.FEED_BACKFILL_ITEMS the first time); older new items beyond
+        that are remembered without being queued.
+
+        Returns:
+            tuple: (how many items were new, how many were queued, how many
+                failed to queue and will be tried again on the next poll)
+        """
+        url = feed['url']
+        now = time.time()
+        known, _ = self._execute('SELECT 1 FROM feed_items WHERE feed_url = ? LIMIT 1', (url,))
+        ids = list(dict.fromkeys(item['id'] for item in items))
+        seen = set()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            # Items the feed still lists are kept however old they are (see below)
+            self._execute(
+                f"UPDATE feed_items SET last_listed_at = ? WHERE feed_url = ? AND item_id IN ({placeholders})",
+                (now, url, *batch)
+            )
+            rows, _ = self._execute(
+                f"SELECT item_id FROM feed_items WHERE feed_url = ? AND item_id IN ({placeholders})",
+                (url, *batch)
+            )
+            seen.update(row['item_id'] for row in rows)
+
+        new = []
+        for item in items:
+            if item['id'] not in seen:
+                seen.add(item['id'])
+                new.append(item)
+
+        # Feeds list the newest items first. A feed we've never read is mostly
+        # old news, so only its newest few are worth a memo.
+        limit = Config.FEED_MAX_ITEMS_PER_POLL if known else Config.FEED_BACKFILL_ITEMS
+        wanted = {item['id'] for item in new[:limit]}
+        if len(new) > limit and known:
+            print(f"Feed {url} has {len(new)} new items; queueing the newest {limit}")
+
+        queued = unqueued = 0
+        # Oldest first, so jobs (and trends) come out in publication order
+        for item in reversed(new):
+            # Claim the item before queueing it: an item is never queued twice,
+            # even if two processes somehow poll the same feed together
+            _, claimed = self._execute(
+                'INSERT OR IGNORE INTO feed_items (feed_url, item_id, link, title, seen_at, last_listed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, item['id'], item['link'], item['title'], now, now)
+            )
+            if not claimed or item['id'] not in wanted:
+                continue
+            try:
+                job = self.submit(self.job_payload(feed, item))
+            except Exception as e:
+                print(f"Error queueing {item['link']} from feed {url}: {e}")
+                # Let go of the claim, so the item counts as new again on the next poll
+                self._execute('DELETE FROM feed_items WHERE feed_url = ? AND item_id = ? AND job_id IS NULL',
+                              (url, item['id']))
+                unqueued += 1
+                continue
+            self._execute('UPDATE feed_items SET job_id = ? WHERE feed_url = ? AND item_id = ?',
+                          (job['id'], url, item['id']))
+            queued += 1
+
+        # Forget items the feed hasn't listed for a long time, so the table
+        # stays the size of the feeds rather than growing forever
+        self._execute(
+            'DELETE FROM feed_items WHERE feed_url = ? AND COALESCE(last_listed_at, seen_at) < ?',
+            (url, now - Config.FEED_ITEM_RETENTION_SECONDS)
+        )
+        return len(new), queued, unqueued
+
+    @staticmethod
+    def job_payload(feed, item):
+        """
+        Build the scrape-and-generate job for a feed item.
+
+        Args:
+            feed (dict): The feed's row
+            item (dict): The item, from parse_feed()
+
+        Returns:
+            dict: The payload, with a 'feed' entry saying where it came from
+        """
+        return {
+            'urls': [item['link']],
+            'research_task': feed['research_task'] or item['title'] or item['link'],
+            'context': feed['context'] or '',
+            'theme': feed['theme'] or '',
+            'source_type': 'auto',
+            'use_cache': True,
+            'feed': {'url': feed['url'], 'item_id': item['id'], 'title': item['title'], 'published': item['published']},
+        }
+
+    def stats(self):
+        """
+        Report each feed's polling state and totals across every process.
+
+        Returns:
+            dict: Feed counts, items remembered and queued, and one entry per feed
+        """
+        rows, _ = self._execute('SELECT * FROM feeds ORDER BY url')
+        items, _ = self._execute('SELECT COUNT(*) AS seen, COUNT(job_id) AS queued FROM feed_items')
+        now = time.time()
+        feeds = [
+            {
+                'url': row['url'],
+                'theme': row['theme'],
+                'enabled': bool(row['enabled']),
+                'interval_seconds': row['interval_seconds'],
+                'next_poll_in_seconds': round(row['next_poll_at'] - now, 1),
+                'last_polled_at': row['last_polled_at'],
+                'last_status': row['last_status'],
+                'last_error': row['last_error'],
+                'failures': row['failures'],
+                'polls': row['polls'],
+                'not_modified': row['not_modified'],
+                'items_queued': row['items_queued'],
+            }
+            for row in rows
+        ]
+        return {
+            'feeds': len(feeds),
+            'enabled': sum(feed['enabled'] for feed in feeds),
+            'failing': sum(1 for feed in feeds if feed['failures']),
+            'items_seen': items[0]['seen'],
+            'items_queued': items[0]['queued'],
+            'workers_per_process': self.workers,
+            'details': feeds,
+        }
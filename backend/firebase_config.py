@@ -1,7 +1,5 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,6 +15,11 @@ def initialize_firebase():
         firestore.Client: Firestore database client or None if initialization fails
     """
     try:
+        # Imported here rather than at the top: the Firebase SDK is slow to
+        # import, and the app only needs it once the database is first used
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        
         # Check if already initialized
         if not firebase_admin._apps:
             # Try to get credentials from environment variable
@@ -0,0 +1,56 @@
+"""
+Firestore Persistence Module
+
+This module writes trends to the tech_trends collection in Firestore. Every
+trend is stored under a stable document ID, so a save is a single upsert
+(one RPC) instead of delete-and-re-add, and saving the same trend twice
+updates one document instead of creating two.
+"""
+
+import hashlib
+import json
+
+# Fields that identify a trend; two trends with the same values are the same trend
+IDENTITY_FIELDS = ('research_task', 'news_links', 'context', 'date_discovered', 'theme')
+
+
+def trend_document_id(trend):
+    """
+    Get the document ID for a trend.
+
+    Uses the trend's own 'id' when it has one. Otherwise the ID is derived from
+    the identifying fields, so saving the same trend twice (a retried request,
+    a double-click) updates one document instead of creating two.
+
+    Args:
+        trend (dict): The trend data
+
+    Returns:
+        str: The document ID
+    """
+    if trend.get('id'):
+        return str(trend['id'])
+    identity = json.dumps([trend.get(field, '') for field in IDENTITY_FIELDS], sort_keys=True, default=str)
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:20]
+
+
+def _document_data(trend):
+    """The trend without its 'id', which lives in the document name instead."""
+    return {key: value for key, value in trend.items() if key != 'id'}
+
+
+def upsert_trend(db, collection, trend):
+    """
+    Create or replace a single trend document (one RPC).
+
+    Args:
+        db (firestore.Client): The Firestore client
+        collection (str): The collection name
+        trend (dict): The trend data
+
+    Returns:
+        str: The document ID
+    """
+    doc_id = trend_document_id(trend)
+    db.collection(collection).document(doc_id).set(_document_data(trend))
+    return doc_id
@@ -0,0 +1,40 @@
+"""
+gunicorn settings for the backend
+
+gunicorn reads this file by itself when it's started from the backend folder:
+    gunicorn --worker-class gthread --threads 8 app:app
+
+Importing app.py doesn't connect to anything, so --preload only shares the
+imported code with the workers. With --preload the master also imports the
+slowest libraries once (app.PRELOAD_MODULES) before it forks any workers,
+which makes each worker start faster. Each worker
+then warms itself up (connects to Firestore, sets up Claude, loads the trends
+and starts its background threads) after it has been forked and before it
+takes requests. Set WARM_UP_ON_START=false to leave all of that to the first
+requests.
+"""
+
+
+def when_ready(server):
+    """With --preload, import the slow libraries in the master, so new workers inherit them."""
+    from config import Config
+    if not server.cfg.preload_app or not Config.WARM_UP_ON_START:
+        return
+
+    from app import preload_modules
+    preload_modules()
+
+
+def post_worker_init(worker):
+    """Warm up each new worker before it starts accepting requests."""
+    from config import Config
+    if not Config.WARM_UP_ON_START:
+        return
+
+    from app import warm_up
+    report = warm_up()
+    waiting = [name for name, subsystem in report['subsystems'].items() if not subsystem['ready']]
+    if waiting:
+        print(f"Worker {worker.pid} warmed up, but these aren't ready: {', '.join(waiting)}")
+    else:
+        print(f"Worker {worker.pid} warmed up")
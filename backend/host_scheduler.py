@@ -0,0 +1,412 @@
+"""
+Host Scheduler Module
+
+Paces every outbound scrape per host, so a burst of work aimed at one
+publisher doesn't get us rate-limited or banned:
+1. At most Config.SCRAPE_PER_HOST_LIMIT requests to a host are in flight at once
+2. Requests to a host are spaced out to match its current rate. The rate creeps up
+   while the host answers normally and is cut when it answers 429 or 5xx or
+   can't be reached (additive increase, multiplicative decrease), within the
+   Crawl-delay its robots.txt asks for
+3. A Retry-After header pauses the host for every thread until the time it names
+4. robots.txt is read once per host (and cached), and pages it disallows are
+   refused without being requested. Its Crawl-delay caps the host's rate even
+   after the host's schedule has been dropped for being idle. While the host
+   answers robots.txt with a server error, or can't be reached, everything
+   on it counts as disallowed (RFC 9309)
+5. How long requests waited for their turn is recorded per host, and
+   throttled or failed requests are counted in the shared metrics
+
+The schedule is shared by all threads in a process; each gunicorn worker
+paces itself.
+"""
+
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+import http_client
+from config import Config
+from common import percentile
+import metrics
+
+# Answers that mean "slow down"
+THROTTLE_STATUSES = (429, 503)
+
+# Queue waits kept per host for the percentiles
+WAIT_SAMPLES = 500
+
+# robots.txt files bigger than this are ignored (Google reads the first 500 KiB)
+ROBOTS_MAX_BYTES = 512 * 1024
+
+# How long to go by a stand-in for a robots.txt that couldn't be read (allow
+# everything, or nothing if the host was failing) before asking for it again
+ROBOTS_RETRY_SECONDS = 300
+
+# What a host whose robots.txt fails with a server error is taken to say
+DISALLOW_ALL = ['User-agent: *', 'Disallow: /']
+
+
+class HostBusyError(Exception):
+    """Raised when a request would have to wait too long for its host."""
+
+
+class RobotsDisallowedError(Exception):
+    """Raised when a host's robots.txt doesn't allow us to fetch a page."""
+
+
+def host_of(url):
+    """The host (and port, if any) of a URL, lowercased."""
+    return urlparse(url).netloc.lower()
+
+
+def parse_retry_after(value, now=None):
+    """
+    Read a Retry-After header.
+
+    Args:
+        value (str): The header, either a number of seconds or an HTTP date
+        now (datetime, optional): The current time, for HTTP dates
+
+    Returns:
+        float: Seconds to wait (never negative), or None if the header is missing or unreadable
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max((when - now).total_seconds(), 0.0)
+
+
+class _HostState:
+    """The schedule and counters for one host. Guarded by its condition."""
+
+    def __init__(self, rate, max_rate):
+        self.condition = threading.Condition()
+        self.rate = rate
+        self.max_rate = max_rate
+        self.in_flight = 0
+        self.waiting = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.last_used = time.monotonic()
+        self.waits_ms = deque(maxlen=WAIT_SAMPLES)
+        self.counts = {'requests': 0, 'throttled': 0, 'errors': 0, 'gave_up': 0, 'robots_disallowed': 0}
+
+
+class Slot:
+    """A request's turn at a host. Call record() with the response so the host's rate can adapt."""
+
+    def __init__(self, url, waited_ms):
+        self.url = url
+        self.waited_ms = waited_ms
+        self.status_code = None
+        self.retry_after = None
+        self.failed = False
+
+    def record(self, response):
+        """
+        Note how the host answered.
+
+        Args:
+            response (requests.Response): The response (its headers are enough)
+        """
+        self.status_code = response.status_code
+        if response.status_code in THROTTLE_STATUSES:
+            self.retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+
+class HostScheduler:
+    """Per-host concurrency and rate limits, Retry-After and robots.txt for outbound scraping."""
+
+    def __init__(self, robots_cache=None):
+        """
+        Args:
+            robots_cache (TieredCache, optional): Where to keep robots.txt files,
+                so every worker on the machine shares one copy per host
+        """
+        self.robots_cache = robots_cache
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        # Parsed robots.txt per host: (parser, expires at)
+        self._robots = {}
+        # Fastest rate each host's robots.txt Crawl-delay allows. Kept apart from
+        # the host schedules, which are dropped when a host goes idle
+        self._robots_max_rates = {}
+        self._robots_lock = threading.Lock()
+
+    def _state(self, host):
+        with self._hosts_lock:
+            state = self._hosts.get(host)
+            if state is None:
+                if len(self._hosts) >= Config.HOST_MAX_TRACKED:
+                    self._forget_idle_hosts()
+                with self._robots_lock:
+                    max_rate = self._robots_max_rates.get(host, Config.HOST_MAX_RATE_PER_SECOND)
+                state = self._hosts[host] = _HostState(min(Config.HOST_RATE_PER_SECOND, max_rate), max_rate)
+            return state
+
+    def _forget_idle_hosts(self):
+        # Drop the least recently used half of the hosts nobody is using right now
+        now = time.monotonic()
+        idle = [
+            (state.last_used, host) for host, state in self._hosts.items()
+            if not state.in_flight and not state.waiting and state.paused_until <= now
+        ]
+        for _, host in sorted(idle)[:max(len(idle) // 2, 1)]:
+            del self._hosts[host]
+
+    def _acquire(self, state, host, max_wait):
+        started = time.monotonic()
+        give_up_at = started + max_wait
+        with state.condition:
+            state.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    start_at = max(now, state.next_start, state.paused_until)
+                    if state.in_flight < Config.SCRAPE_PER_HOST_LIMIT and start_at <= now:
+                        break
+                    if start_at > give_up_at or now >= give_up_at:
+                        state.counts['gave_up'] += 1
+                        if state.paused_until > now:
+                            raise HostBusyError(
+                                f"{host} asked us to wait {state.paused_until - now:.0f}s before sending more requests")
+                        raise HostBusyError(f"Waited over {max_wait:g}s for a turn at {host}")
+                    if state.in_flight < Config.SCRAPE_PER_HOST_LIMIT:
+                        state.condition.wait(start_at - now)
+                    else:
+                        state.condition.wait(give_up_at - now)
+            finally:
+                state.waiting -= 1
+
+            state.in_flight += 1
+            state.next_start = now + 1 / state.rate
+            state.last_used = now
+            state.counts['requests'] += 1
+            waited_ms = (now - started) * 1000
+            state.waits_ms.append(waited_ms)
+            return waited_ms
+
+    def _release(self, state, slot):
+        with state.condition:
+            state.in_flight -= 1
+            now = time.monotonic()
+            throttled = slot.status_code in THROTTLE_STATUSES
+            if throttled or slot.failed or (slot.status_code or 0) >= 500:
+                state.counts['throttled' if throttled else 'errors'] += 1
+                metrics.inc(
+                    metrics.UPSTREAM_ERRORS,
+                    upstream='youtube' if host_of(slot.url).endswith('youtube.com') else 'site',
+                    reason='connection' if slot.failed else str(slot.status_code),
+                )
+                state.rate = max(state.rate * Config.HOST_RATE_BACKOFF, Config.HOST_MIN_RATE_PER_SECOND)
+                # Space out whatever is queued at the new rate
+                state.next_start = max(state.next_start, now + 1 / state.rate)
+            else:
+                state.rate = min(state.rate + Config.HOST_RATE_INCREASE, state.max_rate)
+            if slot.retry_after:
+                state.paused_until = max(state.paused_until, now + slot.retry_after)
+            state.condition.notify_all()
+
+    @contextmanager
+    def slot(self, url, check_robots=True, max_wait=None, on_start=None):
+        """
+        Wait for a turn to send a request to a URL's host.
+
+        Args:
+            url (str): The URL about to be requested
+            check_robots (bool, optional): Refuse URLs the host's robots.txt disallows
+            max_wait (float, optional): Longest to wait for a turn. Defaults to
+                Config.HOST_MAX_QUEUE_WAIT.
+            on_start (callable, optional): Called once the turn comes, before
+                the request is sent
+
+        Yields:
+            Slot: Pass the response to its record() method
+
+        Raises:
+            RobotsDisallowedError: If robots.txt disallows the URL
+            HostBusyError: If no turn came within max_wait
+        """
+        max_wait = Config.HOST_MAX_QUEUE_WAIT if max_wait is None else max_wait
+        if check_robots:
+            self.check_robots(url)
+
+        host = host_of(url)
+        state = self._state(host)
+        slot = Slot(url, self._acquire(state, host, max_wait))
+        try:
+            if on_start:
+                on_start()
+            yield slot
+        except requests.RequestException:
+            # Timeouts, refused connections and the like
+            slot.failed = True
+            raise
+        finally:
+            self._release(state, slot)
+
+    def fetch(self, url, send, check_robots=True, max_wait=None):
+        """
+        Send a request in turn, trying again after a 429 or 503 once the host's Retry-After has passed.
+
+        Args:
+            url (str): The URL being requested
+            send (callable): Sends the request and returns the requests.Response
+            check_robots (bool, optional): Refuse URLs the host's robots.txt disallows
+            max_wait (float, optional): Longest to wait for each turn. Defaults
+                to Config.HOST_MAX_QUEUE_WAIT.
+
+        Returns:
+            requests.Response: The last response; still a 429 or 503 if the host
+                kept refusing or asked for a longer wait than max_wait
+
+        Raises:
+            RobotsDisallowedError: If robots.txt disallows the URL
+            HostBusyError: If no turn came within max_wait
+        """
+        max_wait = Config.HOST_MAX_QUEUE_WAIT if max_wait is None else max_wait
+        for attempt in range(Config.HTTP_RETRIES + 1):
+            with self.slot(url, check_robots and attempt == 0, max_wait) as slot:
+                response = send()
+                slot.record(response)
+            if response.status_code not in THROTTLE_STATUSES or (slot.retry_after or 0) > max_wait:
+                break
+            if attempt < Config.HTTP_RETRIES:
+                metrics.inc(metrics.RETRIES, layer='host_scheduler', reason=str(response.status_code))
+        return response
+
+    def _robots_parser(self, scheme, host):
+        """Get the parsed robots.txt for a host, fetching it if we haven't lately."""
+        now = time.monotonic()
+        with self._robots_lock:
+            cached = self._robots.get(host)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        robots_url = f"{scheme}://{host}/robots.txt"
+
+        def fetch(stale_entry):
+            with self.slot(robots_url, check_robots=False) as slot:
+                response = http_client.get(
+                    robots_url,
+                    timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_CONNECT_TIMEOUT * 2),
+                    max_bytes=ROBOTS_MAX_BYTES,
+                )
+                slot.record(response)
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                # No robots.txt (or no access to it) means no restrictions (RFC 9309)
+                return {'value': ''}
+            if response.status_code >= 500 or response.status_code == 429:
+                # Raised so the failure isn't cached; handled below
+                raise requests.HTTPError(f"{response.status_code} for {robots_url}", response=response)
+            if response.status_code >= 300:
+                return {'value': None, 'cache': False}
+            return {'value': response.content.decode('utf-8', 'replace')}
+
+        lines = None
+        try:
+            if self.robots_cache is not None:
+                text = self.robots_cache.get_or_fetch(f"robots:{robots_url}", fetch, ttl=Config.ROBOTS_TXT_TTL_SECONDS)
+            else:
+                text = fetch(None)['value']
+        except requests.RequestException as e:
+            # A server error or an unreachable host: assume everything is
+            # disallowed until it answers again (RFC 9309, section 2.3.1.4)
+            print(f"Could not read {robots_url}, treating {host} as disallowed for now: {e}")
+            text, lines = None, DISALLOW_ALL
+        except (HostBusyError, http_client.ResponseTooLargeError) as e:
+            print(f"Could not read {robots_url}: {e}")
+            text = None
+
+        parser = RobotFileParser(robots_url)
+        parser.parse(lines or (text or '').splitlines())
+        ttl = Config.ROBOTS_TXT_TTL_SECONDS if text is not None else ROBOTS_RETRY_SECONDS
+        with self._robots_lock:
+            self._robots[host] = (parser, now + ttl)
+
+        # Never go faster than the Crawl-delay the site asks for (a robots.txt
+        # that couldn't be read leaves the last known limit in place)
+        if text is not None:
+            delay = parser.crawl_delay(Config.ROBOTS_USER_AGENT)
+            max_rate = Config.HOST_MAX_RATE_PER_SECOND
+            with self._robots_lock:
+                if delay:
+                    max_rate = min(max_rate, 1 / float(delay))
+                    self._robots_max_rates[host] = max_rate
+                else:
+                    self._robots_max_rates.pop(host, None)
+            state = self._state(host)
+            with state.condition:
+                state.max_rate = max_rate
+                state.rate = min(state.rate, max_rate)
+        return parser
+
+    def check_robots(self, url):
+        """
+        Make sure a host's robots.txt lets us fetch a URL (does nothing if Config.ROBOTS_TXT_ENABLED is off).
+
+        Args:
+            url (str): The URL
+
+        Raises:
+            RobotsDisallowedError: If it doesn't
+        """
+        if not Config.ROBOTS_TXT_ENABLED:
+            return
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+            return
+        host = parsed.netloc.lower()
+        if not self._robots_parser(parsed.scheme, host).can_fetch(Config.ROBOTS_USER_AGENT, url):
+            state = self._state(host)
+            with state.condition:
+                state.counts['robots_disallowed'] += 1
+            raise RobotsDisallowedError(f"{host}/robots.txt doesn't allow fetching {url}")
+
+    def stats(self):
+        """
+        Report each host's schedule and how long requests waited for it (this process only).
+
+        Returns:
+            dict: Per host: requests, throttled, errors, gave_up and
+                robots_disallowed counts, in_flight, waiting, the current rate
+                (requests per second), seconds left of any Retry-After pause,
+                and p50/p95/max queue wait in milliseconds
+        """
+        with self._hosts_lock:
+            hosts = list(self._hosts.items())
+
+        now = time.monotonic()
+        report = {}
+        for host, state in hosts:
+            with state.condition:
+                waits = sorted(state.waits_ms)
+                entry = dict(state.counts)
+                entry.update({
+                    'in_flight': state.in_flight,
+                    'waiting': state.waiting,
+                    'rate_per_second': round(state.rate, 2),
+                    'paused_seconds': round(max(state.paused_until - now, 0), 1),
+                })
+            entry['queue_wait_ms'] = {
+                'p50': round(percentile(waits, 0.5), 1) if waits else None,
+                'p95': round(percentile(waits, 0.95), 1) if waits else None,
+                'max': round(waits[-1], 1) if waits else None,
+            }
+            report[host] = entry
+        return report
@@ -0,0 +1,308 @@
+"""
+HTML Extraction Module
+
+Pulls the title and main text out of a web page with lxml, in the same
+"Title: ... / Content: ..." format the scraper has always produced.
+
+1. The page is parsed once with lxml's C parser
+2. A single walk over the tree finds the title and the main container: the
+   first <article>, else the first <main>, else the first <div> whose id,
+   then class, mentions content/article/main. Scripts, styles, navigation,
+   headers and footers are skipped.
+3. Only the chosen container's text is collected; the elements we skip are
+   emptied (keeping the text that follows them) rather than searched again
+
+The same parsed tree also gives the page's description and canonical URL,
+so one download can serve everything we want to know about a page.
+
+Downloaded pages are handed to lxml as raw bytes together with their
+encoding (from a byte order mark, the HTTP header or a <meta charset>), so
+a page is never decoded into one big Python string first.
+"""
+
+import re
+import codecs
+import threading
+from urllib.parse import urljoin
+import lxml.html
+
+# Elements whose text never belongs in the extracted content
+SKIPPED_TAGS = ('script', 'style', 'nav', 'footer', 'header')
+
+# Attribute values that mark a <div> as the page's main content
+CONTAINER_PATTERN = re.compile('content|article|main', re.I)
+
+# Line breaks (as str.splitlines() sees them) and double spaces split phrases
+PHRASE_SEPARATOR = re.compile(r'\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]|  ')
+
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+# How far into a page to look for a <meta charset> (the HTML spec says 1024
+# bytes; a little more allows for long comments and scripts before it)
+CHARSET_SNIFF_BYTES = 4096
+
+# Byte order marks, checked longest first
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+
+def _parser_for(encoding):
+    """Get the shared lxml parser for an encoding (LookupError if libxml2 doesn't know it)."""
+    with _parsers_lock:
+        parser = _parsers.get(encoding)
+        if parser is None:
+            # libxml2 spells encodings with dashes where Python uses underscores
+            parser = _parsers[encoding] = lxml.html.HTMLParser(encoding=encoding.replace('_', '-'))
+        return parser
+
+
+def normalize_encoding(label):
+    """
+    Turn an encoding label from a header or meta tag into a Python codec name.
+
+    Args:
+        label (str or bytes): The label, e.g. 'UTF-8' or 'iso-8859-1'
+
+    Returns:
+        str: The codec name, or None if the label isn't a known encoding
+    """
+    if isinstance(label, bytes):
+        label = label.decode('ascii', 'ignore')
+    try:
+        name = codecs.lookup(label.strip().strip('"\'')).name
+    except LookupError:
+        return None
+    # Browsers read pages labelled Latin-1 or ASCII as Windows-1252, a superset
+    if name in ('iso8859-1', 'latin-1', 'ascii'):
+        return 'cp1252'
+    return name
+
+
+def _is_utf8(body, chunk_size=64 * 1024):
+    # Decode a piece at a time and throw the text away, so checking a big
+    # page doesn't build a copy of it
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for start in range(0, len(body), chunk_size):
+            decoder.decode(body[start:start + chunk_size])
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_encoding(body, declared=None):
+    """
+    Work out which encoding a downloaded page uses.
+
+    In order: a byte order mark, the charset the server declared, a
+    <meta charset> near the top of the page, then UTF-8 if the bytes are
+    valid UTF-8, else Windows-1252 (which can decode any byte).
+
+    Args:
+        body (bytes): The page as downloaded
+        declared (str, optional): The charset from the Content-Type header
+
+    Returns:
+        str: A Python codec name
+    """
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if body.startswith(mark):
+            return encoding
+
+    if declared and normalize_encoding(declared):
+        return normalize_encoding(declared)
+
+    match = META_CHARSET_PATTERN.search(body, 0, CHARSET_SNIFF_BYTES)
+    if match and normalize_encoding(match.group(1)):
+        encoding = normalize_encoding(match.group(1))
+        # A page can't really be UTF-16 if its <meta> was readable as ASCII
+        return 'utf-8' if encoding.startswith('utf-16') else encoding
+
+    return 'utf-8' if _is_utf8(body) else 'cp1252'
+
+
+def parse_html(html, declared_encoding=None):
+    """
+    Parse a page into an lxml tree.
+
+    Args:
+        html (str or bytes): The page HTML. Bytes are decoded by lxml, using
+            the encoding from detect_encoding().
+        declared_encoding (str, optional): The charset the server declared, for bytes
+
+    Returns:
+        lxml.html.HtmlElement: The root <html> element
+    """
+    if isinstance(html, str):
+        # lxml refuses str input that carries an XML encoding declaration
+        html = html.encode('utf-8', 'replace')
+        encoding = 'utf-8'
+    else:
+        encoding = detect_encoding(html, declared_encoding)
+
+    try:
+        parser = _parser_for(encoding)
+    except LookupError:
+        # An encoding Python knows but libxml2 doesn't: decode it ourselves
+        html = html.decode(encoding, 'replace').encode('utf-8')
+        parser = _parser_for('utf-8')
+    return lxml.html.document_fromstring(html, parser=parser)
+
+
+def _outside_skipped(element):
+    return next(element.iterancestors(*SKIPPED_TAGS), None) is None
+
+
+def find_title_and_container(root):
+    """
+    Find the page title and main content container in one pass.
+
+    Args:
+        root (lxml.html.HtmlElement): The parsed page
+
+    Returns:
+        tuple: (title element or None, main container element or None)
+    """
+    title = None
+    article = main = id_div = class_div = None
+
+    for element in root.iter('title', 'article', 'main', 'div'):
+        tag = element.tag
+        if tag == 'div':
+            if id_div is None and CONTAINER_PATTERN.search(element.get('id', '')) and _outside_skipped(element):
+                id_div = element
+            elif class_div is None and CONTAINER_PATTERN.search(element.get('class', '')) and _outside_skipped(element):
+                class_div = element
+        elif tag == 'article':
+            if article is None and _outside_skipped(element):
+                article = element
+        elif tag == 'main':
+            if main is None and _outside_skipped(element):
+                main = element
+        elif title is None and _outside_skipped(element):
+            title = element
+
+        # Nothing found later can beat the first article
+        if article is not None and title is not None:
+            break
+
+    # The first <title> may come after the article (e.g. inside an <svg>)
+    if title is None and article is not None:
+        title = next((element for element in root.iter('title') if _outside_skipped(element)), None)
+
+    for candidate in (article, main, id_div, class_div):
+        if candidate is not None:
+            return title, candidate
+    return title, None
+
+
+def container_text(container):
+    """
+    Get a container's text, one phrase per line.
+
+    Args:
+        container (lxml.html.HtmlElement): The element to read
+
+    Returns:
+        str: The text, with blank lines and extra spacing removed
+    """
+    # Empty skipped elements in place, keeping their tails as separate text
+    for element in list(container.iter(*SKIPPED_TAGS)):
+        element.clear(keep_tail=True)
+
+    text = '\n'.join(container.itertext())
+    phrases = (phrase.strip() for phrase in PHRASE_SEPARATOR.split(text))
+    return '\n'.join(phrase for phrase in phrases if phrase)
+
+
+def title_of(root):
+    """
+    Get just a page's <title> text.
+
+    Args:
+        root (lxml.html.HtmlElement): The parsed page
+
+    Returns:
+        str: The title, or None if the page has none
+    """
+    title = root.find('.//title')
+    return title.text_content() if title is not None else None
+
+
+def read_page(root):
+    """
+    Get the title and main text of a parsed page.
+
+    Skipped elements inside the main container are emptied, so read anything
+    else you need from the tree first.
+
+    Args:
+        root (lxml.html.HtmlElement): The parsed page
+
+    Returns:
+        tuple: (title, main text); the title is "No title found" if there isn't one
+    """
+    title, container = find_title_and_container(root)
+
+    title_text = title.text_content() if title is not None else "No title found"
+    if container is None:
+        # Fall back to the whole body
+        container = root.body if root.find('body') is not None else root
+
+    return title_text, container_text(container)
+
+
+def format_content(title, text):
+    """Lay out a page's title and text the way memos and the scrape endpoints expect."""
+    return f"Title: {title}\n\nContent:\n{text}"
+
+
+def page_metadata(root, base_url=None):
+    """
+    Get a page's description and canonical URL.
+
+    Args:
+        root (lxml.html.HtmlElement): The parsed page
+        base_url (str, optional): The page's URL, for resolving relative links
+
+    Returns:
+        dict: 'description' and 'canonical_url' (each None if the page doesn't say)
+    """
+    metas = {}
+    canonical = None
+    for element in root.iter('meta', 'link'):
+        if element.tag == 'link':
+            if canonical is None and 'canonical' in (element.get('rel') or '').lower().split():
+                canonical = element.get('href')
+            continue
+        key = element.get('name') or element.get('property')
+        if key and element.get('content'):
+            metas.setdefault(key.lower(), element.get('content').strip())
+
+    canonical = canonical or metas.get('og:url')
+    if canonical and base_url:
+        canonical = urljoin(base_url, canonical.strip())
+
+    description = metas.get('description') or metas.get('og:description') or metas.get('twitter:description')
+    return {'description': description, 'canonical_url': canonical}
+
+
+def extract_main_text(html):
+    """
+    Pull the title and main text out of a webpage's HTML.
+
+    Args:
+        html (str or bytes): The page HTML
+
+    Returns:
+        str: The extracted content, as a "Title:" line followed by a "Content:" section
+    """
+    return format_content(*read_page(parse_html(html)))
@@ -0,0 +1,239 @@
+"""
+Shared HTTP Client Module
+
+Every outbound HTTP call in the backend goes through this module so that:
+1. Connections are pooled per host and kept alive between requests
+2. Every request has a connect and a read timeout
+3. Idempotent requests are retried with exponential backoff after a 5xx.
+   429 and 503 answers are handed back to the caller, so the scraper's host
+   scheduler can pause the host for every thread (see host_scheduler.py)
+4. Response bodies are capped so one huge page can't exhaust a worker
+5. Callers can name the content types they accept, so a PDF or video
+   behind a link is turned away before its body is read
+6. Every retry is counted in the shared metrics (see metrics.py)
+
+Clients are created lazily and recreated after a fork, so gunicorn workers
+never share sockets with the master process.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+import metrics
+
+# Browser-like headers, since some sites refuse requests without a User-Agent
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+_httpx_client = None
+_httpx_client_pid = None
+
+
+class ResponseTooLargeError(Exception):
+    """Raised when a response body is bigger than the allowed maximum."""
+
+
+class UnsupportedContentTypeError(Exception):
+    """Raised when a response's Content-Type isn't one the caller accepts."""
+
+
+class CountedRetry(Retry):
+    """urllib3's Retry, counting each retry it allows in metrics.RETRIES."""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        reason = str(response.status) if response is not None and response.status else type(error).__name__
+        metrics.inc(metrics.RETRIES, layer='http', reason=reason)
+        return retry
+
+
+def get_session():
+    """
+    Get the pooled requests session for this process.
+
+    Returns:
+        requests.Session: A session with retrying, keep-alive connection pools
+    """
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            retry = CountedRetry(
+                total=Config.HTTP_RETRIES,
+                backoff_factor=Config.HTTP_RETRY_BACKOFF,
+                status_forcelist=(500, 502, 504),
+                allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+                # Otherwise urllib3 sleeps through any Retry-After itself
+                respect_retry_after_header=False,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=Config.HTTP_POOL_HOSTS,
+                pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_httpx_client():
+    """
+    Get the pooled httpx client used by the Anthropic SDK in this process.
+
+    Returns:
+        httpx.Client: A keep-alive client with the configured timeouts
+    """
+    global _httpx_client, _httpx_client_pid
+    with _lock:
+        if _httpx_client is None or _httpx_client_pid != os.getpid():
+            _httpx_client = httpx.Client(
+                timeout=httpx.Timeout(Config.CLAUDE_READ_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=Config.HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=Config.HTTP_POOL_MAXSIZE,
+                ),
+            )
+            _httpx_client_pid = os.getpid()
+        return _httpx_client
+
+
+def content_type(response):
+    """The media type of a response, lowercased and without parameters ('' if missing)."""
+    return response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+
+def declared_encoding(response):
+    """
+    Get the charset a response's Content-Type header declares.
+
+    Unlike response.encoding, this doesn't assume ISO-8859-1 for text/*
+    responses that don't say.
+
+    Returns:
+        str: The charset label, or None if the header has none
+    """
+    for parameter in response.headers.get('Content-Type', '').split(';')[1:]:
+        name, _, value = parameter.partition('=')
+        if name.strip().lower() == 'charset' and value.strip():
+            return value.strip().strip('"\'')
+    return None
+
+
+def check_content_type(response, allowed_types):
+    """
+    Make sure a successful response is one of the accepted media types.
+
+    Responses without a Content-Type are let through for the caller to sniff.
+
+    Args:
+        response (requests.Response): The response, body not yet read
+        allowed_types (iterable): Accepted media types, e.g. ('text/html',)
+
+    Raises:
+        UnsupportedContentTypeError: If the response is some other type
+    """
+    media_type = content_type(response)
+    if 200 <= response.status_code < 300 and media_type and media_type not in allowed_types:
+        raise UnsupportedContentTypeError(
+            f"{response.url} is {media_type}, not a web page (accepted: {', '.join(allowed_types)})"
+        )
+
+
+def request(method, url, max_bytes=None, timeout=None, allowed_types=None, **kwargs):
+    """
+    Send a request through the shared session and read a size-capped body.
+
+    Args:
+        method (str): The HTTP method
+        url (str): The URL to request
+        max_bytes (int, optional): Largest body to accept. Defaults to Config.HTTP_MAX_RESPONSE_BYTES.
+        timeout (tuple, optional): (connect, read) timeouts in seconds.
+            Defaults to Config.HTTP_CONNECT_TIMEOUT and Config.HTTP_READ_TIMEOUT.
+        allowed_types (iterable, optional): Media types to accept. Anything
+            else is refused before the body is read. Defaults to any type.
+        **kwargs: Anything else requests accepts (headers, json, params, ...)
+
+    Returns:
+        requests.Response: The response, with its body already read
+
+    Raises:
+        ResponseTooLargeError: If the body is bigger than max_bytes
+        UnsupportedContentTypeError: If the response isn't one of allowed_types
+        requests.RequestException: If the request itself fails
+    """
+    max_bytes = max_bytes or Config.HTTP_MAX_RESPONSE_BYTES
+    timeout = timeout or (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+
+    response = get_session().request(method, url, timeout=timeout, stream=True, **kwargs)
+    try:
+        if allowed_types:
+            check_content_type(response, allowed_types)
+
+        # Refuse early when the server tells us up front that the body is too big
+        declared_length = response.headers.get('Content-Length')
+        if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+            raise ResponseTooLargeError(
+                f"Response from {url} is {declared_length} bytes, over the {max_bytes}-byte limit"
+            )
+
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            body.extend(chunk)
+            if len(body) > max_bytes:
+                raise ResponseTooLargeError(
+                    f"Response from {url} is over the {max_bytes}-byte limit; stopped reading"
+                )
+
+        # Hand the body back to requests so .text, .content and .json() work as usual
+        response._content = bytes(body)
+        return response
+    finally:
+        response.close()
+
+
+@contextmanager
+def stream(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the shared session and leave the body unread.
+
+    For responses that are consumed as they arrive, such as Server-Sent Events.
+    The connection goes back to the pool when the with block ends.
+
+    Args:
+        method (str): The HTTP method
+        url (str): The URL to request
+        timeout (tuple, optional): (connect, read) timeouts in seconds
+        **kwargs: Anything else requests accepts
+
+    Yields:
+        requests.Response: The response, ready for iter_lines()/iter_content()
+    """
+    timeout = timeout or (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+    response = get_session().request(method, url, timeout=timeout, stream=True, **kwargs)
+    try:
+        yield response
+    finally:
+        response.close()
+
+
+def get(url, **kwargs):
+    """Send a GET request. See request() for the arguments."""
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Send a POST request. POSTs are never retried. See request() for the arguments."""
+    return request('POST', url, **kwargs)
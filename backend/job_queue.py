@@ -0,0 +1,497 @@
+"""
+Background Job Queue Module
+
+Runs slow work (scraping plus a Claude call) outside the HTTP request that
+asked for it:
+1. Submitting a job stores it in a local SQLite database and returns its ID
+   straight away
+2. A small, fixed pool of worker threads in each process claims queued jobs
+   one at a time, so the number of jobs running at once stays bounded
+3. Callers poll for the job's status and result, and can cancel it
+4. Jobs survive a restart: queued jobs stay queued, and running jobs whose
+   worker stopped sending heartbeats (its process died, or the thread running
+   the job did) are put back in the queue
+
+Every job records how long it waited in the queue and how long each stage of
+its work took, so queue depth and per-stage latency can be reported.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager, closing
+from common import percentile
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    stages TEXT NOT NULL DEFAULT '{}',
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    worker_token TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Columns added after the first release, for databases created before them
+ADDED_COLUMNS = {'worker_token': 'TEXT', 'heartbeat_at': 'REAL'}
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with a message and extra details."""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once the job has been cancelled."""
+
+
+class Job:
+    """What a handler sees of the job it is running."""
+
+    def __init__(self, queue, job_id, kind, payload):
+        self.queue = queue
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time one stage of the job; cancellation is checked before it starts.
+
+        Args:
+            name (str): The stage name, e.g. 'scrape'
+        """
+        self.check_cancelled()
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.stages[name] = round((time.time() - start) * 1000, 1)
+            self.queue._save_stages(self.id, self.stages)
+
+    def check_cancelled(self):
+        """
+        Raise JobCancelled if someone asked for this job to be cancelled.
+
+        Raises:
+            JobCancelled: If the job was cancelled
+        """
+        if self.queue._cancel_requested(self.id):
+            raise JobCancelled()
+
+
+class JobQueue:
+    """A SQLite-backed job queue with a bounded pool of worker threads."""
+
+    def __init__(self, db_path, handlers, workers=2, poll_interval=1.0, retention_seconds=7 * 24 * 3600,
+                 heartbeat_interval=10.0, heartbeat_timeout=60.0):
+        """
+        Args:
+            db_path (str): The SQLite database file
+            handlers (dict): Job kind to a function that takes a Job and returns
+                a JSON-serializable result
+            workers (int, optional): Worker threads per process
+            poll_interval (float, optional): Seconds between checks for jobs
+                submitted by other processes
+            retention_seconds (float, optional): How long finished jobs are kept
+            heartbeat_interval (float, optional): Seconds between heartbeats for running jobs
+            heartbeat_timeout (float, optional): Seconds without a heartbeat
+                after which a running job is put back in the queue
+        """
+        self.db_path = db_path
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pid = None
+        self._token = None
+        self._threads = []
+        self._running_jobs = set()
+        self._schema_ready = False
+
+    # Database
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            # WAL lets status reads carry on while a worker is writing
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            columns = {row['name'] for row in connection.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in ADDED_COLUMNS.items():
+                if column not in columns:
+                    connection.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        self._schema_ready = True
+
+    def _execute(self, sql, parameters=()):
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(sql, parameters)
+            return cursor.fetchall(), cursor.rowcount
+
+    # Workers
+
+    @property
+    def running(self):
+        """Whether this process's worker threads have been started."""
+        return self._pid == os.getpid()
+
+    def start(self):
+        """Start this process's worker threads, if they aren't running yet."""
+        with self._lock:
+            # Threads don't survive a fork, so each gunicorn worker starts its own
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # PIDs are reused (a restarted container hands its workers the same
+            # small ones), so jobs are tagged with a token unique to this process
+            self._token = f"{self._pid}-{uuid.uuid4().hex}"
+            self._threads = []
+            self._running_jobs = set()
+
+        self._ensure_schema()
+        self.recover()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def recover(self):
+        """
+        Put running jobs back in the queue if their worker has stopped.
+
+        A job is requeued when it has had no heartbeat for heartbeat_timeout
+        seconds, or straight away when it was claimed by an earlier process
+        with this process's PID (which must have exited).
+
+        Returns:
+            int: How many jobs were requeued
+        """
+        rows, _ = self._execute(
+            'SELECT id, worker_pid, worker_token, heartbeat_at, started_at FROM jobs WHERE status = ?', (RUNNING,)
+        )
+        cutoff = time.time() - self.heartbeat_timeout
+        requeued = 0
+        for row in rows:
+            last_seen = row['heartbeat_at'] or row['started_at'] or 0
+            earlier_process = row['worker_pid'] == os.getpid() and row['worker_token'] != self._token
+            if last_seen >= cutoff and not earlier_process:
+                continue
+            _, count = self._execute(
+                'UPDATE jobs SET status = ?, worker_pid = NULL, worker_token = NULL, heartbeat_at = NULL, '
+                'started_at = NULL WHERE id = ? AND status = ? AND worker_token IS ? AND heartbeat_at IS ?',
+                (QUEUED, row['id'], RUNNING, row['worker_token'], row['heartbeat_at'])
+            )
+            requeued += count
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
+        return requeued
+
+    def _heartbeat_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                job_ids = list(self._running_jobs)
+            if not job_ids:
+                continue
+            placeholders = ','.join('?' * len(job_ids))
+            try:
+                self._execute(
+                    f'UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND worker_token = ? AND id IN ({placeholders})',
+                    (time.time(), RUNNING, self._token, *job_ids)
+                )
+            except sqlite3.Error as e:
+                print(f"Error recording job heartbeats: {e}")
+
+    def _work(self):
+        last_maintenance = time.time()
+        while True:
+            try:
+                claimed = self._claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming job: {e}")
+                claimed = None
+
+            if claimed is None:
+                # Once a minute, pick up jobs orphaned by a crashed process and drop old ones
+                if time.time() - last_maintenance > 60:
+                    last_maintenance = time.time()
+                    try:
+                        self.recover()
+                    except sqlite3.Error as e:
+                        print(f"Error requeuing interrupted jobs: {e}")
+                    self._sweep()
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+
+            with self._lock:
+                self._running_jobs.add(claimed.id)
+            try:
+                self._run(claimed)
+            except Exception as e:
+                # Most likely the database was locked when the outcome was saved;
+                # if this doesn't get through either, the missing heartbeats requeue it
+                print(f"Error finishing job {claimed.id}: {e}")
+                try:
+                    self._finish(claimed, FAILED, None, f"Error saving job result: {str(e)}")
+                except Exception as e:
+                    print(f"Error marking job {claimed.id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._running_jobs.discard(claimed.id)
+
+    def _claim(self):
+        """Atomically take the oldest queued job, even with other processes polling."""
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT id, kind, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1',
+                    (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    connection.execute('COMMIT')
+                    return None
+                now = time.time()
+                connection.execute(
+                    'UPDATE jobs SET status = ?, worker_pid = ?, worker_token = ?, started_at = ?, heartbeat_at = ? '
+                    'WHERE id = ?',
+                    (RUNNING, os.getpid(), self._token, now, now, row['id'])
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return Job(self, row['id'], row['kind'], json.loads(row['payload']))
+
+    def _run(self, job):
+        handler = self.handlers.get(job.kind)
+        status, result, error = FAILED, None, None
+        try:
+            if handler is None:
+                raise JobFailed(f"Unknown job type: {job.kind}")
+            result = handler(job)
+            status = SUCCEEDED
+        except JobCancelled:
+            status = CANCELLED
+        except JobFailed as e:
+            error = str(e)
+            result = e.details or None
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            error = f"Error processing job: {str(e)}"
+
+        self._finish(job, status, result, error)
+
+    def _finish(self, job, status, result, error):
+        """Record a job's outcome (a result that can't be stored as JSON fails the job)."""
+        try:
+            encoded = json.dumps(result) if result is not None else None
+        except (TypeError, ValueError) as e:
+            print(f"Job {job.id} returned a result that can't be saved: {e}")
+            status, encoded, error = FAILED, None, f"Error saving job result: {str(e)}"
+        self._execute(
+            # Unless the job was requeued and claimed by someone else meanwhile
+            'UPDATE jobs SET status = ?, result = ?, error = ?, stages = ?, finished_at = ? '
+            'WHERE id = ? AND worker_token = ?',
+            (status, encoded, error, json.dumps(job.stages), time.time(), job.id, self._token)
+        )
+
+    def _sweep(self):
+        """Delete finished jobs older than the retention period."""
+        cutoff = time.time() - self.retention_seconds
+        placeholders = ','.join('?' * len(FINISHED_STATUSES))
+        try:
+            self._execute(
+                f'DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?',
+                (*FINISHED_STATUSES, cutoff)
+            )
+        except sqlite3.Error as e:
+            print(f"Error deleting old jobs: {e}")
+
+    def _save_stages(self, job_id, stages):
+        self._execute('UPDATE jobs SET stages = ? WHERE id = ?', (json.dumps(stages), job_id))
+
+    def _cancel_requested(self, job_id):
+        rows, _ = self._execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,))
+        return bool(rows and rows[0]['cancel_requested'])
+
+    # Public API
+
+    def submit(self, kind, payload):
+        """
+        Queue a job.
+
+        Args:
+            kind (str): The job type; must be one of the handlers
+            payload (dict): JSON-serializable input for the handler
+
+        Returns:
+            dict: The queued job, as returned by get()
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        self._execute(
+            'INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, kind, QUEUED, json.dumps(payload), time.time())
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """
+        Get a job's status, timings and (once finished) its result.
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            dict: The job, or None if there isn't one with that ID
+        """
+        rows, _ = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+
+        job = {
+            'id': row['id'],
+            'type': row['kind'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'stages_ms': json.loads(row['stages']),
+        }
+        if row['started_at'] is not None:
+            job['queue_wait_ms'] = round((row['started_at'] - row['created_at']) * 1000, 1)
+        if row['status'] == QUEUED:
+            position, _ = self._execute(
+                'SELECT COUNT(*) AS ahead FROM jobs WHERE status = ? AND created_at < ?',
+                (QUEUED, row['created_at'])
+            )
+            job['queue_position'] = position[0]['ahead'] + 1
+        if row['status'] == RUNNING and row['cancel_requested']:
+            job['cancel_requested'] = True
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs are cancelled at once; running jobs stop
+        before their next stage.
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            dict: The job, or None if there isn't one with that ID
+        """
+        self._execute(
+            'UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?',
+            (CANCELLED, time.time(), job_id, QUEUED)
+        )
+        self._execute(
+            'UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?',
+            (job_id, RUNNING)
+        )
+        return self.get(job_id)
+
+    def stats(self, recent=200):
+        """
+        Report queue depth and latency for recent jobs, across every process.
+
+        Args:
+            recent (int, optional): How many recently finished jobs to measure
+
+        Returns:
+            dict: Job counts by status, plus p50/p95/max milliseconds for the
+                queue wait, each stage and the whole job
+        """
+        rows, _ = self._execute('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status')
+        counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED_STATUSES}
+        counts.update({row['status']: row['count'] for row in rows})
+
+        oldest, _ = self._execute('SELECT MIN(created_at) AS oldest FROM jobs WHERE status = ?', (QUEUED,))
+        oldest_queued = oldest[0]['oldest']
+
+        finished, _ = self._execute(
+            'SELECT created_at, started_at, finished_at, stages FROM jobs '
+            'WHERE finished_at IS NOT NULL AND started_at IS NOT NULL '
+            'ORDER BY finished_at DESC LIMIT ?',
+            (recent,)
+        )
+        samples = {}
+        for row in finished:
+            samples.setdefault('queue_wait', []).append((row['started_at'] - row['created_at']) * 1000)
+            samples.setdefault('total', []).append((row['finished_at'] - row['created_at']) * 1000)
+            for stage, elapsed_ms in json.loads(row['stages']).items():
+                samples.setdefault(stage, []).append(elapsed_ms)
+
+        latency = {}
+        for name, values in samples.items():
+            values.sort()
+            latency[name] = {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 0.50), 1),
+                'p95_ms': round(percentile(values, 0.95), 1),
+                'max_ms': round(values[-1], 1),
+            }
+
+        return {
+            'depth': counts[QUEUED],
+            'running': counts[RUNNING],
+            'oldest_queued_seconds': None if oldest_queued is None else round(time.time() - oldest_queued, 1),
+            'counts': counts,
+            'workers_per_process': self.workers,
+            'latency': latency,
+        }
@@ -0,0 +1,402 @@
+"""
+Metrics Module
+
+Built-in instrumentation, so a slow request can be traced to the step that
+made it slow:
+1. Request durations per endpoint and stage durations (page fetch, HTML
+   parse, transcript fetch, the Claude call, trend loads and saves) are
+   recorded as histograms, and cache hits, retries and upstream errors as
+   counters
+2. Each process keeps its numbers in memory and writes them to a SQLite file
+   shared by every worker on the machine (one row per process and series)
+   every Config.METRICS_FLUSH_SECONDS. render() adds the rows up, so
+   /api/metrics covers all gunicorn workers, not just the one answering.
+   Rows of workers that have exited are folded into a single 'retired' row
+   set, so counters never go backwards when a worker restarts
+3. Every request (and background job) gets a trace ID. Stage timings are
+   printed as JSON log lines carrying it, so the steps of one request can be
+   pulled out of the logs together; carry_trace() hands the ID on to thread
+   pools
+
+render() produces the Prometheus text exposition format.
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager, closing
+from config import Config
+from common import process_alive
+
+REQUEST_DURATION = 'techtrends_http_request_duration_seconds'
+STAGE_DURATION = 'techtrends_stage_duration_seconds'
+CACHE_EVENTS = 'techtrends_cache_events_total'
+CACHE_BYTES_SAVED = 'techtrends_cache_bytes_saved_total'
+RETRIES = 'techtrends_retries_total'
+UPSTREAM_ERRORS = 'techtrends_upstream_errors_total'
+
+# Name -> (type, help text) for everything render() reports
+FAMILIES = {
+    REQUEST_DURATION: ('histogram', 'Time taken to answer an API request, by endpoint, method and status.'),
+    STAGE_DURATION: ('histogram', 'Time taken by one step of handling a request, by stage and outcome.'),
+    CACHE_EVENTS: ('counter', 'Cache lookups and maintenance, by cache and event (memory_hits, disk_hits, misses, ...).'),
+    CACHE_BYTES_SAVED: ('counter', 'Download bytes avoided by answering from a cache.'),
+    RETRIES: ('counter', 'Requests sent again, by layer (http, host_scheduler, claude) and reason.'),
+    UPSTREAM_ERRORS: ('counter', 'Failed calls to sites, YouTube, Claude and Firestore, by upstream and reason.'),
+}
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    process TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (process, name, labels)
+);
+"""
+
+_trace_id = contextvars.ContextVar('trace_id', default=None)
+
+
+class MetricsRegistry:
+    """This process's counters and histograms, plus the shared file they're added up in."""
+
+    def __init__(self, db_path, flush_interval=5.0):
+        """
+        Args:
+            db_path (str): The SQLite file shared by every worker on the machine
+            flush_interval (float, optional): Seconds between writes to it
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # One flush at a time, so an older snapshot never overwrites a newer one
+        self._flush_lock = threading.Lock()
+        self._values = {}
+        self._pid = None
+        self._process = None
+        self._flusher = None
+        self._schema_ready = False
+        atexit.register(self.flush)
+
+    # Recording
+
+    def _check_process(self):
+        # A forked worker starts from zero: what the master counted is the master's
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._values = {}
+            self._flusher = None
+
+    def _start_flusher(self):
+        # Called with the lock held; the thread is started after it's released
+        if self._flusher is not None:
+            return None
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        return self._flusher
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Add to a counter.
+
+        Args:
+            name (str): The counter, e.g. metrics.RETRIES
+            amount (float, optional): How much to add
+            **labels: Label values (kept to a small, fixed set of values)
+        """
+        if not Config.METRICS_ENABLED:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_process()
+            self._values[key] = self._values.get(key, 0) + amount
+            flusher = self._start_flusher()
+        if flusher:
+            flusher.start()
+
+    def observe(self, name, seconds, **labels):
+        """
+        Record a duration in a histogram.
+
+        Args:
+            name (str): The histogram, e.g. metrics.STAGE_DURATION
+            seconds (float): The duration
+            **labels: Label values
+        """
+        if not Config.METRICS_ENABLED:
+            return
+        labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self._check_process()
+            values = self._values
+            for bound in BUCKETS:
+                key = (f"{name}_bucket", labels + (('le', repr(float(bound))),))
+                values[key] = values.get(key, 0) + (seconds <= bound)
+            key = (f"{name}_bucket", labels + (('le', '+Inf'),))
+            values[key] = values.get(key, 0) + 1
+            values[(f"{name}_sum", labels)] = values.get((f"{name}_sum", labels), 0) + seconds
+            values[(f"{name}_count", labels)] = values.get((f"{name}_count", labels), 0) + 1
+            flusher = self._start_flusher()
+        if flusher:
+            flusher.start()
+
+    # Sharing between workers
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        self._schema_ready = True
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write this process's totals to the shared file."""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid() or not self._values:
+                    return
+                rows = [
+                    (self._process, self._pid, name, json.dumps(labels), value)
+                    for (name, labels), value in self._values.items()
+                ]
+            self._write(rows)
+
+    def _write(self, rows):
+        try:
+            self._ensure_schema()
+            with closing(self._connect()) as connection:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.executemany(
+                    'INSERT OR REPLACE INTO samples (process, pid, name, labels, value) VALUES (?, ?, ?, ?, ?)', rows
+                )
+                connection.execute('COMMIT')
+        except sqlite3.Error as e:
+            print(f"Error saving metrics: {e}")
+
+    def _retire_exited(self, connection):
+        """Fold the rows of processes that have exited into the 'retired' rows."""
+        processes = connection.execute(
+            "SELECT DISTINCT process, pid FROM samples WHERE process != 'retired'"
+        ).fetchall()
+        for row in processes:
+            if process_alive(row['pid']):
+                continue
+            connection.execute(
+                "INSERT INTO samples (process, pid, name, labels, value) "
+                "SELECT 'retired', 0, name, labels, value FROM samples WHERE process = ? "
+                "ON CONFLICT (process, name, labels) DO UPDATE SET value = value + excluded.value",
+                (row['process'],)
+            )
+            connection.execute('DELETE FROM samples WHERE process = ?', (row['process'],))
+
+    def totals(self):
+        """
+        Add up every process's numbers (flushing this one's first).
+
+        Returns:
+            dict: (name, labels tuple) -> value
+        """
+        self.flush()
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._retire_exited(connection)
+                rows = connection.execute(
+                    'SELECT name, labels, SUM(value) AS value FROM samples GROUP BY name, labels'
+                ).fetchall()
+                connection.execute('COMMIT')
+            except sqlite3.Error:
+                connection.execute('ROLLBACK')
+                raise
+        return {
+            (row['name'], tuple(tuple(pair) for pair in json.loads(row['labels']))): row['value']
+            for row in rows
+        }
+
+    def render(self):
+        """
+        Every worker's metrics in the Prometheus text format.
+
+        Returns:
+            str: The exposition text
+        """
+        totals = self.totals()
+        families = {}
+        for (name, labels), value in totals.items():
+            family = name
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+                    family = name[:-len(suffix)]
+            families.setdefault(family, []).append((name, labels, value))
+
+        lines = []
+        for family in sorted(families):
+            kind, help_text = FAMILIES.get(family, ('untyped', ''))
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, labels, value in sorted(families[family], key=_series_order):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _series_order(series):
+    name, labels, _ = series
+    other = tuple(pair for pair in labels if pair[0] != 'le')
+    bound = next((float(value) for key, value in labels if key == 'le'), 0.0)
+    return other, name, bound
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+registry = MetricsRegistry(Config.METRICS_DB_PATH, Config.METRICS_FLUSH_SECONDS)
+inc = registry.inc
+observe = registry.observe
+render = registry.render
+
+
+# Tracing
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def valid_trace_id(value):
+    """A caller's X-Request-ID if it's a sensible ID to log (up to 64 letters, digits, '-', '_' or '.'), else None."""
+    if value and len(value) <= 64 and all(char.isalnum() or char in '-_.' for char in value):
+        return value
+    return None
+
+
+def current_trace_id():
+    """The trace ID of the request (or job) this thread is working on, or None."""
+    return _trace_id.get()
+
+
+def start_trace(trace_id=None):
+    """
+    Start tagging this thread's logs with a trace ID.
+
+    Args:
+        trace_id (str, optional): The ID to use. Defaults to a new one.
+
+    Returns:
+        A token for end_trace()
+    """
+    return _trace_id.set(trace_id or new_trace_id())
+
+
+def end_trace(token):
+    """Go back to the trace ID from before start_trace()."""
+    try:
+        _trace_id.reset(token)
+    except ValueError:
+        # The token was made in another context (a streamed response can
+        # finish outside the one its request started in)
+        _trace_id.set(None)
+
+
+def carry_trace(fn):
+    """
+    Wrap a function so it runs under the current trace ID on another thread.
+
+    Args:
+        fn (callable): The function to hand to a thread pool
+
+    Returns:
+        callable: The wrapped function
+    """
+    trace_id = _trace_id.get()
+
+    def run(*args, **kwargs):
+        token = _trace_id.set(trace_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _trace_id.reset(token)
+
+    return run
+
+
+def log(event, **fields):
+    """
+    Print a structured (JSON) log line tagged with the current trace ID.
+
+    Args:
+        event (str): What happened, e.g. 'stage' or 'request'
+        **fields: Anything else to include
+    """
+    if not Config.TRACE_LOGS:
+        return
+    record = {'ts': round(time.time(), 3), 'event': event, 'trace_id': _trace_id.get(), 'pid': os.getpid(), **fields}
+    print(json.dumps(record, default=str), flush=True)
+
+
+@contextmanager
+def stage(name, upstream=None, **fields):
+    """
+    Time one step of handling a request, recording it in STAGE_DURATION and the log.
+
+    The step's outcome is 'error' if an exception escapes it (and, with
+    ``upstream``, the failure is counted in UPSTREAM_ERRORS), or whatever
+    the block sets span['outcome'] to.
+
+    Args:
+        name (str): The stage, e.g. 'scrape.fetch'
+        upstream (str, optional): The service the stage calls ('site',
+            'youtube', 'claude' or 'firestore')
+        **fields: Extra details for the log line (URL, video ID, ...)
+
+    Yields:
+        dict: The log fields; set 'outcome' or add details from inside the block
+    """
+    span = dict(fields, outcome='ok')
+    started = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span.update({'outcome': 'error', 'error': type(e).__name__})
+        if upstream:
+            inc(UPSTREAM_ERRORS, upstream=upstream, reason=type(e).__name__)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        observe(STAGE_DURATION, seconds, stage=name, outcome=span['outcome'])
+        log('stage', stage=name, ms=round(seconds * 1000, 1), **span)
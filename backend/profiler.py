@@ -0,0 +1,432 @@
+"""
+Profiler Module
+
+An on-demand sampling profiler for live requests, to see where a CPU-heavy
+request (a giant page going through BeautifulSoup, a big trend filter)
+spends its time without redeploying:
+1. Nothing is sampled unless someone asks. A request that carries
+   Config.PROFILER_TOKEN in its X-Profile-Token header is profiled, and
+   arm() has a worker profile its next N requests (optionally only the ones
+   to a given route). With no token configured, profiling is off
+2. While at least one request is being profiled, a background thread reads
+   that request's call stack every Config.PROFILER_INTERVAL_MS. The thread
+   exits when the last profiled request finishes, so when profiling is off
+   a request costs one setting check and nothing else
+3. Each profile is saved in Config.PROFILES_FOLDER, named after the request's
+   trace ID, as three files: collapsed stacks (one "frame;frame;frame count"
+   line per stack, what flamegraph.pl and speedscope read), a report of the
+   top functions by cumulative and self time, and a short JSON summary. Any
+   worker on the machine can serve them later
+4. Only the newest Config.PROFILER_KEEP profiles are kept
+
+Only the request's own thread is sampled; work it hands to a thread pool
+shows up as time spent waiting for the pool.
+"""
+
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import threading
+from collections import Counter
+from functools import lru_cache
+from datetime import datetime, timezone
+from config import Config
+
+# What a profile's files are called, by the name read() takes
+FILE_SUFFIXES = {'collapsed': '.collapsed.txt', 'top': '.top.txt', 'json': '.json'}
+
+# Functions listed in each table of the top-functions report
+TOP_FUNCTIONS = 40
+
+
+class Profile:
+    """The samples taken from one request's thread."""
+
+    def __init__(self, profile_id, thread_id, info):
+        self.id = profile_id
+        self.thread_id = thread_id
+        self.info = info
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+        self.samples = 0
+        self.truncated = False
+
+    def add(self, frame):
+        # Outermost call first, as collapsed stacks are written
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        self.stacks[tuple(reversed(codes))] += 1
+        self.samples += 1
+
+
+class SamplingProfiler:
+    """Decides which requests to profile, samples them and saves the results."""
+
+    def __init__(self, folder, interval_ms=5, max_seconds=120, keep=100):
+        """
+        Args:
+            folder (str): Where profiles are saved (shared by every worker)
+            interval_ms (float, optional): Milliseconds between samples
+            max_seconds (float, optional): Longest a single request is sampled for
+            keep (int, optional): How many profiles to keep on disk
+        """
+        self.folder = folder
+        self.interval = interval_ms / 1000
+        self.max_seconds = max_seconds
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._active = {}
+        self._sampler = None
+        self._pid = None
+        self._armed_requests = 0
+        self._armed_route = None
+        self._rejected_tokens = 0
+
+    # Choosing requests
+
+    @property
+    def enabled(self):
+        return bool(Config.PROFILER_TOKEN)
+
+    def authorized(self, token):
+        """Whether ``token`` is the configured profiler token (always False if there isn't one)."""
+        if not self.enabled or not token:
+            return False
+        return hmac.compare_digest(token.encode('utf-8'), Config.PROFILER_TOKEN.encode('utf-8'))
+
+    def _check_process(self):
+        # Called with the lock held. A forked worker doesn't inherit the
+        # master's arming, or its sampler thread
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._active = {}
+            self._sampler = None
+            self._armed_requests = 0
+            self._armed_route = None
+            self._rejected_tokens = 0
+
+    def arm(self, requests=1, route=None):
+        """
+        Profile this worker's next requests.
+
+        Args:
+            requests (int, optional): How many requests to profile
+            route (str, optional): Only count requests to this route, given as
+                a path (/api/trends/filter) or a route pattern
+                (/api/trends/<string:trend_id>)
+
+        Returns:
+            dict: The worker's profiler state, as state() gives it
+        """
+        with self._lock:
+            self._check_process()
+            self._armed_requests = requests
+            self._armed_route = route
+        return self.state()
+
+    def disarm(self):
+        """Stop profiling requests that don't carry the token."""
+        return self.arm(0)
+
+    def wants(self, token, route, path):
+        """
+        Decide whether to profile a request, counting it against arm() if so.
+
+        A request with a wrong token isn't profiled (or counted against arm()),
+        and is counted in state()'s rejected_tokens so a mistyped secret shows up.
+
+        Args:
+            token (str): The request's X-Profile-Token header, or None
+            route (str): The route pattern the request matched, or None
+            path (str): The request's path
+
+        Returns:
+            bool: Whether to profile it
+        """
+        if not self.enabled:
+            return False
+        if token:
+            if self.authorized(token):
+                return True
+            with self._lock:
+                self._check_process()
+                self._rejected_tokens += 1
+            print(f"Not profiling {path}: its X-Profile-Token doesn't match PROFILER_TOKEN")
+            return False
+        if not self._armed_requests:
+            return False
+        with self._lock:
+            self._check_process()
+            if self._armed_requests <= 0 or self._armed_route not in (None, route, path):
+                return False
+            self._armed_requests -= 1
+            return True
+
+    def state(self):
+        """
+        Describe this worker's profiler.
+
+        Returns:
+            dict: Whether profiling is configured, what's armed, how many requests
+                are being sampled and how many carried a wrong token
+        """
+        with self._lock:
+            self._check_process()
+            return {
+                'pid': os.getpid(),
+                'enabled': self.enabled,
+                'armed_requests': self._armed_requests,
+                'route': self._armed_route,
+                'active': len(self._active),
+                'rejected_tokens': self._rejected_tokens,
+                'interval_ms': self.interval * 1000,
+            }
+
+    # Sampling
+
+    def start(self, profile_id=None, **info):
+        """
+        Start sampling the calling thread.
+
+        Args:
+            profile_id (str, optional): The profile's name (the request's trace ID). Defaults to a new one.
+            **info: Details for the summary (method, path, ...)
+
+        Returns:
+            Profile: Pass it to stop()
+        """
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{profile_id or uuid.uuid4().hex[:16]}"
+        profile = Profile(profile_id, threading.get_ident(), info)
+        with self._lock:
+            self._check_process()
+            self._active[profile.thread_id] = profile
+            start_sampler = self._sampler is None
+            if start_sampler:
+                self._sampler = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+                sampler = self._sampler
+        if start_sampler:
+            sampler.start()
+        return profile
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if self._pid != os.getpid() or not self._active:
+                    self._sampler = None
+                    return
+                targets = list(self._active.values())
+            frames = sys._current_frames()
+            for profile in targets:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.add(frame)
+                if time.perf_counter() - profile.started > self.max_seconds:
+                    profile.truncated = True
+                    with self._lock:
+                        self._active.pop(profile.thread_id, None)
+            del frames
+
+    def stop(self, profile, **info):
+        """
+        Stop sampling a request and save its profile.
+
+        Args:
+            profile (Profile): What start() returned
+            **info: More details for the summary (status, ...)
+
+        Returns:
+            dict: The profile's summary, or None if it couldn't be saved
+        """
+        duration = time.perf_counter() - profile.started
+        with self._lock:
+            if self._active.get(profile.thread_id) is profile:
+                del self._active[profile.thread_id]
+        profile.info.update(info)
+        try:
+            return self._save(profile, duration)
+        except OSError as e:
+            print(f"Error saving profile {profile.id}: {e}")
+            return None
+
+    # Saving and reading
+
+    def _path(self, profile_id, kind):
+        return os.path.join(self.folder, profile_id + FILE_SUFFIXES[kind])
+
+    def _save(self, profile, duration):
+        os.makedirs(self.folder, exist_ok=True)
+        summary = {
+            'id': profile.id,
+            'pid': os.getpid(),
+            **profile.info,
+            'started_at': datetime.fromtimestamp(profile.started_at, timezone.utc).isoformat(),
+            'duration_ms': round(duration * 1000, 1),
+            'samples': profile.samples,
+            'interval_ms': self.interval * 1000,
+            'truncated': profile.truncated,
+        }
+        _write_text(self._path(profile.id, 'collapsed'), collapsed_stacks(profile.stacks))
+        _write_text(self._path(profile.id, 'top'), top_functions_report(profile.stacks, summary))
+        _write_text(self._path(profile.id, 'json'), json.dumps(summary, indent=2, default=str))
+        print(f"Saved profile {profile.id}: {profile.samples} samples over {summary['duration_ms']} ms")
+        self._prune()
+        return summary
+
+    def _prune(self):
+        summaries = sorted(
+            (entry for entry in os.scandir(self.folder) if entry.name.endswith(FILE_SUFFIXES['json'])),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in summaries[self.keep:]:
+            profile_id = entry.name[:-len(FILE_SUFFIXES['json'])]
+            for kind in FILE_SUFFIXES:
+                try:
+                    os.remove(self._path(profile_id, kind))
+                except OSError:
+                    pass
+
+    def profiles(self, limit=50):
+        """
+        List saved profiles from every worker, newest first.
+
+        Args:
+            limit (int, optional): Most summaries to return
+
+        Returns:
+            list: The profiles' summaries
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.folder) if entry.name.endswith(FILE_SUFFIXES['json'])]
+        except FileNotFoundError:
+            return []
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        summaries = []
+        for entry in entries[:limit]:
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return summaries
+
+    def read(self, profile_id, kind='top'):
+        """
+        Read one of a saved profile's files.
+
+        Args:
+            profile_id (str): The profile's ID
+            kind (str, optional): 'collapsed', 'top' or 'json'
+
+        Returns:
+            str: The file's text, or None if there's no such profile
+
+        Raises:
+            ValueError: If ``kind`` isn't one of the three
+        """
+        if kind not in FILE_SUFFIXES:
+            raise ValueError(f"kind must be one of {', '.join(FILE_SUFFIXES)}")
+        # Profile IDs are made of trace ID characters, never path separators
+        if not profile_id or profile_id.startswith('.') or not all(char.isalnum() or char in '-_.' for char in profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, kind), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+def _write_text(path, text):
+    # Written under a temporary name first, so a reader never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    # Paths relative to the folder on sys.path they were imported from
+    # (the backend folder, site-packages or the standard library)
+    for folder in sorted((path for path in sys.path if path), key=len, reverse=True):
+        if filename.startswith(folder.rstrip(os.sep) + os.sep):
+            return filename[len(folder.rstrip(os.sep)) + 1:]
+    return filename
+
+
+@lru_cache(maxsize=16384)
+def frame_label(code):
+    """How a function is named in profiles: name (file:first line)."""
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+def collapsed_stacks(stacks):
+    """
+    Write stacks in the collapsed format flamegraph.pl and speedscope read.
+
+    Args:
+        stacks (Counter): Stack (tuple of code objects, outermost first) -> samples
+
+    Returns:
+        str: One "frame;frame;frame count" line per stack, most sampled first
+    """
+    lines = [
+        f"{';'.join(frame_label(code) for code in stack)} {count}"
+        for stack, count in stacks.most_common()
+    ]
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def top_functions_report(stacks, summary):
+    """
+    Write a plain-text report of the functions that took the most samples.
+
+    A function's cumulative (total) samples are the ones it was anywhere on
+    the stack for; its self samples are the ones it was running its own code for.
+
+    Args:
+        stacks (Counter): Stack (tuple of code objects, outermost first) -> samples
+        summary (dict): The profile's summary, for the heading
+
+    Returns:
+        str: The report
+    """
+    total = sum(stacks.values())
+    cumulative = Counter()
+    own = Counter()
+    for stack, count in stacks.items():
+        for code in set(stack):
+            cumulative[code] += count
+        own[stack[-1]] += count
+
+    lines = [
+        f"Profile {summary['id']} (pid {summary['pid']})",
+        f"{summary.get('method', '')} {summary.get('path', '')} -> {summary.get('status', '?')} "
+        f"in {summary['duration_ms']} ms; {total} samples every {summary['interval_ms']:g} ms"
+        + (' (sampling stopped at the time limit)' if summary['truncated'] else ''),
+    ]
+    if not total:
+        return '\n'.join(lines + ['', 'No samples (the request finished within one interval)']) + '\n'
+
+    for title, ranking in (('By cumulative time', cumulative), ('By self time', own)):
+        lines += ['', title, f"{'total':>8} {'self':>8}  function"]
+        for code, _ in ranking.most_common(TOP_FUNCTIONS):
+            lines.append(
+                f"{cumulative[code] / total:>8.1%} {own[code] / total:>8.1%}  {frame_label(code)}"
+            )
+    return '\n'.join(lines) + '\n'
+
+
+profiler = SamplingProfiler(
+    Config.PROFILES_FOLDER,
+    interval_ms=Config.PROFILER_INTERVAL_MS,
+    max_seconds=Config.PROFILER_MAX_SECONDS,
+    keep=Config.PROFILER_KEEP,
+)
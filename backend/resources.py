@@ -0,0 +1,105 @@
+"""
+Lazy Resources Module
+
+External clients (Firestore, Claude) and other expensive objects are created
+on first use instead of when app.py is imported, so that:
+1. Importing the app is fast, and so are cold starts of new workers
+2. Each process creates its own clients after gunicorn forks it, even with
+   --preload, instead of inheriting sockets and threads from the master
+3. A failed setup (say, a missing API key) doesn't stop the app from
+   starting; it is reported by /api/ready and tried again on the next use
+4. A worker can be warmed up explicitly (see warm_up) before it takes traffic
+"""
+
+import os
+import time
+import threading
+
+
+class LazyResource:
+    """An object created by ``factory`` the first time it is needed in each process."""
+
+    def __init__(self, name, factory):
+        """
+        Args:
+            name (str): Name shown in readiness reports
+            factory (callable): Takes no arguments and returns the object
+        """
+        self.name = name
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+        self._attempt_pid = None
+        self._init_ms = None
+        self._error = None
+
+    def get(self):
+        """
+        Get this process's object, creating it if needed.
+
+        Returns:
+            The object returned by the factory
+
+        Raises:
+            Exception: Whatever the factory raised; the next call tries again
+        """
+        # Fast path once the object exists in this process
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._value
+            self._attempt_pid = os.getpid()
+            started = time.monotonic()
+            try:
+                value = self.factory()
+            except Exception as e:
+                self._error = f"{type(e).__name__}: {e}"
+                self._init_ms = round((time.monotonic() - started) * 1000, 1)
+                raise
+            self._value = value
+            self._error = None
+            self._init_ms = round((time.monotonic() - started) * 1000, 1)
+            self._pid = os.getpid()
+            return value
+
+    @property
+    def ready(self):
+        """Whether the object has been created in this process."""
+        return self._pid == os.getpid()
+
+    def status(self):
+        """
+        Report whether the object exists in this process and how long it took to create.
+
+        Returns:
+            dict: ready, init_ms and the last error (if creating it failed)
+        """
+        # Timings and errors from the parent process don't apply to this one
+        attempted = self._attempt_pid == os.getpid()
+        return {
+            'ready': self.ready,
+            'init_ms': self._init_ms if attempted else None,
+            'error': self._error if attempted else None,
+        }
+
+
+def warm_up(resources):
+    """
+    Create every resource now, carrying on past the ones that fail.
+
+    Args:
+        resources (list): LazyResource objects, created in order
+
+    Returns:
+        dict: Each resource's status, by name
+    """
+    report = {}
+    for resource in resources:
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"Error warming up {resource.name}: {e}")
+        report[resource.name] = resource.status()
+    return report
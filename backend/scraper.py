@@ -2,24 +2,95 @@
 Web Scraping and Claude API Integration Module
 
 This module provides functionality to:
-1. Extract content from web pages using BeautifulSoup
-2. Extract transcripts from YouTube videos using youtube_transcript_api
-3. Generate research memos using the Claude 3.7 API
+1. Extract content from web pages using lxml (see html_extract.py)
+2. Extract transcripts from YouTube videos using youtube_transcript_api,
+   looking up the video's title (via oEmbed) at the same time
+3. Scrape several sources concurrently with a deadline, pacing the requests
+   to each host (see host_scheduler.py)
+4. Cache scraped content so repeated requests for a URL skip the download
+5. Generate research memos using the Claude 3.7 API
+6. Cache finished memos so identical requests don't pay for another Claude call
+7. Fit long multi-source input into a token budget by removing duplicate text
+   and summarizing oversized sources in parallel before the memo is written
+8. Look up publication dates for many URLs at once, fetching only the pages
+   whose URL doesn't already say when they were published, and reading each
+   of those only until its date turns up
+9. Time each step (page fetch, HTML parse, transcript fetch, Claude calls)
+   and count Claude errors in the shared metrics (see metrics.py)
 """
 
 import re
-import requests
-import httpx
+import time
+import threading
 import json
-from bs4 import BeautifulSoup
+import hashlib
+import http_client
+import metrics
+from html_extract import parse_html, read_page, format_content, page_metadata, title_of, normalize_encoding
+from date_extract import find_publication_date, extract_date_from_url_pattern, scan_for_date
+from transcripts import format_transcript, group_segments, format_windows, transcript_duration
 from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
-from anthropic import Anthropic
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
 from config import Config
+from cache import TieredCache, normalize_url
+from host_scheduler import HostScheduler
+
+# Scraped pages and transcripts, shared by every worker through the disk tier
+page_cache = TieredCache(
+    'pages',
+    Config.CACHE_DIR,
+    ttl=Config.SCRAPE_CACHE_TTL_SECONDS,
+    max_memory_entries=Config.SCRAPE_CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=Config.SCRAPE_CACHE_MAX_BYTES,
+)
+memo_cache = TieredCache(
+    'memos',
+    Config.CACHE_DIR if Config.MEMO_CACHE_PERSIST else None,
+    ttl=Config.MEMO_CACHE_TTL_SECONDS,
+    max_memory_entries=Config.MEMO_CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=Config.SCRAPE_CACHE_MAX_BYTES,
+)
+transcript_cache = TieredCache(
+    'transcripts',
+    Config.CACHE_DIR,
+    ttl=Config.TRANSCRIPT_CACHE_TTL_SECONDS,
+    max_memory_entries=Config.SCRAPE_CACHE_MEMORY_ENTRIES,
+    max_disk_bytes=Config.SCRAPE_CACHE_MAX_BYTES,
+)
+
+# Title lookups run here while the calling thread fetches the transcript.
+# The threads are started on first use, so forked workers each get their own.
+_title_lookups = ThreadPoolExecutor(max_workers=4, thread_name_prefix='youtube-title')
+
+YOUTUBE_OEMBED_URL = 'https://www.youtube.com/oembed'
+
+# Every request we send to a site waits its turn here, so that a burst of
+# memos pointing at the same publisher doesn't hammer it. robots.txt files
+# are kept with the scraped pages.
+host_scheduler = HostScheduler(robots_cache=page_cache)
+
 
 class ContentScraper:
     """Class for scraping content from various sources."""
     
+    @staticmethod
+    def detect_source_type(url, source_type='auto'):
+        """
+        Work out whether a URL should be scraped as a YouTube video or a webpage.
+        
+        Args:
+            url (str): The source URL
+            source_type (str, optional): 'auto', 'youtube' or 'webpage'
+            
+        Returns:
+            str: 'youtube' or 'webpage'
+        """
+        if source_type != 'auto':
+            return source_type
+        if 'youtube.com' in url or 'youtu.be' in url:
+            return 'youtube'
+        return 'webpage'
+    
     @staticmethod
     def extract_youtube_id(url):
         """
@@ -46,36 +117,392 @@ class ContentScraper:
         return None
     
     @staticmethod
-    def get_youtube_transcript(url):
+    def extract_document(url, source_type='auto', timeout=None):
         """
-        Get the transcript of a YouTube video.
+        Download a source once and read everything we use from it.
+        
+        The result is cached (for videos, the transcript and title are), so
+        the date lookup, the scrape endpoints and memo generation for the
+        same URL all share one download and parse.
         
         Args:
-            url (str): The YouTube video URL
+            url (str): The source URL
+            source_type (str, optional): 'auto', 'youtube' or 'webpage'
+            timeout (tuple, optional): (connect, read) timeouts for the page
+                download. Defaults to the shared HTTP client's timeouts.
             
         Returns:
-            str: The transcript text or error message
+            dict: url, source_type, title, description, canonical_url,
+                published_date ('YYYY-MM-DD' or None), date_source ('url',
+                'meta', 'content' or None), text (the main text or transcript)
+                and content (the text laid out for a memo). YouTube documents
+                also have channel and duration_seconds, but no description or
+                date (see lookup_date()); one whose transcript couldn't be
+                fetched has an 'error' instead of text and content.
+                
+        Raises:
+            ValueError: If a YouTube URL has no video ID
+            http_client.ResponseTooLargeError: If the page is over Config.SCRAPE_MAX_PAGE_BYTES
+            http_client.UnsupportedContentTypeError: If the URL isn't a web page
+            host_scheduler.RobotsDisallowedError: If the site's robots.txt doesn't allow it
+            host_scheduler.HostBusyError: If the site is paused or too busy to wait for
+            requests.RequestException: If a webpage can't be downloaded
         """
+        if ContentScraper.detect_source_type(url, source_type) == 'youtube':
+            return ContentScraper._youtube_document(url, timeout)
+        
+        def fetch(stale_entry):
+            headers = {}
+            
+            # Ask the origin whether our stale copy is still good
+            validators = stale_entry['validators'] if stale_entry else {}
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+            
+            with metrics.stage('scrape.fetch', url=url) as span:
+                response = host_scheduler.fetch(url, lambda: http_client.get(
+                    url,
+                    headers=headers,
+                    timeout=timeout,
+                    max_bytes=Config.SCRAPE_MAX_PAGE_BYTES,
+                    allowed_types=Config.SCRAPE_ALLOWED_CONTENT_TYPES,
+                ))
+                span.update({'status': response.status_code, 'bytes': len(response.content)})
+            if response.status_code == 304 and stale_entry:
+                return TieredCache.NOT_MODIFIED
+            response.raise_for_status()
+            
+            with metrics.stage('scrape.parse', url=url):
+                document = ContentScraper.read_webpage(url, response.content, http_client.declared_encoding(response))
+            return {
+                'value': document,
+                'validators': {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                },
+                'download_bytes': len(response.content),
+            }
+        
+        return page_cache.get_or_fetch(f"doc:{normalize_url(url)}", fetch)
+    
+    @staticmethod
+    def read_webpage(url, html, declared_encoding=None):
+        """
+        Build the document for a webpage from its HTML, parsing it once.
+        
+        Args:
+            url (str): The page URL
+            html (str or bytes): The page HTML, ideally the raw downloaded bytes
+            declared_encoding (str, optional): The charset the server declared
+            
+        Returns:
+            dict: The document, as described in extract_document()
+        """
+        root = parse_html(html, declared_encoding)
+        
+        # Read the metadata and date before read_page() empties the skipped elements
+        metadata = page_metadata(root, url)
+        date, date_source = find_publication_date(url, root)
+        title, text = read_page(root)
+        
+        return {
+            'url': url,
+            'source_type': 'webpage',
+            'title': title,
+            'description': metadata['description'],
+            'canonical_url': metadata['canonical_url'] or url,
+            'published_date': date.strftime('%Y-%m-%d') if date else None,
+            'date_source': date_source,
+            'text': text,
+            'content': format_content(title, text),
+        }
+    
+    @staticmethod
+    def _youtube_document(url, timeout=None):
+        """Build the document for a YouTube video from its stored transcript and title."""
         video_id = ContentScraper.extract_youtube_id(url)
         if not video_id:
-            return "Error: Could not extract YouTube video ID from the URL."
+            raise ValueError("Could not extract YouTube video ID from the URL.")
+        return ContentScraper._fetch_youtube_document(url, video_id, timeout)
+    
+    @staticmethod
+    def _fetch_youtube_document(url, video_id, timeout=None):
+        """
+        Get the transcript of a YouTube video, looking up its title at the same time.
+        
+        Both come from transcript_cache when they're there, so a popular video
+        is only fetched from YouTube once per Config.TRANSCRIPT_CACHE_TTL_SECONDS.
+        Videos longer than Config.YOUTUBE_TIMESTAMP_MIN_SECONDS are laid out
+        as timestamped paragraphs, so chunks of them can be summarized
+        separately without losing where they came from.
+        
+        Args:
+            url (str): The video URL
+            video_id (str): The YouTube video ID
+            timeout (tuple, optional): (connect, read) timeouts for the title lookup
+            
+        Returns:
+            dict: The document, as described in extract_document(), plus
+                'channel' and 'duration_seconds'. The publication date and
+                description aren't included; lookup_date() reads those.
+        """
+        document = {
+            'url': url,
+            'source_type': 'youtube',
+            'title': None,
+            'channel': None,
+            'description': None,
+            'canonical_url': f"https://www.youtube.com/watch?v={video_id}",
+            'published_date': None,
+            'date_source': None,
+        }
         
+        title_lookup = _title_lookups.submit(metrics.carry_trace(ContentScraper.youtube_details), video_id, timeout)
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            formatter = TextFormatter()
-            formatted_transcript = formatter.format_transcript(transcript)
+            segments = ContentScraper.youtube_segments(video_id)
+        except Exception as e:
+            document['error'] = f"Error retrieving transcript: {str(e)}"
+            segments = None
+        
+        # Add the video's details if possible
+        details = title_lookup.result()
+        if details:
+            document.update({'title': details['title'], 'channel': details['channel']})
+        if segments is None:
+            return document
+        
+        duration = transcript_duration(segments)
+        document['duration_seconds'] = round(duration)
+        document['text'] = format_transcript(segments)
+        if duration >= Config.YOUTUBE_TIMESTAMP_MIN_SECONDS:
+            transcript = format_windows(group_segments(segments, Config.YOUTUBE_SEGMENT_SECONDS))
+        else:
+            transcript = document['text']
+        
+        if document['title']:
+            document['content'] = f"Title: {document['title']}\n\nTranscript:\n{transcript}"
+        else:
+            document['content'] = transcript
+        return document
+    
+    @staticmethod
+    def youtube_segments(video_id):
+        """
+        Get a video's transcript segments, from the transcript store if possible.
+        
+        Args:
+            video_id (str): The YouTube video ID
             
-            # Add video title if possible
-            try:
-                response = requests.get(f"https://www.youtube.com/watch?v={video_id}")
-                soup = BeautifulSoup(response.text, 'html.parser')
-                title = soup.find('title').text.replace(' - YouTube', '')
-                return f"Title: {title}\n\nTranscript:\n{formatted_transcript}"
-            except:
-                return formatted_transcript
-                
+        Returns:
+            list: Segments as {'text', 'start', 'duration'} dicts, in order
+            
+        Raises:
+            Exception: Whatever youtube_transcript_api raises when a video
+                has no transcript (failures aren't stored)
+        """
+        def fetch(stale_entry):
+            # Transcripts don't change, so there is nothing to revalidate
+            with metrics.stage('scrape.transcript', upstream='youtube', video_id=video_id), \
+                    host_scheduler.slot(f"https://www.youtube.com/watch?v={video_id}", check_robots=False):
+                segments = YouTubeTranscriptApi.get_transcript(video_id)
+            return {
+                'value': [
+                    {'text': segment['text'], 'start': segment['start'], 'duration': segment.get('duration', 0)}
+                    for segment in segments
+                ],
+            }
+        
+        return transcript_cache.get_or_fetch(f"youtube-transcript:{video_id}", fetch)
+    
+    @staticmethod
+    def youtube_details(video_id, timeout=None):
+        """
+        Look up a video's title and channel with YouTube's oEmbed endpoint.
+        
+        oEmbed answers with a few hundred bytes of JSON, where the watch page
+        is over a megabyte of HTML.
+        
+        Args:
+            video_id (str): The YouTube video ID
+            timeout (tuple, optional): (connect, read) timeouts
+            
+        Returns:
+            dict: 'title' and 'channel', or None if YouTube wouldn't say
+                (private or removed videos, network errors)
+        """
+        def fetch(stale_entry):
+            # oEmbed is an API for programs like us, so robots.txt doesn't apply
+            with metrics.stage('scrape.youtube_details', video_id=video_id):
+                response = host_scheduler.fetch(YOUTUBE_OEMBED_URL, lambda: http_client.get(
+                    YOUTUBE_OEMBED_URL,
+                    params={'url': f"https://www.youtube.com/watch?v={video_id}", 'format': 'json'},
+                    timeout=timeout,
+                    max_bytes=64 * 1024,
+                ), check_robots=False)
+            if response.status_code != 200:
+                print(f"YouTube oEmbed returned {response.status_code} for {video_id}")
+                return {'value': None, 'cache': False}
+            data = response.json()
+            return {
+                'value': {'title': data.get('title'), 'channel': data.get('author_name')},
+                'download_bytes': len(response.content),
+            }
+        
+        try:
+            return transcript_cache.get_or_fetch(f"youtube-title:{video_id}", fetch)
+        except Exception as e:
+            print(f"Error looking up YouTube title for {video_id}: {e}")
+            return None
+    
+    @staticmethod
+    def get_youtube_segments(url, window_seconds=None):
+        """
+        Get a YouTube transcript as timestamped windows, for processing a long video in chunks.
+        
+        Args:
+            url (str): The YouTube video URL
+            window_seconds (float, optional): Window length. Defaults to Config.YOUTUBE_SEGMENT_SECONDS.
+            
+        Returns:
+            list: Windows as returned by transcripts.group_segments()
+            
+        Raises:
+            ValueError: If the URL has no video ID
+        """
+        video_id = ContentScraper.extract_youtube_id(url)
+        if not video_id:
+            raise ValueError("Could not extract YouTube video ID from the URL.")
+        return group_segments(ContentScraper.youtube_segments(video_id), window_seconds or Config.YOUTUBE_SEGMENT_SECONDS)
+    
+    @staticmethod
+    def lookup_date(url, timeout=None, on_start=None):
+        """
+        Find a page's publication date, downloading as little of it as possible.
+        
+        A date in the URL needs no download, and a page already in the
+        document cache isn't downloaded again. Otherwise the page is streamed
+        and parsed as it arrives, and the download stops as soon as a date
+        meta tag settles the answer (see date_extract.scan_for_date()), or
+        after Config.DATE_SCAN_BODY_BYTES past the <head>. YouTube links read
+        the watch page, without fetching the transcript.
+        
+        Args:
+            url (str): The page URL
+            timeout (tuple, optional): (connect, read) timeouts for the download
+            on_start (callable, optional): Called when the download starts,
+                once the page's host is ready for it
+            
+        Returns:
+            dict: url, published_date ('YYYY-MM-DD' or None), date_source
+                ('url', 'meta', 'content' or None), title, description,
+                canonical_url and bytes_read (0 when nothing was downloaded)
+        
+        Raises:
+            host_scheduler.RobotsDisallowedError: If the site's robots.txt doesn't allow it
+            host_scheduler.HostBusyError: If the site is paused or too busy to wait for
+            requests.RequestException: If the page can't be downloaded
+        """
+        lookup = {
+            'url': url,
+            'published_date': None,
+            'date_source': None,
+            'title': None,
+            'description': None,
+            'canonical_url': url,
+            'bytes_read': 0,
+        }
+        
+        date = extract_date_from_url_pattern(url)
+        if date:
+            lookup.update({'published_date': date.strftime('%Y-%m-%d'), 'date_source': 'url'})
+            return lookup
+        
+        is_youtube = ContentScraper.detect_source_type(url) == 'youtube'
+        video_id = ContentScraper.extract_youtube_id(url) if is_youtube else None
+        if video_id:
+            # Video documents don't include the date, so read the watch page
+            document = None
+            target = f"https://www.youtube.com/watch?v={video_id}"
+        else:
+            document = page_cache.get_value(f"doc:{normalize_url(url)}")
+            target = url
+        if document is not None:
+            lookup.update({key: document[key] for key in ('published_date', 'date_source', 'title', 'description', 'canonical_url')})
+            return lookup
+        
+        def fetch(stale_entry):
+            lookup = ContentScraper.scan_page_for_date(url, target, timeout, youtube=bool(video_id), on_start=on_start)
+            return {'value': lookup, 'download_bytes': lookup['bytes_read']}
+        
+        return page_cache.get_or_fetch(f"date:{normalize_url(target)}", fetch)
+    
+    @staticmethod
+    def scan_page_for_date(url, target=None, timeout=None, youtube=False, on_start=None):
+        """
+        Stream a page until its publication date is known (no caching).
+        
+        Args:
+            url (str): The URL being looked up
+            target (str, optional): The page to download, if not ``url``
+            timeout (tuple, optional): (connect, read) timeouts for the download
+            youtube (bool, optional): Whether the page is a YouTube watch page
+            on_start (callable, optional): Called when the download starts
+            
+        Returns:
+            dict: As described in lookup_date()
+        """
+        target = target or url
+        with metrics.stage('date.scan', url=target) as span, \
+                host_scheduler.slot(target, on_start=on_start) as slot, \
+                http_client.stream('GET', target, timeout=timeout) as response:
+            slot.record(response)
+            response.raise_for_status()
+            http_client.check_content_type(response, Config.SCRAPE_ALLOWED_CONTENT_TYPES)
+            declared = http_client.declared_encoding(response)
+            scan = scan_for_date(
+                response.iter_content(chunk_size=16 * 1024),
+                max_bytes=Config.SCRAPE_MAX_PAGE_BYTES,
+                # YouTube's date meta tags sit somewhere in a very long body
+                max_body_bytes=None if youtube else Config.DATE_SCAN_BODY_BYTES,
+                encoding=normalize_encoding(declared) if declared else None,
+            )
+            span.update({'bytes': scan['bytes_read'], 'method': scan['method']})
+        
+        root = scan['root']
+        metadata = page_metadata(root, target)
+        title = title_of(root)
+        if title and youtube:
+            title = title.replace(' - YouTube', '')
+        return {
+            'url': url,
+            'published_date': scan['date'].strftime('%Y-%m-%d') if scan['date'] else None,
+            'date_source': scan['method'],
+            'title': title,
+            'description': metadata['description'],
+            'canonical_url': metadata['canonical_url'] or target,
+            'bytes_read': scan['bytes_read'],
+        }
+    
+    @staticmethod
+    def get_youtube_transcript(url):
+        """
+        Get the transcript of a YouTube video.
+        
+        Args:
+            url (str): The YouTube video URL
+            
+        Returns:
+            str: The transcript text or error message
+        """
+        try:
+            document = ContentScraper._youtube_document(url)
+        except ValueError as e:
+            return f"Error: {str(e)}"
         except Exception as e:
             return f"Error retrieving transcript: {str(e)}"
+        return document.get('error') or document['content']
     
     @staticmethod
     def get_webpage_content(url):
@@ -89,56 +516,500 @@ class ContentScraper:
             str: The extracted content or error message
         """
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            return ContentScraper.extract_document(url, 'webpage')['content']
+        except Exception as e:
+            return f"Error extracting webpage content: {str(e)}"
+    
+    @staticmethod
+    def scrape_source(url, source_type='auto'):
+        """
+        Scrape a single URL with the scraper matching its source type.
+        
+        Args:
+            url (str): The source URL
+            source_type (str, optional): 'auto', 'youtube' or 'webpage'
+            
+        Returns:
+            str: The extracted content or error message
+        """
+        if ContentScraper.detect_source_type(url, source_type) == 'youtube':
+            return ContentScraper.get_youtube_transcript(url)
+        return ContentScraper.get_webpage_content(url)
+    
+    @staticmethod
+    def iter_scrape(urls, source_type='auto', max_workers=None, deadline=None):
+        """
+        Scrape several URLs concurrently, yielding each result as it finishes.
+        
+        Fetches run on a bounded thread pool and take their turn at each host
+        from host_scheduler. Anything not
+        finished when the deadline expires is reported as a timeout instead of
+        holding up the whole request.
+        
+        Args:
+            urls (list): The URLs to scrape
+            source_type (str, optional): 'auto', 'youtube' or 'webpage'
+            max_workers (int, optional): Pool size. Defaults to Config.SCRAPE_MAX_WORKERS.
+            deadline (float, optional): Seconds allowed for the whole fan-out.
+                Defaults to Config.SCRAPE_DEADLINE_SECONDS.
+            
+        Yields:
+            tuple: (position of the URL in ``urls``, result dict) in completion
+                order. Each result has ``url``, ``source_type``, ``status``
+                ('ok', 'error' or 'timeout'), ``elapsed_ms`` and either
+                ``content`` or ``error``.
+        """
+        if not urls:
+            return
+        
+        max_workers = max_workers or Config.SCRAPE_MAX_WORKERS
+        deadline = Config.SCRAPE_DEADLINE_SECONDS if deadline is None else deadline
+        expires_at = time.monotonic() + deadline
+        
+        def fetch(url, current_source_type):
+            started = time.monotonic()
+            with metrics.stage('scrape.source', url=url, source_type=current_source_type) as span:
+                content = ContentScraper.scrape_source(url, current_source_type)
+                if content.startswith('Error'):
+                    span['outcome'] = 'error'
+            elapsed_ms = int((time.monotonic() - started) * 1000)
+            if content.startswith('Error'):
+                return {'status': 'error', 'error': content, 'elapsed_ms': elapsed_ms}
+            return {'status': 'ok', 'content': content, 'elapsed_ms': elapsed_ms}
+        
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+        try:
+            positions = {}
+            for position, url in enumerate(urls):
+                current_source_type = ContentScraper.detect_source_type(url, source_type)
+                future = executor.submit(metrics.carry_trace(fetch), url, current_source_type)
+                positions[future] = (position, {'url': url, 'source_type': current_source_type})
+            
+            try:
+                for future in as_completed(positions, timeout=max(expires_at - time.monotonic(), 0)):
+                    position, result = positions.pop(future)
+                    if future.exception() is not None:
+                        result.update({'status': 'error', 'error': f'Error scraping source: {future.exception()}'})
+                    else:
+                        result.update(future.result())
+                    yield position, result
+            except FuturesTimeoutError:
+                pass
+            
+            # Whatever is left missed the deadline
+            for future, (position, result) in sorted(positions.items(), key=lambda item: item[1][0]):
+                future.cancel()
+                result.update({
+                    'status': 'timeout',
+                    'error': f'Timed out after {deadline:g}s',
+                    'elapsed_ms': int(deadline * 1000),
+                })
+                yield position, result
+        finally:
+            # Don't block on stragglers past the deadline. A page download ends at
+            # the HTTP client's read timeout; a transcript fetch has no timeout
+            # of its own, so its thread runs on until YouTube answers
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def scrape_many(urls, source_type='auto', max_workers=None, deadline=None):
+        """
+        Scrape several URLs concurrently. See iter_scrape() for the arguments.
+        
+        Returns:
+            list: One result dict per URL, in the same order as ``urls``, so the
+                combined content is deterministic
+        """
+        results = [None] * len(urls)
+        for position, result in ContentScraper.iter_scrape(urls, source_type, max_workers, deadline):
+            results[position] = result
+        return results
+    
+    @staticmethod
+    def iter_dates(urls, max_workers=None, timeout=None):
+        """
+        Find publication dates for several URLs, yielding each as it's found.
+        
+        Dates written in the URL itself are yielded straight away, without any
+        download. The other pages are read with lookup_date(), which stops
+        each download once the date is known, on a bounded thread pool, taking
+        turns at each host from host_scheduler. Each lookup gets its own
+        timeout, counted from when its download starts, so one slow site only
+        costs its own result.
+        
+        Args:
+            urls (list): The URLs to look up
+            max_workers (int, optional): Pool size. Defaults to Config.DATE_BATCH_MAX_WORKERS.
+            timeout (float, optional): Seconds allowed per URL. Defaults to
+                Config.DATE_LOOKUP_TIMEOUT.
+            
+        Yields:
+            tuple: (position of the URL in ``urls``, result dict) in completion
+                order. Each result has ``url``, ``date`` ('YYYY-MM-DD' or None),
+                ``method`` ('url', 'meta' or 'content', or None when nothing
+                was found), ``status`` ('ok', 'error' or 'timeout'),
+                ``elapsed_ms`` and, unless the status is 'ok', ``error``.
+        """
+        max_workers = max_workers or Config.DATE_BATCH_MAX_WORKERS
+        timeout = Config.DATE_LOOKUP_TIMEOUT if timeout is None else timeout
+        
+        # URL patterns first: no network needed
+        to_fetch = []
+        for position, url in enumerate(urls):
+            date = extract_date_from_url_pattern(url)
+            if date:
+                yield position, {'url': url, 'date': date.strftime('%Y-%m-%d'), 'method': 'url',
+                                 'status': 'ok', 'elapsed_ms': 0}
+            else:
+                to_fetch.append((position, url))
+        if not to_fetch:
+            return
+        
+        started_at = {}
+        
+        def lookup(position, url):
+            # Waiting for a turn at the host doesn't count against the
+            # timeout; the clock starts when the download does
+            def start():
+                started_at[position] = time.monotonic()
+            
+            submitted = time.monotonic()
+            lookup = ContentScraper.lookup_date(
+                url, timeout=(min(Config.HTTP_CONNECT_TIMEOUT, timeout), timeout), on_start=start)
+            return {
+                'date': lookup['published_date'],
+                'method': lookup['date_source'],
+                'status': 'ok',
+                'elapsed_ms': int((time.monotonic() - started_at.get(position, submitted)) * 1000),
             }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
+        
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(to_fetch)))
+        try:
+            pending = {}
+            for position, url in to_fetch:
+                future = executor.submit(metrics.carry_trace(lookup), position, url)
+                pending[future] = (position, {'url': url, 'date': None, 'method': None})
             
-            soup = BeautifulSoup(response.text, 'html.parser')
+            while pending:
+                # Wake up when a lookup finishes or the oldest running one runs out of time
+                running = [started_at[position] for position, _ in pending.values() if position in started_at]
+                wait_for = min(running) + timeout - time.monotonic() if running else timeout
+                done, _ = wait(pending, timeout=max(wait_for, 0.01), return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    position, result = pending.pop(future)
+                    if future.exception() is not None:
+                        result.update({
+                            'status': 'error',
+                            'error': str(future.exception()),
+                            # Nothing was downloaded if it failed before its turn came
+                            'elapsed_ms': int((time.monotonic() - started_at[position]) * 1000) if position in started_at else 0,
+                        })
+                    else:
+                        result.update(future.result())
+                    yield position, result
+                
+                now = time.monotonic()
+                for future, (position, result) in list(pending.items()):
+                    if position in started_at and now - started_at[position] >= timeout:
+                        # Stop waiting; the fetch's own request timeout ends the thread
+                        del pending[future]
+                        result.update({
+                            'status': 'timeout',
+                            'error': f'Timed out after {timeout:g}s',
+                            'elapsed_ms': int(timeout * 1000),
+                        })
+                        yield position, result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Claude averages roughly four characters per token on English text, which is
+# close enough for budgeting without loading a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """
+    Estimate how many tokens a piece of text costs.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        int: The estimated token count
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class ContentReducer:
+    """
+    Shrinks memo input to a token budget without dropping any source.
+    
+    1. Lines repeated within or across sources (navigation, cookie banners,
+       syndicated paragraphs) are kept only once
+    2. If what is left fits the budget, it is used as is
+    3. Otherwise the budget is shared out between sources; each source that is
+       over its share is split into chunks, the chunks are summarized in
+       parallel (map), and the summaries stand in for the source. The memo
+       call itself is the reduce step.
+    """
+    
+    # Matches the "Source: <url>" header and "---" separator the pipeline puts between sources
+    SOURCE_SEPARATOR = re.compile(r'\n-{3}\n(?=Source: )')
+    SOURCE_HEADER = re.compile(r'^Source: (\S+)[ \t]*(?:\n|$)')
+    
+    # Lines shorter than this are only treated as duplicates when they appear in another source
+    MIN_DUPLICATE_CHARS = 30
+    # Rounds of summarizing before falling back to trimming
+    MAX_ROUNDS = 3
+    
+    MAP_SYSTEM_PROMPT = """You condense source material for a research analyst who will write a memo from your notes.
+Keep every fact, figure, name, date, quote, claim and caveat that could matter for the memo. Drop navigation text, adverts, repetition and filler.
+Write compact bullet points with no preamble."""
+    
+    def __init__(self, summarize, token_budget, chunk_tokens, summary_tokens, max_workers):
+        """
+        Args:
+            summarize (callable): Function (text, source label, max tokens) -> summary
+            token_budget (int): Largest number of content tokens to send to the memo call
+            chunk_tokens (int): Largest chunk sent to one summary call
+            summary_tokens (int): Largest summary one chunk may produce
+            max_workers (int): How many summary calls may run at once
+        """
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.chunk_tokens = chunk_tokens
+        self.summary_tokens = summary_tokens
+        self.max_workers = max_workers
+    
+    def split_sources(self, content):
+        """
+        Split combined content back into its sources.
+        
+        Args:
+            content (str): Text from one or more sources
             
-            # Remove script and style elements
-            for script in soup(["script", "style", "nav", "footer", "header"]):
-                script.extract()
+        Returns:
+            list: [label, lines] pairs; label is the source URL, or None for
+                content without a "Source:" header
+        """
+        sources = []
+        for block in self.SOURCE_SEPARATOR.split(content):
+            match = self.SOURCE_HEADER.match(block)
+            label = match.group(1) if match else None
+            body = block[match.end():] if match else block
+            lines = [line.strip() for line in body.splitlines() if line.strip()]
+            sources.append([label, lines])
+        return sources
+    
+    def deduplicate(self, sources):
+        """
+        Drop repeated lines in place, keeping the first copy.
+        
+        Args:
+            sources (list): [label, lines] pairs from split_sources()
             
-            # Get the title
-            title = soup.find('title').text if soup.find('title') else "No title found"
+        Returns:
+            int: How many lines were dropped
+        """
+        first_seen = {}
+        dropped = 0
+        for position, source in enumerate(sources):
+            kept = []
+            for line in source[1]:
+                key = ' '.join(line.lower().split())
+                seen_in = first_seen.get(key)
+                if seen_in is not None and (len(key) >= self.MIN_DUPLICATE_CHARS or seen_in != position):
+                    dropped += 1
+                    continue
+                first_seen.setdefault(key, position)
+                kept.append(line)
+            source[1] = kept
+        return dropped
+    
+    @staticmethod
+    def source_tokens(lines):
+        return estimate_tokens('\n'.join(lines))
+    
+    @staticmethod
+    def allocate(sizes, budget):
+        """
+        Share a token budget between sources: small sources get what they need
+        and the rest is split evenly between the large ones.
+        
+        Args:
+            sizes (list): Tokens each source needs
+            budget (int): Tokens available
             
-            # Try to find the main content
-            main_content = None
+        Returns:
+            list: Tokens allowed for each source
+        """
+        shares = [0] * len(sizes)
+        remaining = budget
+        order = sorted(range(len(sizes)), key=sizes.__getitem__)
+        for done, index in enumerate(order):
+            shares[index] = min(sizes[index], remaining // (len(sizes) - done))
+            remaining -= shares[index]
+        return shares
+    
+    def chunk(self, lines):
+        """
+        Group lines into chunks of at most chunk_tokens, splitting very long lines.
+        
+        Args:
+            lines (list): The source's lines
             
-            # Look for article tag
-            if soup.find('article'):
-                main_content = soup.find('article')
-            # Look for main tag
-            elif soup.find('main'):
-                main_content = soup.find('main')
-            # Look for div with content in id or class
-            elif soup.find('div', {'id': re.compile('content|article|main', re.I)}):
-                main_content = soup.find('div', {'id': re.compile('content|article|main', re.I)})
-            elif soup.find('div', {'class': re.compile('content|article|main', re.I)}):
-                main_content = soup.find('div', {'class': re.compile('content|article|main', re.I)})
+        Returns:
+            list: The chunks, as strings
+        """
+        max_chars = self.chunk_tokens * CHARS_PER_TOKEN
+        chunks = []
+        current = []
+        size = 0
+        for line in lines:
+            pieces = [line[start:start + max_chars] for start in range(0, len(line), max_chars)]
+            for piece in pieces:
+                if current and size + len(piece) + 1 > max_chars:
+                    chunks.append('\n'.join(current))
+                    current = []
+                    size = 0
+                current.append(piece)
+                size += len(piece) + 1
+        if current:
+            chunks.append('\n'.join(current))
+        return chunks
+    
+    def _map(self, jobs, report):
+        """
+        Summarize chunks in parallel.
+        
+        Args:
+            jobs (list): (source position, label, chunk, max tokens) tuples
+            report (dict): Token counters to update
             
-            if main_content:
-                text = main_content.get_text(separator='\n', strip=True)
-            else:
-                # Fallback to body text
-                text = soup.body.get_text(separator='\n', strip=True)
+        Returns:
+            dict: Source position to its summaries, in chunk order
+        """
+        summaries = {}
+        
+        def summarize(job):
+            position, label, text, max_tokens = job
+            try:
+                return self.summarize(text, label, max_tokens)
+            except Exception as e:
+                print(f"Error summarizing a chunk of {label or 'content'}: {e}")
+                report['map_failures'] += 1
+                # Keep the start of the chunk so the source is still represented
+                return text[:max_tokens * CHARS_PER_TOKEN]
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            for job, summary in zip(jobs, executor.map(metrics.carry_trace(summarize), jobs)):
+                report['map_calls'] += 1
+                report['map_input_tokens'] += estimate_tokens(job[2])
+                report['map_output_tokens'] += estimate_tokens(summary)
+                summaries.setdefault(job[0], []).append(summary)
+        return summaries
+    
+    def reduce(self, content):
+        """
+        Bring content within the token budget.
+        
+        Args:
+            content (str): Text from one or more sources
             
-            # Clean up the text
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
+        Returns:
+            tuple: (content to send to the memo call, report of token counts per stage)
+        """
+        started = time.monotonic()
+        sources = self.split_sources(content)
+        report = {
+            'sources': len(sources),
+            'input_tokens': estimate_tokens(content),
+            'duplicate_lines': self.deduplicate(sources),
+            'dedup_tokens': 0,
+            'map_rounds': 0,
+            'map_calls': 0,
+            'map_failures': 0,
+            'map_input_tokens': 0,
+            'map_output_tokens': 0,
+            'summarized_sources': 0,
+            'output_tokens': 0,
+        }
+        report['dedup_tokens'] = sum(self.source_tokens(lines) for _, lines in sources)
+        
+        summarized = set()
+        for _ in range(self.MAX_ROUNDS):
+            sizes = [self.source_tokens(lines) for _, lines in sources]
+            if sum(sizes) <= self.token_budget:
+                break
             
-            return f"Title: {title}\n\nContent:\n{text}"
+            # Every source over its share is summarized, chunk by chunk
+            jobs = []
+            for position, share in enumerate(self.allocate(sizes, self.token_budget)):
+                if sizes[position] <= share:
+                    continue
+                label, lines = sources[position]
+                chunks = self.chunk(lines)
+                per_chunk = max(64, min(self.summary_tokens, share // len(chunks)))
+                jobs.extend((position, label, text, per_chunk) for text in chunks)
             
-        except Exception as e:
-            return f"Error extracting webpage content: {str(e)}"
+            report['map_rounds'] += 1
+            for position, summaries in self._map(jobs, report).items():
+                sources[position][1] = [line for summary in summaries for line in summary.splitlines() if line.strip()]
+                summarized.add(position)
+        else:
+            # Still too big after summarizing: trim each source to its share
+            sizes = [self.source_tokens(lines) for _, lines in sources]
+            if sum(sizes) > self.token_budget:
+                for position, share in enumerate(self.allocate(sizes, self.token_budget)):
+                    text = '\n'.join(sources[position][1])[:share * CHARS_PER_TOKEN]
+                    sources[position][1] = text.splitlines()
+        
+        blocks = []
+        for position, (label, lines) in enumerate(sources):
+            body = '\n'.join(lines)
+            if label is None:
+                blocks.append(body)
+            elif position in summarized:
+                blocks.append(f"Source: {label} (summarized)\n\n{body}\n")
+            else:
+                blocks.append(f"Source: {label}\n\n{body}\n")
+        reduced = "\n---\n".join(blocks)
+        
+        report['summarized_sources'] = len(summarized)
+        report['output_tokens'] = estimate_tokens(reduced)
+        report['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return reduced, report
 
 
 class ClaudeAPI:
     """Class for interacting with the Claude API."""
     
+    MODEL = "claude-3-7-sonnet-20250219"
+    MAX_TOKENS = 4000
+    MESSAGES_URL = "https://api.anthropic.com/v1/messages"
+    
+    SYSTEM_PROMPT = """Your task is to compose a comprehensive company memo based on the provided key points. The memo should be written in a professional tone, addressing all the relevant information in a clear and concise manner. 
+
+Format the memo with proper Markdown formatting:
+- Use # for main headings
+- Use ## for subheadings
+- Use bullet points (- ) for lists
+- Use numbered lists (1. ) where appropriate
+- Use **bold** for emphasis
+- Organize content with clear section breaks
+
+The memo should include the following sections:
+1. **What happened** - Summarize the key facts and developments
+2. **Why is this interesting** - Explain the significance and relevance
+3. **Why we should be skeptical** - Identify potential issues, limitations, or reasons for caution
+4. **Enterprise Innovation POV** - Analyze implications for enterprise innovation
+5. **Next Steps** - Recommend 3-5 concrete actions
+6. **Relevant Risks** - List 4-6 key risks to consider
+
+Make the memo visually structured and easy to scan. Do NOT include a disclaimer at the end about the memo being based on publicly available information."""
+    
     def __init__(self, api_key=None):
         """
         Initialize the Claude API client.
@@ -150,15 +1021,31 @@ class ClaudeAPI:
         if not self.api_key:
             raise ValueError("Claude API key is not configured")
         
-        # Create a custom HTTP client without proxies
+        # Time-to-first-token for streamed memos in this process
+        self._stats_lock = threading.Lock()
+        self._stream_stats = {'streams': 0, 'ttft_ms_last': None, 'ttft_ms_total': 0, 'ttft_ms_max': 0}
+        
+        # Long input is condensed before the memo call instead of being cut off
+        self.reducer = ContentReducer(
+            self.summarize_chunk,
+            token_budget=Config.MEMO_INPUT_TOKEN_BUDGET,
+            chunk_tokens=Config.MEMO_CHUNK_TOKENS,
+            summary_tokens=Config.MEMO_SUMMARY_TOKENS,
+            max_workers=Config.MEMO_MAP_WORKERS,
+        )
+        self._reduction_stats = {'memos': 0, 'last': None}
+        for counter in ('input_tokens', 'dedup_tokens', 'map_calls', 'map_input_tokens', 'map_output_tokens', 'output_tokens'):
+            self._reduction_stats[counter] = 0
+        
+        # The SDK takes over a second to import, so it's only loaded once a
+        # ClaudeAPI is actually created (see resources.py)
+        from anthropic import Anthropic
+        
+        # Use the shared keep-alive HTTP client instead of letting the SDK make its own
         try:
-            # Create a basic httpx client without any extra parameters
-            http_client = httpx.Client(timeout=60.0)
-            
-            # Initialize Anthropic with the custom client
             self.client = Anthropic(
                 api_key=self.api_key,
-                http_client=http_client
+                http_client=http_client.get_httpx_client()
             )
             print("Anthropic client initialized successfully")
         except Exception as e:
@@ -166,46 +1053,122 @@ class ClaudeAPI:
             # Fallback to basic initialization
             self.client = Anthropic(api_key=self.api_key)
     
-    def _direct_api_request(self, system_prompt, user_prompt):
+    def _api_headers(self):
+        return {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01"
+        }
+    
+    def _direct_api_request(self, system_prompt, user_prompt, max_tokens=None):
         """
         Make a direct HTTP request to the Anthropic API without using the SDK.
         
         Args:
             system_prompt (str): The system prompt
             user_prompt (str): The user prompt
+            max_tokens (int, optional): Longest answer to allow. Defaults to MAX_TOKENS.
             
         Returns:
             str: The generated text or error message
         """
         try:
-            url = "https://api.anthropic.com/v1/messages"
-            headers = {
-                "Content-Type": "application/json",
-                "x-api-key": self.api_key,
-                "anthropic-version": "2023-06-01"
-            }
-            
             data = {
-                "model": "claude-3-7-sonnet-20250219",
-                "max_tokens": 4000,
+                "model": self.MODEL,
+                "max_tokens": max_tokens or self.MAX_TOKENS,
                 "system": system_prompt,
                 "messages": [
                     {"role": "user", "content": user_prompt}
                 ]
             }
             
-            response = requests.post(url, headers=headers, json=data)
+            response = http_client.post(
+                self.MESSAGES_URL,
+                headers=self._api_headers(),
+                json=data,
+                timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.CLAUDE_READ_TIMEOUT)
+            )
             response.raise_for_status()
             
             result = response.json()
             return result.get("content", [{}])[0].get("text", "No response generated")
             
         except Exception as e:
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            metrics.inc(metrics.UPSTREAM_ERRORS, upstream='claude', reason=str(status) if status else type(e).__name__)
             return f"Error with direct API request: {str(e)}"
     
-    def generate_memo(self, content, research_task, context="", theme=""):
+    def summarize_chunk(self, text, label, max_tokens):
         """
-        Generate a research memo using Claude 3.7.
+        Condense one chunk of a source (the map step of content reduction).
+        
+        Summaries are cached, so a source that shows up in several memos is
+        only summarized once.
+        
+        Args:
+            text (str): The chunk
+            label (str): The source URL, or None
+            max_tokens (int): Longest summary to allow
+            
+        Returns:
+            str: The summary
+            
+        Raises:
+            RuntimeError: If the API call fails
+        """
+        payload = json.dumps([self.MODEL, max_tokens, ContentReducer.MAP_SYSTEM_PROMPT, text])
+        key = "summary:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        
+        def fetch(stale_entry):
+            user_prompt = f"SOURCE: {label or 'provided content'}\n\n{text}"
+            with metrics.stage('claude.summarize', source=label):
+                summary = self._direct_api_request(ContentReducer.MAP_SYSTEM_PROMPT, user_prompt, max_tokens=max_tokens)
+                if summary.startswith('Error'):
+                    raise RuntimeError(summary)
+            return {'value': summary}
+        
+        return memo_cache.get_or_fetch(key, fetch)
+    
+    def reduce_content(self, content):
+        """
+        Fit memo input into Config.MEMO_INPUT_TOKEN_BUDGET, recording the token counts.
+        
+        Args:
+            content (str): The content to analyze
+            
+        Returns:
+            str: The content to put in the memo prompt
+        """
+        reduced, report = self.reducer.reduce(content)
+        print(
+            f"Memo input: {report['sources']} source(s), {report['input_tokens']} tokens, "
+            f"{report['dedup_tokens']} after removing {report['duplicate_lines']} duplicate lines, "
+            f"{report['map_calls']} chunk summaries ({report['map_input_tokens']} -> {report['map_output_tokens']} tokens), "
+            f"{report['output_tokens']} sent to the memo call"
+        )
+        with self._stats_lock:
+            stats = self._reduction_stats
+            stats['memos'] += 1
+            stats['last'] = report
+            for counter in ('input_tokens', 'dedup_tokens', 'map_calls', 'map_input_tokens', 'map_output_tokens', 'output_tokens'):
+                stats[counter] += report[counter]
+        return reduced
+    
+    def reduction_stats(self):
+        """
+        Get token counts for each content reduction stage in this process.
+        
+        Returns:
+            dict: Totals across memos, plus the report for the latest memo
+        """
+        with self._stats_lock:
+            return dict(self._reduction_stats)
+    
+    def build_prompts(self, content, research_task, context="", theme=""):
+        """
+        Build the system and user prompts for a research memo.
+        
+        The content should already have been through reduce_content().
         
         Args:
             content (str): The content to analyze
@@ -214,38 +1177,14 @@ class ClaudeAPI:
             theme (str, optional): The theme or category
             
         Returns:
-            str: The generated memo
+            tuple: (system prompt, user prompt)
         """
-        if not self.api_key:
-            return "Error: Claude API key is not configured."
-        
-        try:
-            system_prompt = """Your task is to compose a comprehensive company memo based on the provided key points. The memo should be written in a professional tone, addressing all the relevant information in a clear and concise manner. 
-
-Format the memo with proper Markdown formatting:
-- Use # for main headings
-- Use ## for subheadings
-- Use bullet points (- ) for lists
-- Use numbered lists (1. ) where appropriate
-- Use **bold** for emphasis
-- Organize content with clear section breaks
-
-The memo should include the following sections:
-1. **What happened** - Summarize the key facts and developments
-2. **Why is this interesting** - Explain the significance and relevance
-3. **Why we should be skeptical** - Identify potential issues, limitations, or reasons for caution
-4. **Enterprise Innovation POV** - Analyze implications for enterprise innovation
-5. **Next Steps** - Recommend 3-5 concrete actions
-6. **Relevant Risks** - List 4-6 key risks to consider
-
-Make the memo visually structured and easy to scan. Do NOT include a disclaimer at the end about the memo being based on publicly available information."""
+        # Check if context contains persona information
+        persona_context = ""
+        if "This memo is prepared for" in context:
+            persona_context = "Pay special attention to the persona information in the context section. Tailor your memo to address their specific interests, position, and background."
 
-            # Check if context contains persona information
-            persona_context = ""
-            if "This memo is prepared for" in context:
-                persona_context = "Pay special attention to the persona information in the context section. Tailor your memo to address their specific interests, position, and background."
-
-            user_prompt = f"""
+        user_prompt = f"""
 I need you to create a structured research memo based on the following information:
 
 RESEARCH TASK: {research_task}
@@ -255,7 +1194,7 @@ THEME: {theme}
 CONTEXT: {context}
 
 CONTENT TO ANALYZE:
-{content[:50000]}  # Limit content to avoid token limits
+{content}
 
 {persona_context}
 
@@ -263,21 +1202,196 @@ Please be concise, factual, and analytical in your memo. Use proper Markdown for
 
 DO NOT include a disclaimer at the end about the memo being based on publicly available information.
 """
+        return self.SYSTEM_PROMPT, user_prompt
+    
+    def memo_cache_key(self, content, research_task, context="", theme=""):
+        """
+        Build the memo cache key for a set of inputs.
+        
+        The key is a hash of the inputs (with whitespace runs collapsed, so
+        cosmetic differences still hit), the system prompt, the model and the
+        token limit, so changing any of those never returns an old memo.
+        
+        Args:
+            content (str): The content to analyze
+            research_task (str): The research task description
+            context (str, optional): Additional context
+            theme (str, optional): The theme or category
+            
+        Returns:
+            str: The cache key
+        """
+        inputs = [' '.join(str(value).split()) for value in (content, research_task, context, theme)]
+        payload = json.dumps({
+            'model': self.MODEL,
+            'max_tokens': self.MAX_TOKENS,
+            'system': self.SYSTEM_PROMPT,
+            'inputs': inputs,
+        })
+        return "memo:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def cached_memo(self, content, research_task, context="", theme=""):
+        """
+        Get a previously generated memo for these inputs, if there is a fresh one.
+        
+        Returns:
+            str: The cached memo, or None
+        """
+        return memo_cache.get_value(self.memo_cache_key(content, research_task, context, theme))
+    
+    def remember_memo(self, content, research_task, context, theme, memo):
+        """Store a finished memo in the cache (errors are never cached)."""
+        if memo and not memo.startswith('Error'):
+            memo_cache.set(self.memo_cache_key(content, research_task, context, theme), memo)
+    
+    def generate_memo(self, content, research_task, context="", theme="", cache=True):
+        """
+        Generate a research memo using Claude 3.7.
+        
+        Identical requests share one memo: a cached memo is returned when there
+        is one, and concurrent identical requests wait for a single generation.
+        
+        Args:
+            content (str): The content to analyze
+            research_task (str): The research task description
+            context (str, optional): Additional context
+            theme (str, optional): The theme or category
+            cache (bool, optional): Set to False to always generate a fresh memo
+                (which then replaces the cached one)
+            
+        Returns:
+            str: The generated memo
+        """
+        if not self.api_key:
+            return "Error: Claude API key is not configured."
+        
+        with metrics.stage('claude.memo') as span:
+            if not cache:
+                span['cache'] = 'bypass'
+                memo = self._generate_memo(content, research_task, context, theme)
+                self.remember_memo(content, research_task, context, theme, memo)
+                return memo
+            
+            span['cache'] = 'hit'
+            
+            def fetch(stale_entry):
+                span['cache'] = 'miss'
+                memo = self._generate_memo(content, research_task, context, theme)
+                return {'value': memo, 'cache': not memo.startswith('Error')}
+            
+            memo = memo_cache.get_or_fetch(self.memo_cache_key(content, research_task, context, theme), fetch)
+            if memo.startswith('Error'):
+                span['outcome'] = 'error'
+            return memo
+    
+    def _generate_memo(self, content, research_task, context, theme):
+        """Ask Claude for a memo, without looking at the cache."""
+        try:
+            with metrics.stage('claude.reduce'):
+                content = self.reduce_content(content)
+            system_prompt, user_prompt = self.build_prompts(content, research_task, context, theme)
 
-            try:
-                # For Anthropic 0.5.0, use the completion API
-                response = self.client.completions.create(
-                    model="claude-3-7-sonnet-20250219",
-                    prompt=f"{system_prompt}\n\n{user_prompt}",
-                    max_tokens_to_sample=4000,
-                )
-                
-                return response.completion
-            except Exception as e:
-                print(f"Error with completions API: {e}")
-                # Skip the client.completion attempt and go straight to direct API request
-                print("Falling back to direct API request")
-                return self._direct_api_request(system_prompt, user_prompt)
+            with metrics.stage('claude.generate') as span:
+                try:
+                    # For Anthropic 0.5.0, use the completion API
+                    response = self.client.completions.create(
+                        model=self.MODEL,
+                        prompt=f"{system_prompt}\n\n{user_prompt}",
+                        max_tokens_to_sample=self.MAX_TOKENS,
+                    )
+                    
+                    return response.completion
+                except Exception as e:
+                    print(f"Error with completions API: {e}")
+                    metrics.inc(metrics.RETRIES, layer='claude', reason='messages_api_fallback')
+                    # Skip the client.completion attempt and go straight to direct API request
+                    print("Falling back to direct API request")
+                    memo = self._direct_api_request(system_prompt, user_prompt)
+                    if memo.startswith('Error'):
+                        span['outcome'] = 'error'
+                    return memo
             
         except Exception as e:
-            return f"Error generating memo with Claude API: {str(e)}"
\ No newline at end of file
+            return f"Error generating memo with Claude API: {str(e)}"
+    
+    def stream_memo(self, content, research_task, context="", theme=""):
+        """
+        Generate a research memo, yielding the text as soon as Claude writes it.
+        
+        Uses the streaming Messages API directly and records the time to the
+        first token in stream_stats().
+        
+        Args:
+            content (str): The content to analyze
+            research_task (str): The research task description
+            context (str, optional): Additional context
+            theme (str, optional): The theme or category
+            
+        Yields:
+            str: The next piece of memo text
+            
+        Raises:
+            RuntimeError: If the API reports an error part-way through
+            requests.RequestException: If the request itself fails
+        """
+        with metrics.stage('claude.reduce'):
+            content = self.reduce_content(content)
+        system_prompt, user_prompt = self.build_prompts(content, research_task, context, theme)
+        data = {
+            "model": self.MODEL,
+            "max_tokens": self.MAX_TOKENS,
+            "system": system_prompt,
+            "messages": [
+                {"role": "user", "content": user_prompt}
+            ],
+            "stream": True
+        }
+        
+        started = time.monotonic()
+        first_token = True
+        with metrics.stage('claude.stream', upstream='claude') as span, http_client.stream(
+            'POST',
+            self.MESSAGES_URL,
+            headers=self._api_headers(),
+            json=data,
+            timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.CLAUDE_READ_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            response.encoding = 'utf-8'
+            
+            # The API sends Server-Sent Events; the JSON payload is on the data: lines
+            for line in response.iter_lines(chunk_size=1024, decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[len('data:'):])
+                
+                if event.get('type') == 'content_block_delta' and event['delta'].get('type') == 'text_delta':
+                    if first_token:
+                        first_token = False
+                        span['ttft_ms'] = round((time.monotonic() - started) * 1000, 1)
+                        self._record_ttft(span['ttft_ms'])
+                    yield event['delta']['text']
+                elif event.get('type') == 'error':
+                    raise RuntimeError(event.get('error', {}).get('message', 'Unknown streaming error'))
+    
+    def _record_ttft(self, ttft_ms):
+        print(f"Memo stream first token after {ttft_ms:.0f} ms")
+        with self._stats_lock:
+            stats = self._stream_stats
+            stats['streams'] += 1
+            stats['ttft_ms_last'] = round(ttft_ms, 1)
+            stats['ttft_ms_total'] += ttft_ms
+            stats['ttft_ms_max'] = max(stats['ttft_ms_max'], round(ttft_ms, 1))
+    
+    def stream_stats(self):
+        """
+        Get time-to-first-token figures for streamed memos in this process.
+        
+        Returns:
+            dict: Stream count and the last, average and maximum TTFT in milliseconds
+        """
+        with self._stats_lock:
+            stats = dict(self._stream_stats)
+        total = stats.pop('ttft_ms_total')
+        stats['ttft_ms_avg'] = round(total / stats['streams'], 1) if stats['streams'] else None
+        return stats
@@ -0,0 +1,194 @@
+"""
+Full-Text Search Index Module
+
+An inverted index over the text fields of our trends, used by
+/api/trends/filter instead of scanning every memo on every search.
+
+1. Text is split into lower-case word tokens; each token keeps a weighted
+   count per trend (a match in the research task counts more than one deep
+   in the analysis)
+2. Every query word must match (AND), and each word also matches longer
+   words it is the start of, so "quant" finds "quantum" while the user is
+   still typing
+3. Results are ranked with BM25
+
+The index is updated one trend at a time as trends are added, changed or
+removed, so it never has to be rebuilt for a single write.
+"""
+
+import re
+import math
+import bisect
+import threading
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+# How much a word counts in each field
+FIELD_WEIGHTS = {
+    'research_task': 3.0,
+    'theme': 2.0,
+    'context': 1.5,
+    'analysis': 1.0,
+}
+
+
+def tokenize(text):
+    """
+    Split text into lower-case word tokens.
+
+    Args:
+        text (str): The text to split. Anything that isn't a string counts as empty.
+
+    Returns:
+        list: The tokens, in order
+    """
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """An incrementally maintained inverted index with BM25 ranking."""
+
+    def __init__(self, field_weights=None, k1=1.2, b=0.75):
+        """
+        Args:
+            field_weights (dict, optional): Field name to weight. Defaults to FIELD_WEIGHTS.
+            k1 (float, optional): BM25 term frequency saturation
+            b (float, optional): BM25 document length normalization
+        """
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self.k1 = k1
+        self.b = b
+
+        self._postings = {}       # term -> {doc_id: weighted term frequency}
+        self._doc_terms = {}      # doc_id -> terms in that document, for removal
+        self._doc_lengths = {}    # doc_id -> weighted document length
+        self._total_length = 0.0
+        self._vocabulary = []     # every term, sorted, for prefix lookups
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def clear(self):
+        """Remove every document from the index."""
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+            self._vocabulary = []
+
+    def add(self, doc_id, trend):
+        """
+        Index a trend, replacing any earlier version with the same ID.
+
+        Args:
+            doc_id: The trend's ID
+            trend (dict): The trend data
+        """
+        frequencies = {}
+        length = 0.0
+        for field, weight in self.field_weights.items():
+            for token in tokenize(trend.get(field)):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+                length += weight
+
+        with self._lock:
+            self.remove(doc_id)
+            for token, frequency in frequencies.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                postings[doc_id] = frequency
+            self._doc_terms[doc_id] = list(frequencies)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+
+    def remove(self, doc_id):
+        """
+        Take a trend out of the index. Unknown IDs are ignored.
+
+        Args:
+            doc_id: The trend's ID
+        """
+        with self._lock:
+            terms = self._doc_terms.pop(doc_id, None)
+            if terms is None:
+                return
+            self._total_length -= self._doc_lengths.pop(doc_id)
+            for token in terms:
+                postings = self._postings[token]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    def _expand(self, prefix):
+        """Every indexed term that starts with the prefix."""
+        vocabulary = self._vocabulary
+        position = bisect.bisect_left(vocabulary, prefix)
+        terms = []
+        while position < len(vocabulary) and vocabulary[position].startswith(prefix):
+            terms.append(vocabulary[position])
+            position += 1
+        return terms
+
+    def search(self, query):
+        """
+        Find the trends matching every word of a query, best match first.
+
+        Args:
+            query (str): The search text
+
+        Returns:
+            list: (doc_id, score) pairs sorted by descending BM25 score
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            document_count = len(self._doc_lengths)
+            if not document_count:
+                return []
+            average_length = self._total_length / document_count
+
+            # Each query word matches its own term and any longer term it starts
+            expansions = [self._expand(term) for term in query_terms]
+            if not all(expansions):
+                return []
+
+            # AND: start from the rarest query word and narrow down
+            matching_sets = []
+            for terms in expansions:
+                docs = set()
+                for term in terms:
+                    docs.update(self._postings[term])
+                matching_sets.append(docs)
+            matching_sets.sort(key=len)
+            candidates = matching_sets[0].intersection(*matching_sets[1:])
+
+            k1 = self.k1
+            b = self.b
+            norms = {
+                doc_id: k1 * (1 - b + b * self._doc_lengths[doc_id] / average_length)
+                for doc_id in candidates
+            }
+            scores = dict.fromkeys(candidates, 0.0)
+            for terms in expansions:
+                for term in terms:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    if len(postings) < len(candidates):
+                        matched = [doc_id for doc_id in postings if doc_id in norms]
+                    else:
+                        matched = [doc_id for doc_id in candidates if doc_id in postings]
+                    for doc_id in matched:
+                        frequency = postings[doc_id]
+                        scores[doc_id] += idf * frequency * (k1 + 1) / (frequency + norms[doc_id])
+
+        # Break ties by ID so the order doesn't change between requests
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
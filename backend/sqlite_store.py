@@ -0,0 +1,355 @@
+"""
+SQLite Trend Store Module
+
+Keeps the trends in a local SQLite database when Firestore isn't available,
+instead of re-reading and rewriting a whole CSV file on every change:
+1. Every trend has a stable ID (the same one Firestore would give it), so
+   IDs don't shift when another trend is deleted
+2. Each write changes one row in its own transaction, so workers writing at
+   the same time can't overwrite each other's changes
+3. WAL mode lets readers carry on while another worker is writing
+4. Trends are indexed by theme and date_discovered
+5. Every write bumps a revision number, so the trend repository can cheaply
+   tell that another worker changed something and read just those changes
+
+Each trend is stored as JSON, so lists (news_links) and dicts (persona) come
+back as they went in. An existing CSV file is imported once, when the
+database is first created, or on demand with:
+    python sqlite_store.py migrate [csv_path]
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing
+from firestore_store import trend_document_id
+from csv_store import read_csv_trends
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trends (
+    id TEXT PRIMARY KEY,
+    theme TEXT NOT NULL DEFAULT '',
+    date_discovered TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    revision INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trends_theme_date ON trends (theme COLLATE NOCASE, date_discovered);
+CREATE INDEX IF NOT EXISTS trends_date ON trends (date_discovered);
+CREATE INDEX IF NOT EXISTS trends_revision ON trends (revision);
+CREATE TABLE IF NOT EXISTS deleted_trends (
+    id TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deleted_trends_revision ON deleted_trends (revision);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('revision', '0');
+"""
+
+
+def _text(value):
+    """A field value as text for the indexed columns ('' when missing)."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    return str(value)
+
+
+class SQLiteTrendStore:
+    """The trends, stored in a local SQLite database shared by every worker on the machine."""
+
+    def __init__(self, db_path, csv_path=None):
+        """
+        Args:
+            db_path (str): The SQLite database file (created if it doesn't exist)
+            csv_path (str, optional): A CSV file to import the first time the
+                database is created
+        """
+        self.db_path = db_path
+        self.csv_path = csv_path
+        self._schema_ready = False
+
+    # Database
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection:
+            # WAL lets reads carry on while another worker is writing
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        self._schema_ready = True
+        if self.csv_path:
+            self._import_csv_once()
+
+    def _execute(self, sql, parameters=()):
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(sql, parameters)
+            return cursor.fetchall(), cursor.rowcount
+
+    def _write(self, change):
+        """
+        Run ``change(connection, revision)`` in one transaction under a new revision number.
+
+        The revision number is only used up if ``change`` actually changed something.
+
+        Returns:
+            Whatever ``change`` returned
+        """
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                revision = self._revision(connection) + 1
+                changes_before = connection.total_changes
+                result = change(connection, revision)
+                if connection.total_changes != changes_before:
+                    connection.execute(
+                        "UPDATE store_meta SET value = ? WHERE key = 'revision'", (str(revision),)
+                    )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return result
+
+    @staticmethod
+    def _put_row(connection, trend, revision):
+        trend_id = trend_document_id(trend)
+        data = {key: value for key, value in trend.items() if key != 'id'}
+        connection.execute(
+            'INSERT INTO trends (id, theme, date_discovered, data, revision) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET theme = excluded.theme, '
+            'date_discovered = excluded.date_discovered, data = excluded.data, revision = excluded.revision',
+            (trend_id, _text(trend.get('theme')), _text(trend.get('date_discovered')),
+             json.dumps(data, default=str), revision)
+        )
+        connection.execute('DELETE FROM deleted_trends WHERE id = ?', (trend_id,))
+        return trend_id
+
+    @staticmethod
+    def _trend(row):
+        return {**json.loads(row['data']), 'id': row['id']}
+
+    # Migration
+
+    def _import_csv_once(self):
+        """Import the CSV file if this database has never imported it (or anything else)."""
+        if not os.path.exists(self.csv_path):
+            return
+        rows, _ = self._execute("SELECT value FROM store_meta WHERE key = 'csv_imported'")
+        if rows:
+            return
+        try:
+            trends = read_csv_trends(self.csv_path)
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"Error reading {self.csv_path} for import: {e}")
+            return
+
+        def change(connection, revision):
+            # Another worker may have imported it while we were reading the file
+            if connection.execute("SELECT 1 FROM store_meta WHERE key = 'csv_imported'").fetchone():
+                return 0
+            if connection.execute('SELECT 1 FROM trends LIMIT 1').fetchone() is None:
+                for trend in trends:
+                    self._put_row(connection, trend, revision)
+            connection.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('csv_imported', ?)",
+                (json.dumps({'path': self.csv_path, 'trends': len(trends), 'at': time.time()}),)
+            )
+            return len(trends)
+
+        imported = self._write(change)
+        if imported:
+            print(f"Imported {imported} trends from {self.csv_path} into {self.db_path}")
+
+    def import_trends(self, trends):
+        """
+        Add or replace many trends in one transaction.
+
+        Args:
+            trends (iterable): The trend dicts
+
+        Returns:
+            list: Their IDs, in the same order
+        """
+        trends = list(trends)
+        return self._write(lambda connection, revision: [
+            self._put_row(connection, trend, revision) for trend in trends
+        ])
+
+    # Reads
+
+    def all(self):
+        """
+        Get every trend.
+
+        Returns:
+            tuple: (OrderedDict of ID -> trend in the order they were added, revision)
+        """
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            # One read transaction, so the trends and the revision match
+            connection.execute('BEGIN')
+            rows = connection.execute('SELECT id, data FROM trends ORDER BY rowid').fetchall()
+            revision = self._revision(connection)
+            connection.execute('COMMIT')
+        return OrderedDict((row['id'], self._trend(row)) for row in rows), revision
+
+    def get(self, trend_id):
+        """
+        Get a single trend.
+
+        Args:
+            trend_id (str): The trend's ID
+
+        Returns:
+            dict: The trend, or None if there isn't one with that ID
+        """
+        rows, _ = self._execute('SELECT id, data FROM trends WHERE id = ?', (str(trend_id),))
+        return self._trend(rows[0]) if rows else None
+
+    @staticmethod
+    def _revision(connection):
+        return int(connection.execute("SELECT value FROM store_meta WHERE key = 'revision'").fetchone()['value'])
+
+    def revision(self):
+        """The number of the latest write; it changes whenever any worker changes a trend."""
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            return self._revision(connection)
+
+    def changes_since(self, revision):
+        """
+        Get what changed after a given revision.
+
+        Args:
+            revision (int): The revision the caller last saw
+
+        Returns:
+            tuple: (trends added or changed, IDs deleted, the current revision)
+        """
+        self._ensure_schema()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN')
+            rows = connection.execute(
+                'SELECT id, data FROM trends WHERE revision > ? ORDER BY rowid', (revision,)
+            ).fetchall()
+            deleted = [row['id'] for row in connection.execute(
+                'SELECT id FROM deleted_trends WHERE revision > ?', (revision,)
+            )]
+            current = self._revision(connection)
+            connection.execute('COMMIT')
+        return [self._trend(row) for row in rows], deleted, current
+
+    # Writes
+
+    def upsert(self, trend):
+        """
+        Create or replace a single trend.
+
+        Args:
+            trend (dict): The trend data (its 'id' is used if it has one)
+
+        Returns:
+            str: The trend's ID
+        """
+        return self._write(lambda connection, revision: self._put_row(connection, trend, revision))
+
+    def update(self, trend_id, change):
+        """
+        Change a single trend, with no other write in between reading and saving it.
+
+        Args:
+            trend_id (str): The trend's ID
+            change (callable): Takes the current trend and returns the new one
+
+        Returns:
+            dict: The saved trend, or None if there isn't one with that ID
+        """
+        def update_row(connection, revision):
+            row = connection.execute('SELECT id, data FROM trends WHERE id = ?', (str(trend_id),)).fetchone()
+            if row is None:
+                return None
+            trend = {**change(self._trend(row)), 'id': row['id']}
+            self._put_row(connection, trend, revision)
+            return trend
+
+        return self._write(update_row)
+
+    def delete(self, trend_id):
+        """
+        Delete a single trend.
+
+        Args:
+            trend_id (str): The trend's ID
+
+        Returns:
+            bool: Whether there was a trend with that ID
+        """
+        def delete_row(connection, revision):
+            deleted = connection.execute('DELETE FROM trends WHERE id = ?', (str(trend_id),)).rowcount
+            if deleted:
+                connection.execute(
+                    'INSERT OR REPLACE INTO deleted_trends (id, revision) VALUES (?, ?)', (str(trend_id), revision)
+                )
+            return bool(deleted)
+
+        return self._write(delete_row)
+
+    def stats(self):
+        """
+        Describe the database, for monitoring.
+
+        Returns:
+            dict: Trend count, revision and file size
+        """
+        rows, _ = self._execute('SELECT COUNT(*) AS trends FROM trends')
+        try:
+            size = os.path.getsize(self.db_path)
+        except OSError:
+            size = None
+        return {'path': self.db_path, 'trends': rows[0]['trends'], 'revision': self.revision(), 'bytes': size}
+
+
+def main(argv):
+    """Import a CSV file of trends: python sqlite_store.py migrate [csv_path] [db_path]"""
+    from config import Config
+
+    if not argv or argv[0] != 'migrate':
+        print(main.__doc__)
+        return 2
+    csv_path = argv[1] if len(argv) > 1 else Config.TRENDS_FILE
+    db_path = argv[2] if len(argv) > 2 else Config.TRENDS_DB_PATH
+    if not os.path.exists(csv_path):
+        print(f"{csv_path} doesn't exist")
+        return 1
+
+    store = SQLiteTrendStore(db_path)
+    trends = read_csv_trends(csv_path)
+    ids = store.import_trends(trends)
+    store._execute(
+        "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('csv_imported', ?)",
+        (json.dumps({'path': csv_path, 'trends': len(trends), 'at': time.time()}),)
+    )
+    print(f"Imported {len(trends)} rows from {csv_path} into {db_path} "
+          f"({len(set(ids))} trends; rows with the same fields share an ID)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,224 @@
+"""
+Tests for feed ingestion: a FeedPoller polling RSS and Atom fixtures served
+from a local HTTP server, with a list standing in for the job queue.
+"""
+
+import json
+import time
+import threading
+import http.server
+
+import pytest
+
+from config import Config
+from feeds import FeedPoller
+
+
+def rss(items):
+    """An RSS 2.0 feed of (guid, title) pairs, newest first."""
+    entries = ''.join(
+        f"<item><title>{title}</title><link>/articles/{guid}</link><guid>{guid}</guid>"
+        f"<pubDate>Mon, 03 Mar 2025 09:00:00 GMT</pubDate></item>"
+        for guid, title in items
+    )
+    return f"<?xml version='1.0'?><rss version='2.0'><channel><title>Fixture</title>{entries}</channel></rss>".encode()
+
+
+def atom(items):
+    """An Atom feed of (id, title) pairs, newest first."""
+    entries = ''.join(
+        f"<entry><id>urn:fixture:{entry_id}</id><title>{title}</title>"
+        f"<link rel='alternate' href='/posts/{entry_id}'/><updated>2025-03-03T09:00:00Z</updated></entry>"
+        for entry_id, title in items
+    )
+    return f"<?xml version='1.0'?><feed xmlns='http://www.w3.org/2005/Atom'><title>Fixture</title>{entries}</feed>".encode()
+
+
+class FeedServer:
+    """Serves feed bodies by path, answering 304 to a matching If-None-Match."""
+
+    def __init__(self):
+        self.feeds = {}
+        self.etags = {}
+        self.requests = []
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get('If-None-Match')))
+                body = server.feeds.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = server.etags.get(self.path)
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/xml')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self._server.server_address[1]}{path}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    feed_server = FeedServer()
+    yield feed_server
+    feed_server.stop()
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    # Poll the local server as fast as the tests like, without robots.txt
+    monkeypatch.setattr(Config, 'ROBOTS_TXT_ENABLED', False)
+    monkeypatch.setattr(Config, 'HOST_RATE_PER_SECOND', 1000.0)
+    monkeypatch.setattr(Config, 'HOST_MAX_RATE_PER_SECOND', 1000.0)
+    monkeypatch.setattr(Config, 'FEED_BACKFILL_ITEMS', 3)
+    monkeypatch.setattr(Config, 'FEED_MAX_ITEMS_PER_POLL', 20)
+    return monkeypatch
+
+
+class Queue:
+    """Stands in for the job queue, recording every payload it's given."""
+
+    def __init__(self):
+        self.payloads = []
+        self.fail_next = 0
+
+    def submit(self, payload):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError('job queue unavailable')
+        self.payloads.append(payload)
+        return {'id': f"job-{len(self.payloads)}"}
+
+    def links(self):
+        return [payload['urls'][0] for payload in self.payloads]
+
+
+def make_poller(tmp_path, feeds, queue):
+    feeds_file = tmp_path / 'feeds.json'
+    feeds_file.write_text(json.dumps(feeds))
+    poller = FeedPoller(str(tmp_path / 'feeds.sqlite3'), str(feeds_file), queue.submit, workers=2)
+    poller.sync_feeds(force=True)
+    return poller
+
+
+def poll(poller):
+    """Make every feed due now and poll them once."""
+    poller._execute('UPDATE feeds SET next_poll_at = 0')
+    return {result['url']: result for result in poller.poll_due()}
+
+
+def test_first_poll_queues_only_the_newest_items_oldest_first(tmp_path, server, settings):
+    server.feeds['/rss'] = rss([(f"item-{number}", f"Story {number}") for number in range(5, 0, -1)])
+    queue = Queue()
+    poller = make_poller(tmp_path, [{'url': server.url('/rss'), 'theme': 'AI'}], queue)
+
+    result = poll(poller)[server.url('/rss')]
+
+    assert result == {'url': server.url('/rss'), 'status': 'ok', 'new_items': 5, 'queued': 3}
+    assert queue.links() == [server.url(f"/articles/item-{number}") for number in (3, 4, 5)]
+    assert queue.payloads[-1]['theme'] == 'AI'
+    assert queue.payloads[-1]['research_task'] == 'Story 5'
+
+
+def test_repoll_queues_only_items_not_seen_before(tmp_path, server, settings):
+    server.feeds['/rss'] = rss([('b', 'Second'), ('a', 'First')])
+    queue = Queue()
+    poller = make_poller(tmp_path, [{'url': server.url('/rss')}], queue)
+    poll(poller)
+    assert len(queue.payloads) == 2
+
+    assert poll(poller)[server.url('/rss')]['queued'] == 0
+
+    # Reordered, with one new item
+    server.feeds['/rss'] = rss([('a', 'First'), ('c', 'Third'), ('b', 'Second')])
+    result = poll(poller)[server.url('/rss')]
+    assert (result['new_items'], result['queued']) == (1, 1)
+    assert queue.links()[-1] == server.url('/articles/c')
+
+
+def test_atom_entries_are_queued(tmp_path, server, settings):
+    server.feeds['/atom'] = atom([('two', 'Atom two'), ('one', 'Atom one')])
+    queue = Queue()
+    poller = make_poller(tmp_path, [{'url': server.url('/atom'), 'research_task': 'What changed?'}], queue)
+
+    poll(poller)
+
+    assert queue.links() == [server.url('/posts/one'), server.url('/posts/two')]
+    assert all(payload['research_task'] == 'What changed?' for payload in queue.payloads)
+
+
+def test_unchanged_feed_is_a_conditional_get(tmp_path, server, settings):
+    server.feeds['/rss'] = rss([('a', 'First')])
+    server.etags['/rss'] = '"v1"'
+    queue = Queue()
+    poller = make_poller(tmp_path, [{'url': server.url('/rss')}], queue)
+    poll(poller)
+
+    result = poll(poller)[server.url('/rss')]
+
+    assert result['status'] == 'not_modified'
+    assert server.requests[-1] == ('/rss', '"v1"')
+    assert len(queue.payloads) == 1
+    rows, _ = poller._execute('SELECT not_modified, polls FROM feeds')
+    assert (rows[0]['not_modified'], rows[0]['polls']) == (1, 2)
+
+    # A new version is fetched and read again
+    server.feeds['/rss'] = rss([('b', 'Second'), ('a', 'First')])
+    server.etags['/rss'] = '"v2"'
+    assert poll(poller)[server.url('/rss')]['queued'] == 1
+
+
+def test_item_that_failed_to_queue_is_queued_on_the_next_poll(tmp_path, server, settings):
+    server.feeds['/rss'] = rss([('a', 'First')])
+    # With an ETag, the next poll must not be answered with a 304
+    server.etags['/rss'] = '"v1"'
+    queue = Queue()
+    queue.fail_next = 1
+    poller = make_poller(tmp_path, [{'url': server.url('/rss')}], queue)
+
+    assert poll(poller)[server.url('/rss')]['queued'] == 0
+    assert poll(poller)[server.url('/rss')]['queued'] == 1
+    assert queue.links() == [server.url('/articles/a')]
+
+
+def test_items_still_listed_are_never_forgotten(tmp_path, server, settings):
+    # More items than fit in one SQL statement's parameters
+    items = [(f"item-{number}", f"Story {number}") for number in range(1200, 0, -1)]
+    server.feeds['/rss'] = rss(items)
+    queue = Queue()
+    poller = make_poller(tmp_path, [{'url': server.url('/rss')}], queue)
+    poll(poller)
+
+    # Everything seen is past the retention period; what the feed still lists must stay
+    settings.setattr(Config, 'FEED_ITEM_RETENTION_SECONDS', 60)
+    poller._execute('UPDATE feed_items SET seen_at = ?, last_listed_at = ?', (time.time() - 3600,) * 2)
+    server.feeds['/rss'] = rss(items[:-1])
+    result = poll(poller)[server.url('/rss')]
+
+    assert result['new_items'] == 0
+    rows, _ = poller._execute('SELECT COUNT(*) AS count FROM feed_items')
+    assert rows[0]['count'] == 1199
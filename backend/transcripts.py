@@ -0,0 +1,107 @@
+"""
+Transcript Formatting Module
+
+Lays out YouTube transcript segments (the {'text', 'start', 'duration'}
+dicts youtube_transcript_api returns) for the rest of the backend:
+
+1. Plain text, one caption per line (what TextFormatter produced)
+2. Fixed-length windows of the video, each with its start and end time and
+   the captions spoken during it, so a long video can be processed in chunks
+   that still say where in the video they came from
+"""
+
+
+def format_timestamp(seconds):
+    """
+    Write a position in a video the way YouTube does.
+
+    Args:
+        seconds (float): Seconds from the start of the video
+
+    Returns:
+        str: 'm:ss', or 'h:mm:ss' from the first hour on
+    """
+    total = int(seconds)
+    hours, remainder = divmod(total, 3600)
+    minutes, secs = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def transcript_duration(segments):
+    """
+    Get how long a transcript runs.
+
+    Args:
+        segments (list): Transcript segments
+
+    Returns:
+        float: Seconds from the start of the video to the end of the last caption
+    """
+    if not segments:
+        return 0.0
+    last = segments[-1]
+    return last['start'] + last.get('duration', 0)
+
+
+def format_transcript(segments):
+    """
+    Join transcript segments into text, one caption per line.
+
+    Args:
+        segments (list): Transcript segments
+
+    Returns:
+        str: The transcript text
+    """
+    return '\n'.join(segment['text'] for segment in segments)
+
+
+def group_segments(segments, window_seconds):
+    """
+    Group transcript segments into consecutive windows of the video.
+
+    A caption belongs to the window it starts in; windows nobody speaks in
+    are left out.
+
+    Args:
+        segments (list): Transcript segments
+        window_seconds (float): Length of each window
+
+    Returns:
+        list: One dict per window with 'start' and 'end' (seconds), 'timestamp'
+            (the start as 'm:ss') and 'text' (its captions joined by spaces)
+    """
+    windows = []
+    current = None
+    for segment in segments:
+        index = int(segment['start'] // window_seconds)
+        if current is None or current['index'] != index:
+            current = {'index': index, 'captions': [], 'end': segment['start']}
+            windows.append(current)
+        current['captions'].append(' '.join(segment['text'].split()))
+        current['end'] = max(current['end'], segment['start'] + segment.get('duration', 0))
+
+    return [
+        {
+            'start': window['index'] * window_seconds,
+            'end': round(window['end'], 3),
+            'timestamp': format_timestamp(window['index'] * window_seconds),
+            'text': ' '.join(caption for caption in window['captions'] if caption),
+        }
+        for window in windows
+    ]
+
+
+def format_windows(windows):
+    """
+    Write windows from group_segments() as text, one '[m:ss] ...' paragraph each.
+
+    Args:
+        windows (list): Windows from group_segments()
+
+    Returns:
+        str: The transcript text
+    """
+    return '\n'.join(f"[{window['timestamp']}] {window['text']}" for window in windows)
@@ -0,0 +1,122 @@
+"""
+Trend Record Module
+
+A compact, read-only record for one trend. The trend repository keeps every
+trend in memory as one of these instead of a dict, and the trend endpoints
+work on them directly instead of going through a pandas DataFrame:
+1. The six trend fields (and the ID) live in __slots__, so a record is a
+   fraction of the size of the equivalent dict
+2. Fields keep their types: news_links stays a list, persona stays a dict
+3. Any other fields a trend has are kept in a small dict alongside
+4. Records aren't changed in place; replace() returns a new one, so a record
+   handed to a request can't change under it
+5. Because of that, a record can keep its own JSON text once it has been
+   encoded, and a list of trends is sent by joining those texts instead of
+   encoding every trend again on every request
+"""
+
+import json
+
+FIELDS = ('research_task', 'news_links', 'context', 'date_discovered', 'theme', 'analysis')
+
+
+class TrendRecord:
+    """One trend: its ID, the six trend fields and any extra fields."""
+
+    __slots__ = ('id',) + FIELDS + ('extra', '_json')
+
+    def __init__(self, id=None, research_task=None, news_links=None, context=None,
+                 date_discovered=None, theme=None, analysis=None, extra=None):
+        self.id = id
+        self.research_task = research_task
+        self.news_links = news_links
+        self.context = context
+        self.date_discovered = date_discovered
+        self.theme = theme
+        self.analysis = analysis
+        self.extra = extra or None
+        self._json = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a trend dict (a Firestore document, a database row or request JSON).
+
+        Args:
+            data (dict): The trend; keys other than 'id' and FIELDS go into ``extra``
+
+        Returns:
+            TrendRecord: The record (``data`` itself if it already is one)
+        """
+        if isinstance(data, cls):
+            return data
+        extra = {key: value for key, value in data.items() if key != 'id' and key not in FIELDS}
+        return cls(data.get('id'), *(data.get(field) for field in FIELDS), extra=extra)
+
+    def to_dict(self):
+        """
+        The trend as a plain dict, ready for jsonify or a database write.
+
+        Returns:
+            dict: Fields that are set (None ones are left out), extras, and 'id' if there is one
+        """
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        if self.id is not None:
+            data['id'] = self.id
+        return data
+
+    def to_json(self):
+        """
+        The trend as JSON text (keys sorted, like jsonify), encoded the first time it's needed.
+
+        Returns:
+            str: The same object to_dict() gives, as JSON
+        """
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':'), default=str)
+        return self._json
+
+    def get(self, field, default=None):
+        """Look a field up by name, like dict.get (so search and sorting code can take either)."""
+        if field in FIELDS or field == 'id':
+            value = getattr(self, field)
+        elif self.extra:
+            value = self.extra.get(field)
+        else:
+            value = None
+        return default if value is None else value
+
+    def __getitem__(self, field):
+        value = self.get(field)
+        if value is None:
+            raise KeyError(field)
+        return value
+
+    def replace(self, **changes):
+        """
+        Get a copy with some fields changed.
+
+        Args:
+            **changes: New field values; names outside FIELDS go into ``extra``
+
+        Returns:
+            TrendRecord: The new record
+        """
+        data = self.to_dict()
+        data.update(changes)
+        # A field explicitly set to None is dropped, not kept from the old record
+        return TrendRecord.from_dict({key: value for key, value in data.items() if value is not None})
+
+    def __eq__(self, other):
+        if not isinstance(other, TrendRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"TrendRecord(id={self.id!r}, research_task={self.research_task!r}, theme={self.theme!r})"
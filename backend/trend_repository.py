@@ -0,0 +1,558 @@
+"""
+Trend Repository Module
+
+Keeps a copy of every trend in memory so read endpoints don't have to pull the
+whole collection from Firestore (or re-read the CSV file) on every request.
+
+1. With Firestore, the copy is loaded once from a snapshot listener, which
+   then streams every later change into memory
+2. With the local SQLite store (see sqlite_store.py), the store's revision
+   number is checked on each read, and only the trends changed since the
+   last read (by any worker) are fetched
+3. With the CSV fallback, the file's modification time and size are checked
+   on each read and the file is only re-read when it changed
+4. Writes made by this worker are applied to the copy straight away, so the
+   worker that made a change always sees it
+5. A full-text search index, and sorted indexes by date_discovered (overall
+   and per theme), are kept in step with every change, so a page of trends
+   can be served without looking at the rest
+6. Trends are held as compact TrendRecords (see trend_record.py), and the
+   endpoints add, update and delete them through add(), update() and
+   delete(), which write to whichever of the three is in use
+7. Loads, incremental syncs and writes are timed as the trends.load,
+   trends.sync and trends.save stages (see metrics.py)
+
+If the listener stops, reads fall back to a full reload whenever the copy is
+older than Config.TRENDS_MAX_STALENESS_SECONDS.
+"""
+
+import os
+import math
+import time
+import bisect
+import threading
+from collections import OrderedDict
+import metrics
+from config import Config
+from search_index import SearchIndex
+from trend_record import TrendRecord
+from firestore_store import upsert_trend
+from csv_store import read_csv_trends, write_csv_trends
+
+
+def sort_value(value):
+    """
+    Turn a field value into a string that sorts consistently.
+
+    Args:
+        value: The field value
+
+    Returns:
+        str: The value as text; missing values become '' and sort first
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+def keyset_page(entries, limit, descending=False, after=None):
+    """
+    Take one page from a sorted list of (sort value, key) entries.
+
+    Args:
+        entries (list): Entries sorted in ascending order
+        limit (int): The page size
+        descending (bool, optional): Walk the list from the end
+        after (tuple, optional): The last entry of the previous page
+
+    Returns:
+        tuple: (entries on this page, whether more entries follow)
+    """
+    if descending:
+        end = bisect.bisect_left(entries, after) if after is not None else len(entries)
+        start = max(end - limit, 0)
+        return entries[start:end][::-1], start > 0
+
+    start = bisect.bisect_right(entries, after) if after is not None else 0
+    return entries[start:start + limit], start + limit < len(entries)
+
+
+class TrendRepository:
+    """An in-memory, automatically refreshed copy of the trends collection."""
+
+    def __init__(self, db, collection, csv_path, store=None):
+        """
+        Args:
+            db (firestore.Client): The Firestore client, or None to use the local store
+            collection (str): The Firestore collection name
+            csv_path (str): The CSV file used when Firestore isn't available and there's no store
+            store (SQLiteTrendStore, optional): The local store used when Firestore isn't available
+        """
+        self.db = db
+        self.collection = collection
+        self.csv_path = csv_path
+        self.store = store
+
+        self._trends = OrderedDict()
+        self._index = SearchIndex()
+        self._by_date = []        # sorted (date_discovered, key) for every trend
+        self._by_theme = {}       # lower-case theme -> sorted (date_discovered, key)
+        # _lock guards the data and is held only briefly; _load_lock serializes
+        # (re)loads, which may wait on the listener thread
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._pid = None
+        self._watch = None
+        self._csv_version = None
+        self._store_revision = None
+        self._synced_at = None
+        self._reloads = 0
+        self._listener_events = 0
+
+    # Loading
+
+    def _ensure_current(self):
+        """Load the trends on first use and refresh them if they may be out of date."""
+        with self._load_lock:
+            # Listener threads don't survive a fork, so each worker starts its own
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._loaded = False
+                self._watch = None
+
+            if self.db is None and self.store is not None:
+                self._sync_store()
+                return
+
+            if self.db is None:
+                version = self._read_csv_version()
+                if not self._loaded or version != self._csv_version:
+                    with self._lock:
+                        self._load_csv(version)
+                return
+
+            if not self._loaded:
+                self._subscribe()
+            elif not self._listener_active() and self.age() > Config.TRENDS_MAX_STALENESS_SECONDS:
+                print("Trend listener is not running, reloading trends from Firestore")
+                self._subscribe()
+
+    def _read_csv_version(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load_csv(self, version):
+        with metrics.stage('trends.load', source='csv'):
+            records = [] if version is None else read_csv_trends(self.csv_path)
+        # CSV rows are identified by their position
+        self._reset(OrderedDict(enumerate(records)))
+        self._csv_version = version
+        self._mark_synced(reload=True)
+
+    def _sync_store(self):
+        """Load every trend from the local store, or just the ones changed since the last read."""
+        if not self._loaded:
+            with metrics.stage('trends.load', source='sqlite'):
+                trends, revision = self.store.all()
+            with self._lock:
+                self._reset(trends)
+                self._store_revision = revision
+                self._mark_synced(reload=True)
+            return
+
+        if self.store.revision() == self._store_revision:
+            self._mark_synced()
+            return
+        with metrics.stage('trends.sync', source='sqlite') as span:
+            changed, deleted, revision = self.store.changes_since(self._store_revision)
+            span.update({'changed': len(changed), 'deleted': len(deleted)})
+        with self._lock:
+            for trend in changed:
+                self._store(trend['id'], trend)
+            for trend_id in deleted:
+                self._discard(trend_id)
+            self._store_revision = revision
+            self._mark_synced()
+
+    def _subscribe(self):
+        """Start a snapshot listener and wait for its first snapshot (or load directly)."""
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception:
+                pass
+            self._watch = None
+
+        first_snapshot = threading.Event()
+
+        def on_snapshot(doc_snapshots, changes, read_time):
+            with self._lock:
+                if not first_snapshot.is_set():
+                    # The first snapshot holds the whole collection
+                    self._reset(OrderedDict(
+                        (doc.id, {**doc.to_dict(), 'id': doc.id}) for doc in doc_snapshots
+                    ))
+                else:
+                    for change in changes:
+                        doc = change.document
+                        if change.type.name == 'REMOVED':
+                            self._discard(doc.id)
+                        else:
+                            self._store(doc.id, {**doc.to_dict(), 'id': doc.id})
+                    self._listener_events += 1
+                self._mark_synced()
+            first_snapshot.set()
+
+        with metrics.stage('trends.load', upstream='firestore', source='firestore'):
+            try:
+                self._watch = self.db.collection(self.collection).on_snapshot(on_snapshot)
+            except Exception as e:
+                print(f"Error starting trend listener: {e}")
+                self._watch = None
+
+            if self._watch is None or not first_snapshot.wait(Config.TRENDS_LISTENER_TIMEOUT):
+                # No listener (or it's too slow): read the collection once instead
+                trends = OrderedDict(
+                    (doc.id, {**doc.to_dict(), 'id': doc.id})
+                    for doc in self.db.collection(self.collection).stream()
+                )
+                with self._lock:
+                    if not first_snapshot.is_set():
+                        self._reset(trends)
+                        self._mark_synced()
+        with self._lock:
+            self._reloads += 1
+            self._loaded = True
+
+    def _listener_active(self):
+        if self._watch is None:
+            return False
+        is_active = getattr(self._watch, 'is_active', None)
+        return bool(is_active()) if callable(is_active) else True
+
+    @staticmethod
+    def _date_entry(key, trend):
+        return (sort_value(trend.get('date_discovered')), key)
+
+    @staticmethod
+    def _theme_key(theme):
+        return theme.lower() if isinstance(theme, str) else ''
+
+    def _reset(self, trends):
+        """Replace every trend and rebuild the indexes."""
+        trends = OrderedDict((key, TrendRecord.from_dict(trend)) for key, trend in trends.items())
+        self._trends = trends
+        self._index.clear()
+        self._by_date = []
+        self._by_theme = {}
+        for key, trend in trends.items():
+            self._index.add(key, trend)
+            entry = self._date_entry(key, trend)
+            self._by_date.append(entry)
+            self._by_theme.setdefault(self._theme_key(trend.get('theme')), []).append(entry)
+        self._by_date.sort()
+        for entries in self._by_theme.values():
+            entries.sort()
+
+    def _store(self, key, trend):
+        trend = TrendRecord.from_dict(trend)
+        if key in self._trends:
+            self._unindex_order(key, self._trends[key])
+        self._trends[key] = trend
+        self._index.add(key, trend)
+        entry = self._date_entry(key, trend)
+        bisect.insort(self._by_date, entry)
+        bisect.insort(self._by_theme.setdefault(self._theme_key(trend.get('theme')), []), entry)
+
+    def _discard(self, key):
+        trend = self._trends.pop(key, None)
+        if trend is not None:
+            self._unindex_order(key, trend)
+        self._index.remove(key)
+
+    def _unindex_order(self, key, trend):
+        """Remove a trend's entries from the date indexes."""
+        entry = self._date_entry(key, trend)
+        theme_key = self._theme_key(trend.get('theme'))
+        theme_entries = self._by_theme.get(theme_key, [])
+        for entries in (self._by_date, theme_entries):
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+        if not theme_entries:
+            self._by_theme.pop(theme_key, None)
+
+    def _mark_synced(self, reload=False):
+        self._synced_at = time.time()
+        if reload:
+            self._reloads += 1
+        self._loaded = True
+
+    def load(self):
+        """Load the trends now (if they aren't loaded in this process yet) instead of on the first read."""
+        self._ensure_current()
+
+    @property
+    def loaded(self):
+        """Whether this process has a copy of the trends."""
+        return self._loaded and self._pid == os.getpid()
+
+    # Reads
+
+    def all(self):
+        """
+        Get every trend.
+
+        Returns:
+            list: The TrendRecords, in storage order
+        """
+        self._ensure_current()
+        with self._lock:
+            return list(self._trends.values())
+
+    def items(self):
+        """
+        Get every trend with its key.
+
+        Returns:
+            list: (key, TrendRecord) pairs, in storage order
+        """
+        self._ensure_current()
+        with self._lock:
+            return list(self._trends.items())
+
+    def get(self, trend_id):
+        """
+        Get a single trend.
+
+        Args:
+            trend_id (str): The trend's ID, or the CSV row number
+
+        Returns:
+            TrendRecord: The trend, or None if there isn't one with that ID
+        """
+        self._ensure_current()
+        with self._lock:
+            if self.db is None and self.store is None:
+                try:
+                    trend_id = int(trend_id)
+                except (TypeError, ValueError):
+                    return None
+            return self._trends.get(trend_id)
+
+    def search(self, query):
+        """
+        Find the trends matching every word of a query, best match first.
+
+        Args:
+            query (str): The search text
+
+        Returns:
+            list: (key, TrendRecord, relevance score) tuples
+        """
+        self._ensure_current()
+        with self._lock:
+            return [
+                (key, self._trends[key], score)
+                for key, score in self._index.search(query)
+                if key in self._trends
+            ]
+
+    def page_by_date(self, limit, theme=None, descending=True, after=None):
+        """
+        Get one page of trends ordered by date_discovered, using the date indexes.
+
+        Args:
+            limit (int): The page size
+            theme (str, optional): Only include this theme (case-insensitive)
+            descending (bool, optional): Newest first
+            after (tuple, optional): The last (date, key) entry of the previous page
+
+        Returns:
+            tuple: (trends on this page, last entry or None, whether more follow, total matching)
+        """
+        self._ensure_current()
+        with self._lock:
+            entries = self._by_theme.get(self._theme_key(theme), []) if theme else self._by_date
+            page, has_more = keyset_page(entries, limit, descending, after)
+            trends = [self._trends[key] for _, key in page]
+            return trends, (page[-1] if page else None), has_more, len(entries)
+
+    def age(self):
+        """Seconds since the in-memory copy was last confirmed current."""
+        if self._synced_at is None:
+            return None
+        if self.db is not None and self._listener_active():
+            # A running listener pushes every change as it happens
+            return 0.0
+        return time.time() - self._synced_at
+
+    @property
+    def source(self):
+        """Where the trends come from: 'firestore', 'sqlite' or 'csv'."""
+        if self.db is not None:
+            return 'firestore'
+        return 'sqlite' if self.store is not None else 'csv'
+
+    def stats(self):
+        """
+        Describe the in-memory copy, for monitoring.
+
+        Returns:
+            dict: Source, size, age in seconds and reload/listener counters
+        """
+        with self._lock:
+            return {
+                'source': self.source,
+                'loaded': self._loaded,
+                'trends': len(self._trends),
+                'age_seconds': self.age(),
+                'seconds_since_last_sync': None if self._synced_at is None else time.time() - self._synced_at,
+                'listener_active': self._listener_active(),
+                'listener_events': self._listener_events,
+                'reloads': self._reloads,
+            }
+
+    # Writes
+
+    def add(self, trend):
+        """
+        Save a new trend to Firestore, the local store or the CSV file.
+
+        In Firestore and the local store, saving a trend with the same fields
+        again replaces it instead of adding a copy.
+
+        Args:
+            trend (dict or TrendRecord): The trend
+
+        Returns:
+            TrendRecord: The trend as saved, with its ID (None in the CSV file)
+        """
+        record = TrendRecord.from_dict(trend)
+        with self._save_stage('add'):
+            if self.db is not None:
+                record = record.replace(id=upsert_trend(self.db, self.collection, record.to_dict()))
+            elif self.store is not None:
+                record = record.replace(id=self.store.upsert(record.to_dict()))
+            else:
+                self._write_csv(self.all() + [record])
+                return record
+            self.put(record)
+            return record
+
+    def update(self, trend_id, change):
+        """
+        Change a saved trend.
+
+        Args:
+            trend_id (str): The trend's ID (the row number in the CSV file)
+            change (callable): Takes the current trend as a dict and returns the new one
+
+        Returns:
+            TrendRecord: The trend as saved, or None if there isn't one with that ID
+
+        Raises:
+            ValueError: If the CSV file is in use and the ID isn't a row number
+        """
+        with self._save_stage('update'):
+            if self.db is not None:
+                doc_ref = self.db.collection(self.collection).document(trend_id)
+                doc = doc_ref.get()
+                if not doc.exists:
+                    return None
+                data = change(doc.to_dict())
+                doc_ref.update(data)
+                record = TrendRecord.from_dict({**data, 'id': trend_id})
+            elif self.store is not None:
+                updated = self.store.update(trend_id, change)
+                if updated is None:
+                    return None
+                record = TrendRecord.from_dict(updated)
+            else:
+                position = int(trend_id)
+                records = self.all()
+                if position < 0 or position >= len(records):
+                    return None
+                records[position] = TrendRecord.from_dict(change(records[position].to_dict()))
+                self._write_csv(records)
+                return records[position]
+            self.put(record)
+            return record
+
+    def delete(self, trend_id):
+        """
+        Delete a saved trend. In the CSV file, the rows after it move up one.
+
+        Args:
+            trend_id (str): The trend's ID (the row number in the CSV file)
+
+        Returns:
+            bool: Whether there was a trend with that ID
+
+        Raises:
+            ValueError: If the CSV file is in use and the ID isn't a row number
+        """
+        with self._save_stage('delete'):
+            if self.db is not None:
+                doc_ref = self.db.collection(self.collection).document(trend_id)
+                if not doc_ref.get().exists:
+                    return False
+                doc_ref.delete()
+            elif self.store is not None:
+                if not self.store.delete(trend_id):
+                    return False
+            else:
+                position = int(trend_id)
+                records = self.all()
+                if position < 0 or position >= len(records):
+                    return False
+                del records[position]
+                self._write_csv(records)
+                return True
+            self.remove(trend_id)
+            return True
+
+    def _save_stage(self, operation):
+        return metrics.stage('trends.save', upstream='firestore' if self.db is not None else None,
+                             operation=operation, source=self.source)
+
+    def _write_csv(self, records):
+        """Rewrite the whole CSV file (the last worker to write wins)."""
+        write_csv_trends(self.csv_path, [record.to_dict() for record in records])
+        self.replace_all(records)
+
+    # Writes made by this worker
+
+    def put(self, trend):
+        """
+        Record a trend that was just written to Firestore or the local store.
+
+        Args:
+            trend (dict or TrendRecord): The trend, including its 'id'
+        """
+        record = TrendRecord.from_dict(trend)
+        with self._lock:
+            if self._loaded:
+                self._store(record.id, record)
+
+    def remove(self, trend_id):
+        """Forget a trend that was just deleted from Firestore or the local store."""
+        with self._lock:
+            if self._loaded:
+                self._discard(trend_id)
+
+    def replace_all(self, trends):
+        """
+        Record the full contents of the CSV file that was just written.
+
+        Args:
+            trends (list): Every trend (dicts or TrendRecords), in file order
+        """
+        with self._lock:
+            self._reset(OrderedDict(enumerate(trends)))
+            self._csv_version = self._read_csv_version()
+            self._mark_synced()